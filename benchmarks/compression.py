@@ -0,0 +1,56 @@
+"""Compares bytes on the wire and end-to-end time with and without compression
+
+Runs a timeseries query and a bulk point update against a local mock API for each
+encoding. Loopback has no bandwidth limit, so the times show the CPU cost of
+compressing; the byte counts show what a real network link would carry.
+Usage: python -m benchmarks.compression [points] [rows per point] [updates]
+"""
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+
+from onboard.client import APIClient
+from onboard.client.compression import accepts
+from onboard.client.models import TimeseriesQuery
+
+from .server import MockApi
+
+
+def run(encoding: Optional[str], n_points: int, n_rows: int, n_updates: int) -> None:
+    with MockApi(rows_per_point=n_rows, encoding=encoding) as api:
+        client = APIClient(api.url, api_key='ob-p-benchmark', compression=encoding)
+        start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        query = TimeseriesQuery(point_ids=list(range(n_points)), start=start,  # type: ignore
+                                end=start + timedelta(days=1))
+        began = time.perf_counter()
+        count = sum(1 for _ in client.stream_point_timeseries(query))
+        stream_s = time.perf_counter() - began
+        assert count == n_points
+
+        times = np.datetime64('2023-01-01', 'ms') + np.arange(n_updates)
+        began = time.perf_counter()
+        client.update_point_data_arrays(np.arange(n_updates) % 1000,
+                                        np.random.default_rng(0).random(n_updates), times)
+        update_s = time.perf_counter() - began
+        assert api.updates_received == n_updates
+
+    label = encoding or 'none'
+    print(f"  {label:<5} stream {stream_s:7.3f}s {api.bytes_out / 1e6:9.2f} MB received"
+          f" | update {update_s:7.3f}s {api.bytes_in / 1e6:9.2f} MB sent")
+
+
+def main(n_points: int, n_rows: int, n_updates: int) -> None:
+    print(f"{n_points} points x {n_rows} rows, {n_updates} updates")
+    for encoding in (None, 'gzip', 'zstd'):
+        if encoding is None or accepts(encoding):
+            run(encoding, n_points, n_rows, n_updates)
+        else:
+            print(f"  {encoding:<5} skipped, install onboard.client[zstd]")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:4]]
+    main(*(args + [200, 1440, 200_000][len(args):]))
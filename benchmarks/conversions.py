@@ -0,0 +1,56 @@
+"""Compares df_time_index and df_objs_to_numeric with the pandas calls they replaced
+
+The frame has a column of timestamps as the API formats them and two object columns of
+numbers with a few nulls, like those built from non-numeric points. infer_datetime_format
+is gone from recent pandas, so the old df_time_index is measured as plain
+pd.to_datetime, which now infers the format itself.
+Usage: python -m benchmarks.conversions [rows]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from onboard.client.dataframes import df_objs_to_numeric, df_time_index
+
+from .dataframes import best_of
+
+
+def legacy_df_time_index(df: pd.DataFrame, time_col='timestamp') -> pd.DataFrame:
+    index = pd.DatetimeIndex(pd.to_datetime(df[time_col]).values).tz_localize('UTC')
+    return df.set_index(index).drop(time_col, axis=1)
+
+
+def legacy_df_objs_to_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    cols = df.columns[df.dtypes.eq('object')]
+    return df[cols].apply(pd.to_numeric, errors='coerce')
+
+
+def synthetic_frame(n_rows: int) -> pd.DataFrame:
+    times = pd.date_range('2023-01-01', periods=n_rows, freq='s')
+    stamps = times.strftime('%Y-%m-%dT%H:%M:%S.000Z').to_numpy(dtype=object)
+    rng = np.random.default_rng(0)
+    columns = {'timestamp': stamps}
+    for name in ('zone_temp', 'setpoint'):
+        values = rng.random(n_rows).astype(object)
+        values[rng.random(n_rows) < 0.01] = None
+        columns[name] = values
+    return pd.DataFrame(columns)
+
+
+def main(n_rows: int) -> None:
+    df = synthetic_frame(n_rows)
+    print(f"{n_rows:,} rows")
+    legacy_s, legacy = best_of(1, legacy_df_time_index, df)
+    fast_s, fast = best_of(1, df_time_index, df)
+    print(f"  df_time_index:      {legacy_s:8.3f}s -> {fast_s:8.3f}s  ({legacy_s / fast_s:.1f}x)")
+    assert legacy.index.equals(fast.index)
+
+    legacy_s, legacy = best_of(1, legacy_df_objs_to_numeric, df.drop(columns='timestamp'))
+    fast_s, fast = best_of(1, df_objs_to_numeric, df.drop(columns='timestamp'))
+    print(f"  df_objs_to_numeric: {legacy_s:8.3f}s -> {fast_s:8.3f}s  ({legacy_s / fast_s:.1f}x)")
+    pd.testing.assert_frame_equal(legacy, fast)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
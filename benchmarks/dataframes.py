@@ -0,0 +1,92 @@
+"""Compares dataframe builders for streaming timeseries results
+
+Usage: python -m benchmarks.dataframes [points] [rows per point]
+"""
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+from onboard.client.dataframes import points_df_from_streaming_timeseries
+from onboard.client.models import point_data_constructor
+
+
+def legacy_points_df_from_streaming_timeseries(timeseries, points=[],
+                                               point_column_label=None) -> pd.DataFrame:
+    """The row-at-a-time builder this package shipped before 1.10, kept for comparison"""
+    if point_column_label is None:
+        def point_column_label(p):
+            return p.get('id')
+
+    point_names = {p['id']: point_column_label(p) for p in points}
+    columns: List[Union[str, int]] = ['timestamp']
+    dates = set()
+    data_by_point = {}
+
+    for point in timeseries:
+        columns.append(point.point_id)
+        ts_index = point.columns.index('time')
+        data_index = point.columns.index(point.unit)
+
+        point_data: Dict[str, Union[str, float, None]] = {}
+        data_by_point[point.point_id] = point_data
+
+        for val in point.values:
+            ts = val[ts_index]
+            dates.add(ts)
+            point_data[ts] = val[data_index]
+
+    sorted_dates = sorted(dates)
+    data = []
+    for d in sorted_dates:
+        row = {'timestamp': d}
+        for p in columns[1:]:
+            row[point_names.get(p, p)] = data_by_point[p].get(d)
+        data.append(row)
+    return pd.DataFrame(data)
+
+
+def synthetic_timeseries(n_points: int, n_rows: int):
+    """Minute data with a few gaps so that columns don't line up exactly"""
+    construct = point_data_constructor()
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    stamps = [(start + timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+              for i in range(n_rows + n_points)]
+    rng = np.random.default_rng(0)
+    timeseries = []
+    for p in range(n_points):
+        values = rng.random(n_rows).tolist()
+        rows = [[stamps[p + i], v, v] for i, v in enumerate(values)]
+        timeseries.append(construct(point_id=p, raw='F', unit='C',
+                                    columns=['time', 'raw', 'C'], values=rows))
+    return timeseries
+
+
+def best_of(n, func, *args, **kwargs):
+    best = float('inf')
+    result = None
+    for _ in range(n):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(n_points: int, n_rows: int) -> None:
+    timeseries = synthetic_timeseries(n_points, n_rows)
+    print(f"{n_points} points x {n_rows} rows")
+    legacy_s, legacy = best_of(3, legacy_points_df_from_streaming_timeseries, timeseries)
+    print(f"  legacy row builder:      {legacy_s:8.3f}s")
+    vector_s, vector = best_of(3, points_df_from_streaming_timeseries, timeseries)
+    print(f"  vectorized:              {vector_s:8.3f}s  ({legacy_s / vector_s:.1f}x)")
+    indexed_s, _ = best_of(3, points_df_from_streaming_timeseries, timeseries, time_index=True)
+    print(f"  vectorized, time_index:  {indexed_s:8.3f}s  ({legacy_s / indexed_s:.1f}x)")
+    pd.testing.assert_frame_equal(legacy, vector, check_dtype=False)
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*(args + [500, 1440][len(args):]))
@@ -0,0 +1,76 @@
+"""Measures stream_point_timeseries decoding throughput for each output mode
+
+The response body is served from memory so that only decoding is measured.
+Usage: python -m benchmarks.decoding [points] [rows per point]
+"""
+import io
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import requests
+
+from onboard.client import APIClient
+from onboard.client.models import TimeseriesQuery, point_data_constructor
+
+
+def ndjson_body(n_points: int, n_rows: int) -> bytes:
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    stamps = [(start + timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+              for i in range(n_rows)]
+    lines = []
+    for p in range(n_points):
+        values = [[ts, 20.0 + i % 7, 68.0 + i % 7] for i, ts in enumerate(stamps)]
+        lines.append(orjson.dumps({'point_id': p, 'raw': 'F', 'unit': 'C',
+                                   'columns': ['time', 'raw', 'C'], 'values': values}))
+    return b'\n'.join(lines) + b'\n'
+
+
+def client_serving(body: bytes) -> APIClient:
+    def post(url, **kwargs):
+        res = requests.Response()
+        res.status_code = 200
+        res.raw = io.BytesIO(body)
+        return res
+
+    client = APIClient('http://localhost', api_key='ob-p-benchmark')
+    client.post = post  # type: ignore[assignment]
+    return client
+
+
+def legacy_stream(client: APIClient, query: TimeseriesQuery):
+    """The decode loop this package shipped before 1.10, kept for comparison"""
+    point_data = point_data_constructor()
+    with client.post('/query-v2', json=query.json(), stream=True) as res:
+        for line in res.iter_lines(chunk_size=20 * 1024):
+            yield point_data(**orjson.loads(line))
+
+
+def timed(label: str, n_points: int, records) -> None:
+    start = time.perf_counter()
+    count = sum(1 for _ in records)
+    elapsed = time.perf_counter() - start
+    assert count == n_points
+    print(f"  {label:<28} {elapsed:7.3f}s  {count / elapsed:10,.0f} points/s")
+
+
+def main(n_points: int, n_rows: int) -> None:
+    body = ndjson_body(n_points, n_rows)
+    client = client_serving(body)
+    now = datetime.now(timezone.utc)
+    query = TimeseriesQuery(point_ids=list(range(n_points)), start=now, end=now)
+    print(f"{n_points} points x {n_rows} rows, {len(body) / 1e6:.1f} MB")
+
+    timed('legacy (iter_lines, 20 KiB)', n_points, legacy_stream(client, query))
+    for chunk_size in (20 * 1024, 128 * 1024, 1024 * 1024):
+        timed(f'model ({chunk_size // 1024} KiB)', n_points,
+              client.stream_point_timeseries(query, chunk_size=chunk_size))
+    timed('columnar', n_points, client.stream_point_timeseries(query, columnar=True))
+    timed('raw dicts', n_points, client.stream_point_timeseries_raw(query))
+    timed('raw memoryviews', n_points, client.stream_point_timeseries_raw(query, decode=False))
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*(args + [500, 1440][len(args):]))
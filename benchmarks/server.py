@@ -0,0 +1,190 @@
+"""A local stand-in for the Onboard API that serves synthetic data
+
+    with MockApi(rows_per_point=1440, encoding='gzip', latency=0.02) as api:
+        client = APIClient(api.url, api_key='ob-p-benchmark')
+
+Serves POST /query-v2 and /points_update, and GET /buildings,
+/buildings/{id}/equipment and /points?point_ids=[...]. Each building has
+equipment_per_building pieces of equipment with points_per_equipment points, point ids
+are numbered consecutively across buildings. Every response is delayed by latency
+seconds to stand in for a network round trip.
+
+Response bodies are compressed with encoding when the client accepts it. Bytes read
+and written on the server's sockets are counted in bytes_in and bytes_out.
+"""
+import gzip
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import orjson
+
+from onboard.client.compression import compress
+
+
+def decompress(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'zstd':
+        from onboard.client.compression import _zstd
+        return _zstd().decompress(body)
+    return body
+
+
+@lru_cache(maxsize=8)
+def iso_timestamps(start_ms: int, rows: int) -> List[str]:
+    start = datetime.fromtimestamp(start_ms / 1000, timezone.utc)
+    return [(start + timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+            for i in range(rows)]
+
+
+def point_record(point_id: int, start_ms: int, rows: int, iso_times: bool = False) -> bytes:
+    """One point's NDJSON line, minute data starting at start_ms. Times are epoch
+    milliseconds, or ISO 8601 strings as the API returns them with iso_times"""
+    if iso_times:
+        times: List[Any] = iso_timestamps(start_ms, rows)
+    else:
+        times = [start_ms + i * 60_000 for i in range(rows)]
+    values = [[t, 20.0 + (point_id + i) % 7, 68.0 + (point_id + i) % 7]
+              for i, t in enumerate(times)]
+    return orjson.dumps({'point_id': point_id, 'raw': 'F', 'unit': 'C',
+                         'columns': ['time', 'raw', 'C'], 'values': values})
+
+
+def point_metadata(point_id: int, equip_id: int, building_id: int) -> Dict[str, Any]:
+    return {'id': point_id, 'building_id': building_id, 'equip_id': equip_id,
+            'name': f'Point {point_id}', 'topic': f'org/{building_id}/{equip_id}/{point_id}',
+            'datasource_hash': f'{point_id:032x}', 'type': 'Zone Temperature',
+            'point_type_id': 1, 'measurement_id': 1, 'unit': 'F', 'tagged_units': 'F',
+            'value': 72.0, 'last_updated': 1672531200000, 'first_updated': 1640995200000,
+            'tags': ['zone', 'air', 'temp', 'sensor', 'point', 'his']}
+
+
+_EQUIPMENT_PATH = re.compile(r'^/buildings/(\d+)/equipment$')
+
+
+class Handler(BaseHTTPRequestHandler):
+    server: 'MockApi'
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, Nagle would delay the body by ~40ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        self.server.count_in(len(body))
+        return decompress(body, self.headers.get('Content-Encoding'))
+
+    def reply(self, body: bytes, content_type: str = 'application/json') -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        encoding = self.server.encoding
+        accepted = self.headers.get('Accept-Encoding') or ''
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        if encoding and encoding in accepted:
+            body = compress(body, encoding)
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count_out(len(body))
+
+    def do_POST(self) -> None:
+        body = self.read_body()
+        if self.path == '/query-v2':
+            query = orjson.loads(body)
+            start = int(query['start'] * 1000) if query.get('start') else 0
+            lines = [point_record(p, start, self.server.rows_per_point, self.server.iso_times)
+                     for p in query.get('point_ids') or []]
+            self.reply(b'\n'.join(lines) + b'\n', 'application/x-ndjson')
+        elif self.path == '/points_update':
+            self.server.updates_received += len(orjson.loads(body))
+            self.reply(b'{}')
+        else:
+            self.send_error(404)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        server = self.server
+        equipment = _EQUIPMENT_PATH.match(url.path)
+        if url.path == '/buildings':
+            self.reply(orjson.dumps([{'id': b, 'name': f'Building {b}', 'org_id': 1}
+                                     for b in range(server.buildings)]))
+        elif equipment and int(equipment.group(1)) < server.buildings:
+            self.reply(orjson.dumps(server.building_equipment(int(equipment.group(1)))))
+        elif url.path == '/points':
+            ids = orjson.loads(parse_qs(url.query)['point_ids'][0])
+            self.reply(orjson.dumps([server.point(i) for i in ids if i < server.n_points]))
+        else:
+            self.send_error(404)
+
+
+class MockApi(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, rows_per_point: int = 1440, encoding: Optional[str] = None,
+                 latency: float = 0.0, buildings: int = 10, equipment_per_building: int = 20,
+                 points_per_equipment: int = 10, iso_times: bool = False) -> None:
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.rows_per_point = rows_per_point
+        self.encoding = encoding
+        self.latency = latency
+        self.buildings = buildings
+        self.equipment_per_building = equipment_per_building
+        self.points_per_equipment = points_per_equipment
+        self.iso_times = iso_times
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.updates_received = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def n_points(self) -> int:
+        return self.buildings * self.equipment_per_building * self.points_per_equipment
+
+    def point(self, point_id: int) -> Dict[str, Any]:
+        equip_id = point_id // self.points_per_equipment
+        return point_metadata(point_id, equip_id, equip_id // self.equipment_per_building)
+
+    def building_equipment(self, building_id: int) -> List[Dict[str, Any]]:
+        equipment = []
+        for e in range(self.equipment_per_building):
+            equip_id = building_id * self.equipment_per_building + e
+            first = equip_id * self.points_per_equipment
+            equipment.append({'id': equip_id, 'building_id': building_id,
+                              'equip_id': f'ahu-{equip_id}', 'equip_type_tag': 'ahu',
+                              'suffix': str(e), 'tags': ['ahu', 'equip'],
+                              'points': [self.point(p) for p in
+                                         range(first, first + self.points_per_equipment)]})
+        return equipment
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count_in(self, n: int) -> None:
+        with self._lock:
+            self.bytes_in += n
+
+    def count_out(self, n: int) -> None:
+        with self._lock:
+            self.bytes_out += n
+
+    def __enter__(self) -> 'MockApi':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self.server_close()
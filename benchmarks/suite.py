@@ -0,0 +1,154 @@
+"""Measures the client's main code paths end to end against a local mock API
+
+Each case runs repeat times. Throughput is taken from the median run, request latency
+percentiles are taken over every request of every run, and peak memory is measured
+with tracemalloc in one extra run, since tracing slows the code down.
+Usage: python -m benchmarks.suite [--points N] [--rows N] [--latency S] [--json FILE]
+"""
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import orjson
+
+from onboard.client import APIClient
+from onboard.client.dataframes import points_df_from_streaming_timeseries
+from onboard.client.metrics import ClientHooks
+from onboard.client.models import PointDataUpdate, TimeseriesQuery
+
+from .server import MockApi
+
+
+class Latencies(ClientHooks):
+    """Keeps every request's latency, for exact percentiles"""
+
+    def __init__(self) -> None:
+        self.seconds: Dict[str, List[float]] = defaultdict(list)
+
+    def on_request(self, method: str, endpoint: str, status: int, seconds: float,
+                   bytes_sent: int, bytes_received: int) -> None:
+        self.seconds[endpoint].append(seconds)
+
+
+def measure(name: str, unit: str, func: Callable[[], int], hooks: Latencies,
+            repeat: int) -> Dict[str, Any]:
+    """Runs func, which returns how many units it processed, and summarizes the runs"""
+    hooks.seconds.clear()
+    times = []
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = func()
+        times.append(time.perf_counter() - start)
+    latencies = [s for series in hooks.seconds.values() for s in series]
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(times)
+    result = {'case': name, 'unit': unit, 'count': count, 'seconds': median,
+              'throughput': count / median if median else 0.0,
+              'requests': len(latencies) // repeat, 'peak_mb': peak / 1e6}
+    for q in (50, 95, 99):
+        result[f'p{q}_ms'] = float(np.percentile(latencies, q)) * 1e3 if latencies else 0.0
+    return result
+
+
+def run(n_points: int, n_rows: int, n_updates: int, latency: float, max_workers: int,
+        repeat: int, only: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    equipment_per_building = 20
+    points_per_equipment = 10
+    buildings = -(-n_points // (equipment_per_building * points_per_equipment))
+    results = []
+    with MockApi(rows_per_point=n_rows, latency=latency, buildings=buildings,
+                 equipment_per_building=equipment_per_building,
+                 points_per_equipment=points_per_equipment, iso_times=True) as api:
+        hooks = Latencies()
+        client = APIClient(api.url, api_key='ob-p-benchmark', max_workers=max_workers,
+                           hooks=hooks)
+        start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        query = TimeseriesQuery(point_ids=list(range(n_points)), start=start,  # type: ignore
+                                end=start + timedelta(minutes=n_rows))
+        point_ids = list(range(n_points))
+        rng = np.random.default_rng(0)
+        updates = [PointDataUpdate(int(i) % n_points, float(v), start + timedelta(seconds=i))
+                   for i, v in enumerate(rng.random(n_updates))]
+
+        def stream() -> int:
+            return sum(len(p.values) for p in client.stream_point_timeseries(query))
+
+        def dataframe() -> int:
+            df = points_df_from_streaming_timeseries(client.stream_point_timeseries(query),
+                                                     time_index=True)
+            return int(df.count().sum())
+
+        def points_by_ids() -> int:
+            return len(client.get_points_by_ids(point_ids))
+
+        def all_points() -> int:
+            return len(client.get_all_points())
+
+        def update() -> int:
+            client.update_point_data(updates)
+            return len(updates)
+
+        cases = [
+            ('stream_point_timeseries', 'samples', stream),
+            ('points_df_from_streaming_timeseries', 'samples', dataframe),
+            ('get_points_by_ids', 'points', points_by_ids),
+            ('get_all_points', 'points', all_points),
+            ('update_point_data', 'updates', update),
+        ]
+        for name, unit, func in cases:
+            if only and name not in only:
+                continue
+            results.append(measure(name, unit, func, hooks, repeat))
+    return results
+
+
+def report(results: List[Dict[str, Any]]) -> None:
+    print(f"{'case':<37}{'throughput':>22}{'requests':>10}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'peak MB':>9}")
+    for r in results:
+        throughput = f"{r['throughput']:,.0f} {r['unit']}/s"
+        print(f"{r['case']:<37}{throughput:>22}{r['requests']:>10}{r['p50_ms']:>9.1f}"
+              f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['peak_mb']:>9.1f}")
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.suite')
+    parser.add_argument('--points', type=int, default=1000)
+    parser.add_argument('--rows', type=int, default=1440, help='samples per point')
+    parser.add_argument('--updates', type=int, default=100_000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the server waits before each response')
+    parser.add_argument('--workers', type=int, default=4, help="the client's max_workers")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help='comma separated cases to run')
+    parser.add_argument('--json', help='also write the results to this file, to compare '
+                                       'between revisions')
+    args = parser.parse_args(argv)
+
+    print(f"{args.points} points x {args.rows} rows, {args.updates} updates, "
+          f"{args.latency * 1e3:g}ms latency, {args.workers} workers")
+    only = args.only.split(',') if args.only else None
+    results = run(args.points, args.rows, args.updates, args.latency, args.workers,
+                  args.repeat, only)
+    report(results)
+    if args.json:
+        with open(args.json, 'wb') as f:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
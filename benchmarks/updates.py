@@ -0,0 +1,44 @@
+"""Compares serializing point updates from objects and from columns
+
+Usage: python -m benchmarks.updates [updates]
+"""
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+from orjson import dumps
+
+from onboard.client.models import PointDataUpdate
+from onboard.client.updates import encode_point_updates
+from onboard.client.util import divide_chunks
+
+from .dataframes import best_of
+
+
+def from_objects(point_ids, values, last_updated):
+    """What update_point_data costs: build PointDataUpdates, then one dict per update"""
+    updates = [PointDataUpdate(int(i), float(v), t)
+               for i, v, t in zip(point_ids, values, last_updated)]
+    return [dumps([u.json() for u in batch]) for batch in divide_chunks(updates, 500)]
+
+
+def from_columns(point_ids, values, last_updated):
+    return list(encode_point_updates(point_ids, values, last_updated))
+
+
+def main(n: int) -> None:
+    rng = np.random.default_rng(0)
+    point_ids = rng.integers(1, 100_000, n)
+    values = rng.random(n) * 100
+    start = np.datetime64('2023-01-01T00:00:00', 'ms')
+    last_updated = start + np.arange(n).astype('timedelta64[s]')
+    as_datetimes = [datetime(2023, 1, 1) + timedelta(seconds=i) for i in range(n)]
+    print(f"{n} updates")
+    objects_s, _ = best_of(3, from_objects, point_ids.tolist(), values.tolist(), as_datetimes)
+    print(f"  PointDataUpdate objects: {objects_s:8.3f}s")
+    columns_s, _ = best_of(3, from_columns, point_ids, values, last_updated)
+    print(f"  columns:                 {columns_s:8.3f}s  ({objects_s / columns_s:.1f}x)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,606 @@
+import asyncio
+import dataclasses
+import time
+from collections import deque
+from datetime import datetime
+import httpx
+from orjson import loads
+from typing import List, Dict, Any, Optional, Tuple, Union, AsyncIterator, Awaitable, \
+    Callable, Deque, Iterable, TypeVar
+from .util import divide_chunks, async_json, aiter_json_array, changelog_url
+from .models import PointSelector, PointDataUpdate, IngestStats, \
+    TimeseriesQuery, PointData, point_data_constructor
+from .compression import compress_request
+from .helpers import ClientBase
+from .transport import TransportConfig, httpx_timeout, httpx_unsent
+from .metrics import ClientHooks, endpoint_label
+from .resilience import Resilience
+from .cache import RecordCache
+from .exceptions import OnboardApiException, OnboardTemporaryException
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+async def bounded_map(func: Callable[[T], Awaitable[R]], items: Iterable[T],
+                      max_workers: int = 1) -> AsyncIterator[R]:
+    """Lazily awaits func over items with up to max_workers calls in flight
+
+    Results are yielded in input order, see util.bounded_map for the threaded version
+    """
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            return await func(item)
+
+    pending: Deque[asyncio.Future] = deque()
+    try:
+        for item in items:
+            pending.append(asyncio.ensure_future(run(item)))
+            if len(pending) >= 2 * max_workers:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for f in pending:
+            f.cancel()
+
+
+class AsyncClientBase(ClientBase):
+    """Base class that implements HTTP methods against the API on top of httpx
+
+    Shares configuration and helpers with ClientBase, but every HTTP method is a coroutine
+    """
+
+    def __init__(self, api_url: str,
+                 user: Optional[str], pw: Optional[str],
+                 api_key: Optional[str],
+                 token: Optional[str],
+                 name: Optional[str],
+                 max_workers: int = 1,
+                 compression: Optional[str] = None,
+                 transport: Optional[TransportConfig] = None,
+                 hooks: Optional[ClientHooks] = None,
+                 resilience: Optional[Resilience] = None,
+                 ) -> None:
+        super().__init__(api_url, user, pw, api_key, token, name, None, max_workers,
+                         compression=compression, transport=transport, hooks=hooks,
+                         resilience=resilience)
+        self.client: Optional[httpx.AsyncClient] = None
+        # created on first use, before Python 3.10 a lock binds to the loop current
+        # when it is made
+        self.__auth_lock: Optional[asyncio.Lock] = None
+
+    def __client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            transport = self.transport
+            pool_size = transport.pool_maxsize or max(self.max_workers, 10)
+            keep_alive = pool_size if transport.keep_alive else 0
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=keep_alive)
+            # requests doesn't time out by default and neither do we, see TransportConfig
+            self.client = httpx.AsyncClient(headers=self.headers(), limits=limits, timeout=None,
+                                            http2=transport.http2)
+        return self.client
+
+    async def aclose(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def auth(self):  # type: ignore[override]
+        if self.api_key is not None:
+            return {'X-OB-Api': self.api_key}
+        token = await self.__get_token()
+        return {'Authorization': f'Bearer {token}'}
+
+    @async_json
+    async def __pw_login(self):
+        payload = {
+            'login': self.user,
+            'password': self.pw,
+        }
+        return await self.__send('POST', '/login', json=payload)
+
+    async def reauthenticate(self, stale: Optional[str]) -> bool:  # type: ignore[override]
+        """Replaces the access token stale after the API rejected it, see
+        ClientBase.reauthenticate. Concurrent calls which were rejected with the same
+        token log in once.
+        """
+        if self.api_key is not None or not (self.user and self.pw):
+            return False
+        async with self.__auth():
+            if self.token == stale:
+                self.token = None
+        return True
+
+    def __auth(self) -> asyncio.Lock:
+        if self.__auth_lock is None:
+            self.__auth_lock = asyncio.Lock()
+        return self.__auth_lock
+
+    async def __get_token(self):
+        if self.token is None:
+            # concurrent requests wait for one login rather than each logging in
+            async with self.__auth():
+                if self.token is None:
+                    login_res = await self.__pw_login()
+                    self.token = login_res['access_token']
+
+        if self.token is None:
+            raise OnboardApiException("Not authorized")
+
+        return self.token
+
+    def __repr__(self) -> str:
+        return f"AsyncOnboardSdk(url={self.api_url})"
+
+    async def __send(self, method: str, url: str, stream: bool = False,
+                     **kwargs) -> httpx.Response:
+        client = self.__client()
+        timeout = httpx_timeout(self.transport.timeout(url))
+        request = client.build_request(method, self.url(url), timeout=timeout, **kwargs)
+        return await client.send(request, stream=stream)
+
+    async def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                      **kwargs) -> Any:
+        # auth is resolved per request so that a refreshed token is picked up after a 401
+        auth_headers = {**(headers or {}), **await self.auth()}
+        if self.compression is not None:
+            kwargs = compress_request({**kwargs, 'headers': auth_headers}, self.compression)
+            auth_headers = kwargs.pop('headers')
+            if isinstance(kwargs.get('data'), bytes):
+                kwargs['content'] = kwargs.pop('data')
+        if self.resilience is not None:
+            return await self.resilience.asend(
+                endpoint_label(url),
+                lambda: self.__attempt(method, url, headers=auth_headers, **kwargs),
+                (httpx.TransportError,), self.hooks, method, httpx_unsent)
+        return await self.__attempt(method, url, headers=auth_headers, **kwargs)
+
+    async def __attempt(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if self.hooks is None:
+            return await self.__send(method, url, **kwargs)
+
+        start = time.perf_counter()
+        res = await self.__send(method, url, **kwargs)
+        seconds = time.perf_counter() - start
+        sent = len(res.request.content)
+        if kwargs.get('stream'):
+            received = int(res.headers.get('Content-Length') or 0)
+        else:
+            received = len(res.content)
+        self.hooks.on_request(method, endpoint_label(url), res.status_code, seconds,
+                              sent, received)
+        return res
+
+    async def get(self, url: str, **kwargs) -> Any:  # type: ignore[override]
+        return await self.request('GET', url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> Any:  # type: ignore[override]
+        return await self.request('DELETE', url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> Any:  # type: ignore[override]
+        return await self.request('PUT', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> Any:  # type: ignore[override]
+        return await self.request('POST', url, **kwargs)
+
+    async def patch(self, url: str, **kwargs) -> Any:  # type: ignore[override]
+        return await self.request('PATCH', url, **kwargs)
+
+
+class AsyncAPIClient(AsyncClientBase):
+    """asyncio version of client.APIClient
+
+    Usage:
+        async with AsyncAPIClient(api_url, api_key=key) as client:
+            async for point in client.stream_point_timeseries(query):
+                ...
+    """
+
+    def __init__(self,
+                 api_url: str,
+                 user: Optional[str] = None,
+                 pw: Optional[str] = None,
+                 api_key: Optional[str] = None,
+                 token: Optional[str] = None,
+                 name: str = '',
+                 max_workers: int = 1,
+                 compression: Optional[str] = None,
+                 transport: Optional[TransportConfig] = None,
+                 hooks: Optional[ClientHooks] = None,
+                 resilience: Optional[Resilience] = None,
+                 equipment_cache: Optional[RecordCache] = None,
+                 ) -> None:
+        super().__init__(api_url, user, pw, api_key, token, name, max_workers, compression,
+                         transport, hooks, resilience)
+        # when set, equipment looked up by id is only requested once it isn't cached
+        self.equipment_cache = equipment_cache
+
+    @async_json
+    async def whoami(self) -> Dict[str, str]:
+        """returns the current account's information"""
+        return await self.get('/whoami')
+
+    @async_json
+    async def get_account_actions(self) -> List[Dict[str, str]]:
+        """returns the action audit log by or affecting the current account"""
+        return await self.get('/account-actions')
+
+    def iter_account_actions(self) -> AsyncIterator[Dict[str, str]]:
+        """Like get_account_actions, but yields each action as it is read from the response"""
+        return self.__iter_array('/account-actions')
+
+    @async_json
+    async def get_users(self) -> List[Dict[str, str]]:
+        """returns the list of visible user accounts
+          For organization admins this is all users in the organization
+          For non-admin users this is just the current account
+        """
+        return await self.get('/users')
+
+    @async_json
+    async def get_organizations(self) -> Dict[str, Dict[str, str]]:
+        return await self.get('/organizations')
+
+    @async_json
+    async def get_all_buildings(self) -> List[Dict[str, str]]:
+        return await self.get('/buildings')
+
+    @async_json
+    async def get_tags(self) -> List[Dict[str, str]]:
+        """returns a list of all the haystack tags in the system
+        For more info, please see https://project-haystack.org/tag"""
+        return await self.get('/tags')
+
+    @async_json
+    async def get_equipment_types(self) -> List[Dict[str, str]]:
+        return await self.get('/equiptype')
+
+    @async_json
+    async def get_building_equipment(self, building_id: int) -> List[Dict[str, Any]]:
+        return await self.get(f'/buildings/{building_id}/equipment?points=true')
+
+    def iter_building_equipment(self, building_id: int) -> AsyncIterator[Dict[str, Any]]:
+        """Like get_building_equipment, but yields each piece of equipment as it is read
+        from the response"""
+        return self.__iter_array(f'/buildings/{building_id}/equipment?points=true')
+
+    async def iter_equipment_by_ids(self, equipment_ids: List[int],
+                                    max_workers: Optional[int] = None,
+                                    chunk_size: int = 500
+                                    ) -> AsyncIterator[Dict[str, object]]:
+        """Yields the equipment for the given ids, in the order of the ids
+        See client.APIClient.iter_equipment_by_ids"""
+        @async_json
+        async def query(chunk: List[int]):
+            return await self.post('/equipment/query', json={'equipment_ids': chunk})
+
+        async def fetch(chunk: List[int]) -> Dict[Any, Dict[str, object]]:
+            equipment = await query(chunk)
+            if self.equipment_cache is not None:
+                self.equipment_cache.put_many(equipment)
+            return {e.get('id'): e for e in equipment}
+
+        ids = list(dict.fromkeys(equipment_ids))
+        cached = self.equipment_cache.get_many(ids) if self.equipment_cache is not None else {}
+        missing = [id for id in ids if id not in cached]
+        chunks = bounded_map(fetch, divide_chunks(missing, chunk_size), self._workers(max_workers))
+        fetched: Dict[Any, Dict[str, object]] = {}
+        requested = 0
+        for id in ids:
+            equipment = cached.get(id)
+            if equipment is None:
+                if requested % chunk_size == 0:
+                    fetched = await chunks.__anext__()
+                requested += 1
+                equipment = fetched.get(id)
+            if equipment is not None:
+                yield equipment
+
+    async def get_equipment_by_ids(self, equipment_ids: List[int],
+                                   max_workers: Optional[int] = None
+                                   ) -> List[Dict[str, object]]:
+        return [e async for e in self.iter_equipment_by_ids(equipment_ids, max_workers)]
+
+    @async_json
+    async def get_building_changelog(self, building_id: int,
+                                     since_id: Optional[int] = None
+                                     ) -> List[Dict[str, object]]:
+        """Returns a list of changelog entries for the specified building
+        since_id: only returns the entries with a greater id"""
+        return await self.get(changelog_url(building_id, since_id))
+
+    def iter_building_changelog(self, building_id: int, since_id: Optional[int] = None
+                                ) -> AsyncIterator[Dict[str, object]]:
+        """Like get_building_changelog, but yields each entry as it is read from the response"""
+        return self.__iter_array(changelog_url(building_id, since_id))
+
+    @async_json
+    async def select_points(self, selector: PointSelector) -> Dict[str, List[int]]:
+        """returns point ids based on the provided selector"""
+        return await self.post('/points/select', json=selector.json())
+
+    async def check_data_availability(self,
+                                      selector: PointSelector
+                                      ) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """Returns a tuple of data timestamps (most stale, most recent) for selected points"""
+        @async_json
+        async def get_as_json():
+            return await self.post('/points/data-availability', json=selector.json())
+
+        res = await get_as_json()
+        oldest = self.ts_to_dt(res['oldest'])
+        newest = self.ts_to_dt(res['newest'])
+        return (oldest, newest)
+
+    def _get_equipment_for_buildings(self, buildings: List[Dict[str, Any]],
+                                     max_workers: Optional[int]
+                                     ) -> AsyncIterator[List[Dict]]:
+        async def fetch(building: Dict[str, Any]) -> List[Dict]:
+            bldg_id = building['id']
+            try:
+                return await self.get_building_equipment(bldg_id)
+            except OnboardApiException as e:
+                raise type(e)(f"Failed to fetch equipment for building {bldg_id}: {e}") from e
+
+        return bounded_map(fetch, buildings, self._workers(max_workers))
+
+    async def get_all_points(self, max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """returns all points for all visible buildings
+        max_workers: overrides the client's limit on concurrent per-building requests"""
+        buildings = await self.get_all_buildings()
+        points: List[Dict[str, Any]] = []
+        async for equipment in self._get_equipment_for_buildings(buildings, max_workers):
+            for e in equipment:
+                points += e['points']
+        return points
+
+    async def get_all_equipment(self, max_workers: Optional[int] = None) -> List[Dict]:
+        """returns all equipment instances for all visible buildings
+        max_workers: overrides the client's limit on concurrent per-building requests"""
+        buildings = await self.get_all_buildings()
+        equipment = []
+        async for building_equipment in self._get_equipment_for_buildings(buildings,
+                                                                          max_workers):
+            equipment += building_equipment
+        return equipment
+
+    async def iter_points_by_ids(self, point_ids: List[int],
+                                 max_workers: Optional[int] = None
+                                 ) -> AsyncIterator[Dict[str, str]]:
+        """Yields the points for the given ids as each request for a chunk of ids completes
+        max_workers: overrides the client's limit on concurrent chunk requests"""
+        @async_json
+        async def get_points(url):
+            return await self.get(url)
+
+        async def fetch(chunk: List[int]) -> List[Dict[str, str]]:
+            points_str = '[' + ','.join(str(id) for id in chunk) + ']'
+            url = f'/points?point_ids={points_str}'
+            try:
+                return await get_points(url)
+            except OnboardApiException as e:
+                if '"status": 404' in str(e):
+                    return []
+                raise e
+
+        chunks = divide_chunks(point_ids, 500)
+        async for points_chunk in bounded_map(fetch, chunks, self._workers(max_workers)):
+            for point in points_chunk:
+                yield point
+
+    async def get_points_by_ids(self, point_ids: List[int],
+                                max_workers: Optional[int] = None) -> List[Dict[str, str]]:
+        return [p async for p in self.iter_points_by_ids(point_ids, max_workers)]
+
+    @async_json
+    async def get_all_point_types(self) -> List[Dict[str, str]]:
+        return await self.get('/pointtypes')
+
+    @async_json
+    async def get_all_measurements(self) -> List[Dict[str, str]]:
+        return await self.get('/measurements')
+
+    @async_json
+    async def get_all_units(self) -> List[Dict[str, str]]:
+        return await self.get('/unit')
+
+    async def stream_point_timeseries(self, query: TimeseriesQuery,
+                                      resample_locally: bool = True
+                                      ) -> AsyncIterator[PointData]:
+        """Query a time interval for an explicit set of point ids or
+        with a selector which describes which sensors to include.
+
+        Points are yielded as each one is read off of the response stream
+        resample_locally: see client.APIClient.stream_point_timeseries
+        """
+        local = query.interval is not None and resample_locally
+        sent = dataclasses.replace(query, interval=None) if local else query
+
+        @async_json
+        async def query_call():
+            return await self.post('/query-v2', json=sent.json(), stream=True,
+                                   headers={'Accept': 'application/x-ndjson'})
+        query_call.raw_response = True  # type: ignore[attr-defined]
+
+        point_data = point_data_constructor()
+        if local:
+            from .resample import resample_query_results
+
+        res = await query_call()
+        try:
+            async for line in res.aiter_lines():
+                if not line:
+                    continue
+                point = point_data(**loads(line))
+                if local:
+                    [point] = resample_query_results([point], query)
+                yield point
+        finally:
+            await res.aclose()
+
+    async def __iter_array(self, url: str) -> AsyncIterator[Any]:
+        """Yields the elements of a JSON array response as they are decoded, following
+        Link headers to the next page like the sync client"""
+        @async_json
+        async def get_page(page_url):
+            return await self.get(page_url, stream=True)
+        get_page.raw_response = True  # type: ignore[attr-defined]
+
+        next_url: Optional[str] = url
+        while next_url is not None:
+            res = await get_page(next_url)
+            try:
+                async for value in aiter_json_array(res.aiter_bytes()):
+                    yield value
+                next_url = res.links.get('next', {}).get('url')
+            except httpx.TransportError as e:
+                # the response broke off partway
+                raise OnboardTemporaryException(e)
+            except (httpx.HTTPError, ValueError) as e:
+                raise OnboardApiException(e)
+            finally:
+                await res.aclose()
+
+    async def update_point_data(self, updates: List[PointDataUpdate] = []) -> None:
+        """Bulk update point data, returns the number of updated points
+        updates: an iterable of models.PointDataUpdate objects"""
+        @async_json
+        async def post_batch(batch: List[PointDataUpdate]):
+            return await self.post('/points_update', json=[u.json() for u in batch])
+        post_batch.raw_response = True  # type: ignore[attr-defined]
+
+        for batch in divide_chunks(updates, 500):
+            await post_batch(batch)
+
+    async def send_ingest_stats(self, ingest_stats: IngestStats) -> None:
+        """Send timing and diagnostic info to the portal
+        ingest_stats: an instance of models.IngestStats"""
+        @async_json
+        async def send():
+            return await self.post('/ingest-stats', json=ingest_stats.json())
+        send.raw_response = True  # type: ignore[attr-defined]
+
+        await send()
+
+    @async_json
+    async def get_ingest_stats(self) -> List[Dict[str, str]]:
+        """returns ingest stats for all buildings"""
+        return await self.get('/ingest-stats')
+
+    def iter_ingest_stats(self) -> AsyncIterator[Dict[str, str]]:
+        """Like get_ingest_stats, but yields each building's stats as they are read from
+        the response"""
+        return self.__iter_array('/ingest-stats')
+
+    @async_json
+    async def get_alerts(self) -> List[Dict[str, str]]:
+        """returns a list of active alerts for all buildings"""
+        return await self.get('/alerts')
+
+    def iter_alerts(self) -> AsyncIterator[Dict[str, str]]:
+        """Like get_alerts, but yields each alert as it is read from the response"""
+        return self.__iter_array('/alerts')
+
+    @async_json
+    async def copy_point_data(self, point_id_map: Dict[int, int],
+                              start_time: Union[str, datetime],
+                              end_time: Union[str, datetime]) -> str:
+        """Copy data between points
+        point_id_map: a map of source to destination point id
+        start/end: ISO formatted timestamp strings e.g. '2019-11-29T20:16:25Z'
+        returns: a string describing the operation
+        """
+        command = {
+            'point_id_map': point_id_map,
+            'start_time': self.dt_to_str(start_time),
+            'end_time': self.dt_to_str(end_time),
+        }
+        return await self.post('/point-data-copy', json=command)
+
+
+class AsyncStagingClient(AsyncClientBase):
+    """asyncio version of staging.StagingClient"""
+
+    def __init__(self, api_url: str,
+                 api_key: Optional[str] = None,
+                 token: Optional[str] = None,
+                 name: str = '',
+                 ) -> None:
+        super().__init__(api_url, user=None, pw=None, api_key=api_key, token=token, name=name)
+
+    @async_json
+    async def get_staging_building_details(self) -> List[Dict]:
+        """Fetch building-level details for all buildings in staging"""
+        return await self.get('/staging')
+
+    @async_json
+    async def update_building_details(self, building_id: int,
+                                      details: Dict[str, Any]) -> Dict:
+        """Update building-level details for a building in staging"""
+        return await self.patch(f"/staging/{building_id}/details", json=details)
+
+    @async_json
+    async def get_staged_equipment(self, building_id: int) -> Dict:
+        """Fetch staging equipment (point topic strings only) as Python objects"""
+        return await self.get(f'/staging/{building_id}')
+
+    @async_json
+    async def get_equipment_and_points(self, building_id: int) -> Dict:
+        """Fetch staging equipment and point details together as Python objects"""
+        return await self.get(f'/staging/{building_id}?points=true')
+
+    async def get_staged_equipment_csv(self, building_id: int) -> str:
+        """Fetch staged equipment and points together in tabular form"""
+        @async_json
+        async def get_csv():
+            return await self.get(f'/staging/{building_id}',
+                                  headers={'Accept': 'text/csv'})
+
+        get_csv.raw_response = True  # type: ignore[attr-defined]
+        res = await get_csv()
+        return res.text
+
+    @async_json
+    async def update_staged_equipment(self, building_id: int, updates: List[Dict]) -> Dict:
+        """Update staged equipment and points"""
+        return await self.post(f'/staging/{building_id}', json=updates)
+
+    @async_json
+    async def validate_staging_building(self, building_id: int) -> Dict:
+        """Validate staged equipment and points, returning any errors"""
+        return await self.get(f'/staging/{building_id}/validate')
+
+    @async_json
+    async def promote_from_staging(self, building_id: int,
+                                   equip_ids: List[str] = [], topics: List[str] = []) -> Dict:
+        """Promote valid equipment and points to the primary tables, returning any errors
+        If equip_ids or topics lists are non-empty then only promote those objects. Otherwise
+        all valid objects are promoted."""
+        promote_req = {'equip_ids': equip_ids, 'topics': topics}
+        return await self.post(f'/staging/{building_id}/apply', json=promote_req)
+
+
+class AsyncOnboardClient(AsyncAPIClient):
+    def __init__(self,
+                 user: Optional[str] = None,
+                 pw: Optional[str] = None,
+                 api_key: Optional[str] = None,
+                 token: Optional[str] = None,
+                 max_workers: int = 1,
+                 ) -> None:
+        super().__init__('https://api.onboarddata.io', user, pw, api_key, token,
+                         max_workers=max_workers)
+
+
+class AsyncOnboardStagingClient(AsyncStagingClient):
+    def __init__(self, api_key: str) -> None:
+        super().__init__('https://api.onboarddata.io', api_key)
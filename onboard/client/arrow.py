@@ -0,0 +1,113 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Iterable, Iterator, List, Tuple
+from .columnar import ColumnarPointData
+from .models import PointData
+
+LONG_SCHEMA = pa.schema([
+    ('point_id', pa.int64()),
+    ('time', pa.timestamp('ms', tz='UTC')),
+    ('value', pa.float64()),
+])
+
+
+def _columns(point: PointData) -> Tuple[np.ndarray, np.ndarray]:
+    """A point's epoch millisecond timestamps and values in its unit"""
+    if not isinstance(point, ColumnarPointData):
+        point = ColumnarPointData.from_point_data(point)  # type: ignore[assignment]
+    return point.timestamps, point.clean  # type: ignore[attr-defined]
+
+
+def iter_record_batches(timeseries: Iterable[PointData],
+                        batch_rows: int = 1 << 20) -> Iterator[pa.RecordBatch]:
+    """Yields the results of a timeseries query as long (point_id, time, value) batches
+
+    Points are accumulated until at least batch_rows samples are buffered, so only about
+    one batch is held in memory at a time. Accepts PointData or columnar.ColumnarPointData,
+    the latter avoids building Python objects for every sample.
+    """
+    ids: List[np.ndarray] = []
+    times: List[np.ndarray] = []
+    values: List[np.ndarray] = []
+    buffered = 0
+    for point in timeseries:
+        ts, vals = _columns(point)
+        ids.append(np.full(len(ts), point.point_id, dtype=np.int64))
+        times.append(ts)
+        values.append(vals)
+        buffered += len(ts)
+        if buffered >= batch_rows:
+            yield _long_batch(ids, times, values)
+            ids, times, values, buffered = [], [], [], 0
+    if buffered:
+        yield _long_batch(ids, times, values)
+
+
+def _long_batch(ids: List[np.ndarray], times: List[np.ndarray],
+                values: List[np.ndarray]) -> pa.RecordBatch:
+    return pa.RecordBatch.from_arrays([
+        pa.array(np.concatenate(ids)),
+        pa.array(np.concatenate(times), type=pa.timestamp('ms', tz='UTC')),
+        pa.array(np.concatenate(values), from_pandas=True),  # NaN becomes null
+    ], schema=LONG_SCHEMA)
+
+
+def wide_table(timeseries: Iterable[PointData],
+               points=[], point_column_label=None) -> pa.Table:
+    """Returns the results of a timeseries query as a table with one column per point
+
+    Rows are the sorted union of every point's timestamps, missing samples are null.
+    Columns are named like the dataframes in the dataframes module, as strings.
+    Points are held as compact arrays until the last one arrives.
+    """
+    if point_column_label is None:
+        def point_column_label(p):
+            return p.get('id')
+
+    point_names = {p['id']: point_column_label(p) for p in points}
+    names: List[str] = []
+    times: List[np.ndarray] = []
+    values: List[np.ndarray] = []
+    for point in timeseries:
+        ts, vals = _columns(point)
+        names.append(str(point_names.get(point.point_id, point.point_id)))
+        times.append(ts)
+        values.append(vals)
+
+    all_times = np.concatenate(times) if times else np.empty(0, dtype=np.int64)
+    uniques, rows = np.unique(all_times, return_inverse=True)
+    arrays = [pa.array(uniques, type=pa.timestamp('ms', tz='UTC'))]
+    offset = 0
+    for vals in values:
+        column = np.full(len(uniques), np.nan)
+        column[rows[offset:offset + len(vals)]] = vals
+        offset += len(vals)
+        arrays.append(pa.array(column, from_pandas=True))
+    return pa.Table.from_arrays(arrays, names=['time'] + names)
+
+
+def write_parquet(timeseries: Iterable[PointData], path: str,
+                  layout: str = 'long',
+                  row_group_size: int = 1 << 20,
+                  points=[], point_column_label=None,
+                  compression: str = 'snappy') -> int:
+    """Writes the results of a timeseries query to a Parquet file, returns the rows written
+
+    layout: 'long' streams (point_id, time, value) rows to disk one row group at a time,
+        'wide' writes one column per point (see wide_table)
+    row_group_size: maximum number of rows per Parquet row group
+    """
+    if layout == 'wide':
+        table = wide_table(timeseries, points, point_column_label)
+        pq.write_table(table, path, row_group_size=row_group_size, compression=compression)
+        return table.num_rows
+    if layout != 'long':
+        raise ValueError(f"layout must be 'long' or 'wide', saw {layout}")
+
+    rows = 0
+    with pq.ParquetWriter(path, LONG_SCHEMA, compression=compression) as writer:
+        for batch in iter_record_batches(timeseries, row_group_size):
+            writer.write_table(pa.Table.from_batches([batch]), row_group_size=row_group_size)
+            rows += batch.num_rows
+    return rows
@@ -0,0 +1,399 @@
+import sqlite3
+import threading
+import time
+import urllib.parse
+import requests
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from orjson import dumps, loads, OPT_SORT_KEYS
+from .models import PointData, TimeseriesQuery, point_data_constructor
+from .util import timestamp_ms
+
+# (point id, bucket start) -> (metadata, rows) for buckets held in the cache
+Buckets = Dict[Tuple[int, int], Tuple[Optional[Dict], List]]
+
+
+class TimeseriesCache(object):
+    """SQLite-backed local cache of timeseries query results
+
+    Samples are cached per point in fixed time buckets. A query is answered from whole
+    buckets, and only buckets that are missing or weren't settled are requested from
+    the server.
+
+    path: SQLite database file, shared by every client using it
+    bucket: length of each cached interval
+    max_bytes: least recently used buckets are evicted once the cache grows past this
+    freshness: buckets which ended less than this long before they were fetched may still
+        receive late data, so they are always fetched again
+    """
+
+    def __init__(self, path: str,
+                 bucket: timedelta = timedelta(days=1),
+                 max_bytes: int = 1 << 30,
+                 freshness: timedelta = timedelta(hours=6),
+                 ) -> None:
+        self.path = path
+        self.bucket_ms = int(bucket.total_seconds() * 1000)
+        if self.bucket_ms <= 0:
+            raise ValueError(f"Cache buckets must be positive, saw {bucket}")
+        self.max_bytes = max_bytes
+        self.freshness_ms = int(freshness.total_seconds() * 1000)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                point_id INTEGER NOT NULL,
+                units TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                settled INTEGER NOT NULL,
+                accessed REAL NOT NULL,
+                size INTEGER NOT NULL,
+                meta BLOB,
+                rows BLOB NOT NULL,
+                PRIMARY KEY (point_id, units, bucket)
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS buckets_accessed ON buckets (accessed)")
+        self._db.commit()
+
+    def __repr__(self) -> str:
+        return f"TimeseriesCache(path={self.path})"
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM buckets")
+            self._db.commit()
+
+    def size(self) -> int:
+        """Bytes of cached samples"""
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM buckets").fetchone()[0]
+
+    def _bucket_range(self, start: datetime, end: datetime) -> List[int]:
+        first = round(start.timestamp() * 1000) // self.bucket_ms
+        last = round(end.timestamp() * 1000) // self.bucket_ms
+        return [b * self.bucket_ms for b in range(first, last + 1)]
+
+    def _load(self, point_ids: List[int], units: str, buckets: List[int]) -> Buckets:
+        """Returns settled buckets held in the cache and marks them as recently used"""
+        found: Buckets = {}
+        now = time.time()
+        with self._lock:
+            for point_id in point_ids:
+                rows = self._db.execute(
+                    "SELECT bucket, meta, rows FROM buckets "
+                    "WHERE point_id = ? AND units = ? AND bucket BETWEEN ? AND ? AND settled",
+                    (point_id, units, buckets[0], buckets[-1])).fetchall()
+                for bucket, meta, data in rows:
+                    found[(point_id, bucket)] = (loads(meta) if meta else None, loads(data))
+                self._db.execute(
+                    "UPDATE buckets SET accessed = ? "
+                    "WHERE point_id = ? AND units = ? AND bucket BETWEEN ? AND ?",
+                    (now, point_id, units, buckets[0], buckets[-1]))
+            self._db.commit()
+        return found
+
+    def _store(self, units: str, fetched: Buckets) -> None:
+        now = time.time()
+        settled_before = now * 1000 - self.freshness_ms
+        records = []
+        for (point_id, bucket), (meta, rows) in fetched.items():
+            data = dumps(rows)
+            meta_data = dumps(meta) if meta is not None else None
+            settled = bucket + self.bucket_ms <= settled_before
+            records.append((point_id, units, bucket, settled, now,
+                            len(data) + len(meta_data or b''), meta_data, data))
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 records)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM buckets").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # drop least recently used buckets until we're back under the limit
+        victims = []
+        for rowid, size in self._db.execute("SELECT rowid, size FROM buckets ORDER BY accessed"):
+            victims.append((rowid,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self._db.executemany("DELETE FROM buckets WHERE rowid = ?", victims)
+
+    def stream(self, query: TimeseriesQuery,
+               fetch: Callable[[TimeseriesQuery], Iterable[PointData]]) -> Iterator[PointData]:
+        """Answers a query with explicit point ids from the cache, using fetch for the rest
+
+        Points are yielded in the order of query.point_ids, points without any data are
+        left out like they are by the server.
+        """
+        units = dumps(query.units, option=OPT_SORT_KEYS).decode()
+        buckets = self._bucket_range(query.start, query.end)
+        cached = self._load(query.point_ids, units, buckets)
+
+        # points missing the same runs of consecutive buckets are fetched together
+        runs: Dict[Tuple[int, int], List[int]] = {}
+        for point_id in query.point_ids:
+            missing = [b for b in buckets if (point_id, b) not in cached]
+            for run in self._runs(missing):
+                runs.setdefault(run, []).append(point_id)
+
+        for (run_start, run_end), point_ids in runs.items():
+            fetched = self._fetch_run(fetch, query, point_ids, run_start, run_end)
+            self._store(units, fetched)
+            cached.update(fetched)
+
+        yield from self._assemble(query, buckets, cached)
+
+    def _runs(self, buckets: List[int]) -> Iterator[Tuple[int, int]]:
+        """Groups sorted bucket starts into (start, end) runs of consecutive buckets"""
+        if not buckets:
+            return
+        run_start = previous = buckets[0]
+        for bucket in buckets[1:]:
+            if bucket != previous + self.bucket_ms:
+                yield run_start, previous + self.bucket_ms
+                run_start = bucket
+            previous = bucket
+        yield run_start, previous + self.bucket_ms
+
+    def _fetch_run(self, fetch: Callable[[TimeseriesQuery], Iterable[PointData]],
+                   query: TimeseriesQuery, point_ids: List[int],
+                   run_start: int, run_end: int) -> Buckets:
+        """Fetches whole buckets from the server and splits the samples into buckets"""
+        run_query = TimeseriesQuery(  # type: ignore[call-arg]
+            start=datetime.fromtimestamp(run_start / 1000, timezone.utc),
+            end=datetime.fromtimestamp(run_end / 1000, timezone.utc),
+            point_ids=point_ids, units=query.units)
+        fetched: Buckets = {(p, b): (None, []) for p in point_ids
+                            for b in range(run_start, run_end, self.bucket_ms)}
+        for point in fetch(run_query):
+            meta = {'raw': point.raw, 'unit': point.unit, 'columns': point.columns}
+            for bucket in range(run_start, run_end, self.bucket_ms):
+                fetched[(point.point_id, bucket)] = (meta, [])
+            ts_index = point.columns.index('time')
+            for row in point.values:
+                ts = timestamp_ms(row[ts_index])  # type: ignore[arg-type]
+                bucket = ts - ts % self.bucket_ms
+                if run_start <= bucket < run_end:
+                    fetched[(point.point_id, bucket)][1].append(row)
+        return fetched
+
+    def _assemble(self, query: TimeseriesQuery, buckets: List[int],
+                  cached: Buckets) -> Iterator[PointData]:
+        point_data = point_data_constructor()
+        start_ms = round(query.start.timestamp() * 1000)
+        end_ms = round(query.end.timestamp() * 1000)
+        for point_id in query.point_ids:
+            meta = None
+            values: List = []
+            for bucket in buckets:
+                bucket_meta, rows = cached[(point_id, bucket)]
+                meta = bucket_meta or meta
+                if rows and bucket in (buckets[0], buckets[-1]):
+                    # only the first and last buckets can reach outside of the query
+                    ts_index = bucket_meta['columns'].index('time')  # type: ignore[index]
+                    rows = [row for row in rows
+                            if start_ms <= timestamp_ms(row[ts_index]) <= end_ms]
+                values.extend(rows)
+            if meta is not None:
+                yield point_data(point_id=point_id, values=values, **meta)
+
+
+class _CachedResponse(object):
+    __slots__ = ['fetched', 'etag', 'last_modified', 'content']
+
+    def __init__(self, fetched: float, etag: Optional[str], last_modified: Optional[str],
+                 content: bytes) -> None:
+        self.fetched = fetched
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content = content
+
+    def response(self, url: str) -> requests.Response:
+        res = requests.Response()
+        res.status_code = 200
+        res.url = url
+        res._content = self.content
+        res.headers['Content-Type'] = 'application/json'
+        return res
+
+
+class MetadataCache(object):
+    """Cache of reference data responses, e.g. buildings, point types and units
+
+    Responses are kept for a time to live which is configured per endpoint path, other
+    endpoints aren't cached. Expired responses are revalidated with If-None-Match or
+    If-Modified-Since when the server provided an ETag or Last-Modified header.
+
+    ttls: seconds to keep responses for, by path; updates DEFAULT_TTLS
+    path: optional SQLite database file to persist responses in between processes.
+        Responses are keyed by URL, so use a separate file for each set of credentials
+    """
+    DEFAULT_TTLS: Dict[str, float] = {
+        '/buildings': 5 * 60,
+        '/organizations': 60 * 60,
+        '/tags': 60 * 60,
+        '/equiptype': 60 * 60,
+        '/pointtypes': 60 * 60,
+        '/measurements': 60 * 60,
+        '/unit': 60 * 60,
+    }
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None,
+                 path: Optional[str] = None) -> None:
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.path = path
+        self._entries: Dict[str, _CachedResponse] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    fetched REAL NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content BLOB NOT NULL
+                )""")
+            self._db.commit()
+
+    def __repr__(self) -> str:
+        return f"MetadataCache(path={self.path})"
+
+    def ttl(self, url: str) -> Optional[float]:
+        parts = urllib.parse.urlsplit(url)
+        return self.ttls.get(parts.path if not parts.query else f'{parts.path}?{parts.query}')
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Drops cached responses for one endpoint path, or all of them. URLs match by
+        the end of their path, so those under an API url with a path prefix do too"""
+        def matches(url: str) -> bool:
+            return path is None or urllib.parse.urlsplit(url).path.endswith(path)
+
+        with self._lock:
+            for url in [u for u in self._entries if matches(u)]:
+                del self._entries[url]
+            if self._db is not None:
+                stored = self._db.execute("SELECT url FROM responses").fetchall()
+                self._db.executemany("DELETE FROM responses WHERE url = ?",
+                                     [(u,) for u, in stored if matches(u)])
+                self._db.commit()
+
+    def _lookup(self, url: str) -> Optional[_CachedResponse]:
+        entry = self._entries.get(url)
+        if entry is None and self._db is not None:
+            row = self._db.execute("SELECT fetched, etag, last_modified, content "
+                                   "FROM responses WHERE url = ?", (url,)).fetchone()
+            if row is not None:
+                entry = self._entries[url] = _CachedResponse(*row)
+        return entry
+
+    def _save(self, url: str, entry: _CachedResponse) -> None:
+        self._entries[url] = entry
+        if self._db is not None:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                             (url, entry.fetched, entry.etag, entry.last_modified,
+                              entry.content))
+            self._db.commit()
+
+    def fetch(self, url: str, send: Callable[[Dict[str, str]], requests.Response],
+              path: Optional[str] = None) -> requests.Response:
+        """Returns a cached response for url, calling send with any revalidation headers
+        when there is no fresh response
+        path: the endpoint path relative to the API's url, which ttls are looked up by.
+            Defaults to url's path, which only matches when the API url has no path"""
+        ttl = self.ttl(url if path is None else path)
+        if ttl is None:
+            return send({})
+
+        with self._lock:
+            entry = self._lookup(url)
+        if entry is not None and time.time() - entry.fetched < ttl:
+            return entry.response(url)
+
+        headers = {}
+        if entry is not None and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        res = send(headers)
+
+        if res.status_code == 304 and entry is not None:
+            entry.fetched = time.time()
+            with self._lock:
+                self._save(url, entry)
+            return entry.response(url)
+        if res.status_code == 200:
+            fresh = _CachedResponse(time.time(), res.headers.get('ETag'),
+                                    res.headers.get('Last-Modified'), res.content)
+            with self._lock:
+                self._save(url, fresh)
+        return res
+
+
+class RecordCache(object):
+    """In-memory least recently used cache of API records by id, e.g. equipment
+
+    Thread safe, so one cache can be shared by every thread using a client, or between
+    clients with the same credentials.
+
+    Records are held encoded as JSON, so every lookup returns new copies which callers
+    may modify without changing what the cache holds.
+
+    max_entries: records kept before the least recently used ones are evicted
+    ttl: seconds a record is served for, None to keep records until they are evicted
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: Optional[float] = 60 * 60) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._records: 'OrderedDict[int, Tuple[float, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"RecordCache(max_entries={self.max_entries}, ttl={self.ttl})"
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Returns the fresh records held for ids, by id"""
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for id in ids:
+                entry = self._records.get(id)
+                if entry is None:
+                    continue
+                if self.ttl is not None and now - entry[0] >= self.ttl:
+                    del self._records[id]
+                    continue
+                self._records.move_to_end(id)
+                found[id] = entry[1]
+        return {id: loads(record) for id, record in found.items()}
+
+    def put_many(self, records: Iterable[Dict[str, Any]], key: str = 'id') -> None:
+        now = time.monotonic()
+        with self._lock:
+            for record in records:
+                id = record.get(key)
+                if id is None:
+                    continue
+                self._records[id] = (now, dumps(record))
+                self._records.move_to_end(id)
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
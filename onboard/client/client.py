@@ -1,14 +1,27 @@
+import dataclasses
+import time
 import urllib.parse
+import requests
 from urllib3.util.retry import Retry
-from datetime import datetime
+from datetime import datetime, timedelta
 import deprecation
 from orjson import loads
-from typing import List, Dict, Any, Optional, Tuple, Union, Iterator
-from .util import divide_chunks, json
+from typing import List, Dict, Any, Optional, Set, Tuple, Union, Iterator, Iterable
+from .util import divide_chunks, bounded_map, changelog_url, iter_json_array, iter_records, \
+    json
 from .models import PointSelector, PointDataUpdate, IngestStats, \
-    TimeseriesQuery, PointData
+    TimeseriesQuery, PointData, point_data_constructor
 from .helpers import ClientBase
-from .exceptions import OnboardApiException
+from .exceptions import OnboardApiException, OnboardCircuitOpenException, \
+    OnboardTemporaryException
+from .timeseries import shard_query, merge_point_data
+from .cache import TimeseriesCache, MetadataCache, RecordCache
+from .transport import TransportConfig
+from .metrics import ClientHooks
+from .resilience import Resilience
+
+# bytes read from a streaming response body at a time
+DEFAULT_CHUNK_SIZE = 128 * 1024
 
 
 class APIClient(ClientBase):
@@ -20,8 +33,22 @@ class APIClient(ClientBase):
                  token: Optional[str] = None,
                  name: str = '',
                  retry: Optional[Retry] = None,
+                 max_workers: int = 1,
+                 timeseries_cache: Optional[TimeseriesCache] = None,
+                 metadata_cache: Optional[MetadataCache] = None,
+                 compression: Optional[str] = None,
+                 transport: Optional[TransportConfig] = None,
+                 hooks: Optional[ClientHooks] = None,
+                 resilience: Optional[Resilience] = None,
+                 equipment_cache: Optional[RecordCache] = None,
+                 coalesce: bool = False,
                  ) -> None:
-        super().__init__(api_url, user, pw, api_key, token, name, retry)
+        super().__init__(api_url, user, pw, api_key, token, name, retry, max_workers,
+                         metadata_cache, compression, transport, hooks, resilience, coalesce)
+        # when set, stream_point_timeseries only fetches samples missing from the cache
+        self.timeseries_cache = timeseries_cache
+        # when set, equipment looked up by id is only requested once it isn't cached
+        self.equipment_cache = equipment_cache
 
     @json
     def whoami(self) -> Dict[str, str]:
@@ -33,6 +60,10 @@ class APIClient(ClientBase):
         """returns the action audit log by or affecting the current account"""
         return self.get('/account-actions')
 
+    def iter_account_actions(self) -> Iterator[Dict[str, str]]:
+        """Like get_account_actions, but yields each action as it is read from the response"""
+        return self.__iter_array('/account-actions')
+
     @json
     def get_users(self) -> List[Dict[str, str]]:
         """returns the list of visible user accounts
@@ -63,15 +94,63 @@ class APIClient(ClientBase):
     def get_building_equipment(self, building_id: int) -> List[Dict[str, Any]]:
         return self.get(f'/buildings/{building_id}/equipment?points=true')
 
-    @json
-    def get_equipment_by_ids(self, equipment_ids: List[int]) -> List[Dict[str, object]]:
-        body = {'equipment_ids': equipment_ids}
-        return self.post('/equipment/query', json=body)
+    def iter_building_equipment(self, building_id: int) -> Iterator[Dict[str, Any]]:
+        """Like get_building_equipment, but yields each piece of equipment as it is read
+        from the response"""
+        return self.__iter_array(f'/buildings/{building_id}/equipment?points=true')
+
+    def iter_equipment_by_ids(self, equipment_ids: List[int],
+                              max_workers: Optional[int] = None,
+                              chunk_size: int = 500) -> Iterator[Dict[str, object]]:
+        """Yields the equipment for the given ids, in the order of the ids
+        Repeated ids are requested once and ids without equipment are skipped. Chunks of
+        ids are requested concurrently, and each chunk's equipment is yielded once it and
+        every chunk before it have arrived. With an equipment_cache only the ids which
+        aren't cached are requested
+        max_workers: overrides the client's limit on concurrent chunk requests
+        chunk_size: how many ids to request at a time"""
+        @json
+        def query(chunk: List[int]):
+            return self.post('/equipment/query', json={'equipment_ids': chunk})
+
+        def fetch(chunk: List[int]) -> Dict[Any, Dict[str, object]]:
+            equipment = query(chunk)
+            if self.equipment_cache is not None:
+                self.equipment_cache.put_many(equipment)
+            return {e.get('id'): e for e in equipment}
+
+        ids = list(dict.fromkeys(equipment_ids))
+        cached = self.equipment_cache.get_many(ids) if self.equipment_cache is not None else {}
+        missing = [id for id in ids if id not in cached]
+        chunks = bounded_map(fetch, divide_chunks(missing, chunk_size), self._workers(max_workers))
+        fetched: Dict[Any, Dict[str, object]] = {}
+        requested = 0
+        for id in ids:
+            equipment = cached.get(id)
+            if equipment is None:
+                if requested % chunk_size == 0:
+                    fetched = next(chunks)
+                requested += 1
+                equipment = fetched.get(id)
+            if equipment is not None:
+                yield equipment
+
+    def get_equipment_by_ids(self, equipment_ids: List[int],
+                             max_workers: Optional[int] = None) -> List[Dict[str, object]]:
+        return list(self.iter_equipment_by_ids(equipment_ids, max_workers))
 
     @json
-    def get_building_changelog(self, building_id: int) -> List[Dict[str, object]]:
-        """Returns a list of changelog entries for the specified building"""
-        return self.get(f'/buildings/{building_id}/changelog')
+    def get_building_changelog(self, building_id: int,
+                               since_id: Optional[int] = None
+                               ) -> List[Dict[str, object]]:
+        """Returns a list of changelog entries for the specified building
+        since_id: only returns the entries with a greater id"""
+        return self.get(changelog_url(building_id, since_id))
+
+    def iter_building_changelog(self, building_id: int, since_id: Optional[int] = None
+                                ) -> Iterator[Dict[str, object]]:
+        """Like get_building_changelog, but yields each entry as it is read from the response"""
+        return self.__iter_array(changelog_url(building_id, since_id))
 
     @json
     def select_points(self, selector: PointSelector) -> Dict[str, List[int]]:
@@ -91,43 +170,62 @@ class APIClient(ClientBase):
         newest = self.ts_to_dt(res['newest'])
         return (oldest, newest)
 
-    def get_all_points(self) -> List[Dict[str, Any]]:
-        """returns all points for all visible buildings"""
+    def _get_equipment_for_buildings(self, buildings: List[Dict[str, Any]],
+                                     max_workers: Optional[int]) -> Iterator[List[Dict]]:
+        def fetch(building: Dict[str, Any]) -> List[Dict]:
+            bldg_id = building['id']
+            try:
+                return self.get_building_equipment(bldg_id)
+            except OnboardApiException as e:
+                raise type(e)(f"Failed to fetch equipment for building {bldg_id}: {e}") from e
+
+        return bounded_map(fetch, buildings, self._workers(max_workers))
+
+    def get_all_points(self, max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """returns all points for all visible buildings
+        max_workers: overrides the client's limit on concurrent per-building requests"""
         buildings = self.get_all_buildings()
         points: List[Dict[str, Any]] = []
-        for b in buildings:
-            bldg_id = b['id']
-            equipment = self.get_building_equipment(bldg_id)
+        for equipment in self._get_equipment_for_buildings(buildings, max_workers):
             for e in equipment:
                 points += e['points']
         return points
 
-    def get_all_equipment(self) -> List[Dict]:
-        """returns all equipment instances for all visible buildings"""
+    def get_all_equipment(self, max_workers: Optional[int] = None) -> List[Dict]:
+        """returns all equipment instances for all visible buildings
+        max_workers: overrides the client's limit on concurrent per-building requests"""
         buildings = self.get_all_buildings()
         equipment = []
-        for b in buildings:
-            bldg_id = b['id']
-            equipment += self.get_building_equipment(bldg_id)
+        for building_equipment in self._get_equipment_for_buildings(buildings, max_workers):
+            equipment += building_equipment
         return equipment
 
-    def get_points_by_ids(self, point_ids: List[int]) -> List[Dict[str, str]]:
+    def iter_points_by_ids(self, point_ids: List[int],
+                           max_workers: Optional[int] = None) -> Iterator[Dict[str, str]]:
+        """Yields the points for the given ids as each request for a chunk of ids completes
+        Points are yielded in the same order as get_points_by_ids returns them
+        max_workers: overrides the client's limit on concurrent chunk requests"""
         @json
         def get_points(url):
             return self.get(url)
 
-        points = []
-        for chunk in divide_chunks(point_ids, 500):
+        def fetch(chunk: List[int]) -> List[Dict[str, str]]:
             points_str = '[' + ','.join(str(id) for id in chunk) + ']'
             url = f'/points?point_ids={points_str}'
             try:
-                points_chunk = get_points(url)
+                return get_points(url)
             except OnboardApiException as e:
                 if '"status": 404' in str(e):
-                    continue
+                    return []
                 raise e
-            points += points_chunk
-        return points
+
+        chunks = divide_chunks(point_ids, 500)
+        for points_chunk in bounded_map(fetch, chunks, self._workers(max_workers)):
+            yield from points_chunk
+
+    def get_points_by_ids(self, point_ids: List[int],
+                          max_workers: Optional[int] = None) -> List[Dict[str, str]]:
+        return list(self.iter_points_by_ids(point_ids, max_workers))
 
     # Deprecated
     def get_points_by_datasource(self, datasource_hashes: List[str]) \
@@ -181,40 +279,289 @@ class APIClient(ClientBase):
         }
         return self.post('/query', json=query)
 
-    def stream_point_timeseries(self, query: TimeseriesQuery) -> Iterator[PointData]:
+    def stream_point_timeseries(self, query: TimeseriesQuery,
+                                shard_interval: Optional[timedelta] = None,
+                                points_per_shard: Optional[int] = None,
+                                max_workers: Optional[int] = None,
+                                shard_retries: int = 2,
+                                columnar: bool = False,
+                                chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                stream_retries: int = 2,
+                                resample_locally: bool = True,
+                                ) -> Iterator[PointData]:
         """Query a time interval for an explicit set of point ids or
         with a selector which describes which sensors to include.
 
         Example values docmentaed on the model tab here:
             https://api.onboarddata.io/doc/#/buildings%3Aread/post_query_v2
-        """
 
+        Long or wide queries can be split into shards which are fetched concurrently:
+        shard_interval: fetch the query's time range in windows of this length
+        points_per_shard: fetch at most this many points per request
+        max_workers: overrides the client's limit on concurrent shard requests
+        shard_retries: how many times a shard which failed temporarily is resumed
+        Each point's shards are merged back into a single PointData
+
+        stream_retries: how many times an unsharded query which failed temporarily, even
+            partway through its response, is resumed. Resuming re-queries only the points
+            which have not been yielded yet.
+
+        columnar: yield columnar.ColumnarPointData, which holds each point's samples in
+            NumPy arrays, instead of PointData (requires numpy)
+        chunk_size: size in bytes of each read from the response body
+
+        If the client has a timeseries_cache, only samples missing from it are fetched
+
+        resample_locally: for a query with an interval, fetch raw samples and resample
+            them point by point on the client (requires numpy). This is the default, as
+            the API's parameters for resampling on the server are unconfirmed: pass False
+            to send the query's interval, aggregation and align to the server instead.
+            Queries with an interval are always resampled locally through a
+            timeseries_cache, which only holds raw samples.
+        """
+        local = resample_locally or self.timeseries_cache is not None
+        if query.interval is not None and local:
+            from .resample import resample_query_results
+            raw = self.stream_point_timeseries(
+                dataclasses.replace(query, interval=None), shard_interval, points_per_shard,
+                max_workers, shard_retries, False, chunk_size, stream_retries)
+            resampled = resample_query_results(raw, query)
+            yield from self.__to_columnar(resampled) if columnar else resampled
+            return
+
+        if self.timeseries_cache is None:
+            yield from self.__stream_uncached(query, shard_interval, points_per_shard,
+                                              max_workers, shard_retries, columnar, chunk_size,
+                                              stream_retries)
+            return
+
+        query_with_ids = self.__with_point_ids(query)
+        if query_with_ids is None:
+            return
+
+        def fetch(missing: TimeseriesQuery) -> Iterator[PointData]:
+            return self.__stream_uncached(missing, shard_interval, points_per_shard,
+                                          max_workers, shard_retries, False, chunk_size,
+                                          stream_retries)
+
+        points = self.timeseries_cache.stream(query_with_ids, fetch)
+        yield from self.__to_columnar(points) if columnar else points
+
+    def stream_point_timeseries_raw(self, query: TimeseriesQuery,
+                                    decode: bool = True,
+                                    chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                    ) -> Iterator[Any]:
+        """Like stream_point_timeseries, but skips building PointData objects
+
+        decode: yield each point as the dictionary decoded from its JSON record.
+            Otherwise yield each record undecoded as a memoryview, which is only valid
+            until the next record is requested (copy it with bytes() to keep it)
+        chunk_size: size in bytes of each read from the response body
+        """
         @json
         def query_call():
             return self.post('/query-v2', json=query.json(), stream=True,
                              headers={'Accept': 'application/x-ndjson'})
         query_call.raw_response = True  # type: ignore[attr-defined]
 
-        try:
-            # Pydantic v1
-            point_data = PointData.__pydantic_model__.construct  # type: ignore[attr-defined]
-        except AttributeError:
-            # Pydantic v2
-            point_data = PointData.model_construct  # type: ignore[attr-defined]
-
         with query_call() as res:
-            for line in res.iter_lines(chunk_size=20 * 1024):
-                parsed = loads(line)
+            records = iter_records(res.iter_content(chunk_size=chunk_size))
+            if self.hooks is not None:
+                yield from self.__timed_records(res, records, decode)
+            elif decode:
+                yield from map(loads, records)
+            else:
+                yield from records
+
+    def __timed_records(self, res: requests.Response, records: Iterator[memoryview],
+                        decode: bool) -> Iterator[Any]:
+        """Yields records while timing how long reading and decoding them takes"""
+        count = 0
+        decode_s = 0.0
+        total_s = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                record: Any = next(records, None)
+                if record is None:
+                    break
+                read = time.perf_counter()
+                if decode:
+                    record = loads(record)
+                end = time.perf_counter()
+                decode_s += end - read
+                total_s += end - start
+                count += 1
+                yield record
+        finally:
+            tell = getattr(res.raw, 'tell', None)
+            wire_bytes = tell() if callable(tell) else 0
+            self.hooks.on_stream('/query-v2', count, decode_s,  # type: ignore[union-attr]
+                                 total_s, wire_bytes)
+
+    def __iter_array(self, url: str,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Any]:
+        """Yields the elements of a JSON array response as they are decoded, so the whole
+        response is never held in memory. If the response links to a next page with a
+        Link header, the following pages are requested as the previous one runs out."""
+        @json
+        def get_page(page_url):
+            return self.get(page_url, stream=True)
+        get_page.raw_response = True  # type: ignore[attr-defined]
+
+        next_url: Optional[str] = url
+        while next_url is not None:
+            with get_page(next_url) as res:
+                try:
+                    yield from iter_json_array(res.iter_content(chunk_size=chunk_size))
+                except requests.RequestException as e:
+                    # the response broke off partway
+                    raise OnboardTemporaryException(e)
+                except ValueError as e:
+                    raise OnboardApiException(e)
+                next_url = res.links.get('next', {}).get('url')
+
+    def __with_point_ids(self, query: TimeseriesQuery) -> Optional[TimeseriesQuery]:
+        """Resolves a query's selector to explicit point ids, None if nothing is selected"""
+        if query.selector is None:
+            return query
+        point_ids = self.select_points(query.selector).get('points', [])
+        if not point_ids:
+            return None
+        return dataclasses.replace(query, selector=None, point_ids=point_ids)
+
+    def __to_columnar(self, points: Iterable[PointData]) -> Iterator[PointData]:
+        from .columnar import ColumnarPointData
+        yield from map(ColumnarPointData.from_point_data, points)  # type: ignore[misc]
+
+    def __stream_uncached(self, query: TimeseriesQuery,
+                          shard_interval: Optional[timedelta],
+                          points_per_shard: Optional[int],
+                          max_workers: Optional[int],
+                          shard_retries: int,
+                          columnar: bool,
+                          chunk_size: int,
+                          stream_retries: int) -> Iterator[PointData]:
+        if shard_interval is None and points_per_shard is None:
+            yield from self.__stream_query(query, columnar, chunk_size, stream_retries)
+            return
+
+        if points_per_shard is not None:
+            query_with_ids = self.__with_point_ids(query)
+            if query_with_ids is None:
+                return
+            query = query_with_ids
+
+        shards = shard_query(query, shard_interval, points_per_shard)
+
+        def fetch(shard: TimeseriesQuery) -> List[PointData]:
+            return list(self.__stream_query(shard, chunk_size=chunk_size,
+                                            retries=shard_retries))
+
+        # shards are fetched window by window for each group of points, so each group
+        # can be merged and yielded as soon as its last window arrives
+        windows = bounded_map(fetch, (w for group in shards for w in group),
+                              self._workers(max_workers))
+        for group in shards:
+            merged = merge_point_data(next(windows) for _ in group)
+            yield from self.__to_columnar(merged) if columnar else merged
+
+    def __stream_query(self, query: TimeseriesQuery, columnar: bool = False,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE,
+                       retries: int = 0) -> Iterator[PointData]:
+        records = self.__resumable_records(query, chunk_size, retries)
+        if columnar:
+            from .columnar import ColumnarPointData
+            yield from map(ColumnarPointData.from_json, records)  # type: ignore[misc]
+        else:
+            point_data = point_data_constructor()
+            for parsed in records:
                 yield point_data(**parsed)
 
+    def __resumable_records(self, query: TimeseriesQuery, chunk_size: int,
+                            retries: int) -> Iterator[Dict[str, Any]]:
+        """Yields a query's decoded records. If the query fails temporarily, before or
+        while its response is read, it is resumed for the points not yielded yet.
+        With a Resilience the waits between attempts are its backoff, and a circuit it
+        opened fails the query rather than being waited out here."""
+        yielded = set()
+        attempt = 0
+        wait = self.resilience.backoff if self.resilience is not None else 0.0
+        while True:
+            try:
+                for record in self.stream_point_timeseries_raw(query, chunk_size=chunk_size):
+                    yielded.add(record['point_id'])
+                    yield record
+                return
+            except OnboardCircuitOpenException:
+                raise
+            except OnboardApiException as e:
+                if attempt >= retries or not _is_temporary(e):
+                    raise
+                error: Exception = e
+            except requests.RequestException as e:
+                # raised by a response body which broke off partway
+                if attempt >= retries:
+                    raise
+                error = e
+
+            attempt += 1
+            if self.hooks is not None:
+                self.hooks.on_retry('/query-v2', attempt, error)
+            if self.resilience is not None:
+                wait = self.resilience.jitter(wait)
+            else:
+                wait = 0.5 * 2 ** (attempt - 1)
+            time.sleep(wait)
+            if yielded:
+                remaining = self.__remaining(query, yielded)
+                if remaining is None:
+                    return
+                query = remaining
+
+    def __remaining(self, query: TimeseriesQuery,
+                    yielded: Set[int]) -> Optional[TimeseriesQuery]:
+        """Narrows a query to the points which haven't been yielded, None if none are left
+
+        Records are whole points, so the time range stays the same"""
+        with_ids = self.__with_point_ids(query)
+        point_ids = [p for p in with_ids.point_ids if p not in yielded] if with_ids else []
+        if not point_ids:
+            return None
+        return dataclasses.replace(query, selector=None, point_ids=point_ids)
+
     @json
     def update_point_data(self, updates: List[PointDataUpdate] = []) -> None:
         """Bulk update point data, returns the number of updated points
-        updates: an iterable of models.PointDataUpdate objects"""
+        updates: an iterable of models.PointDataUpdate objects
+        See writer.PointDataWriter for sending batches concurrently"""
         for batch in divide_chunks(updates, 500):
             json = [u.json() for u in batch]
             self.post('/points_update', json=json).raise_for_status()
 
+    def update_point_data_arrays(self, point_ids: Any, values: Any, last_updated: Any,
+                                 first_updated: Any = None) -> None:
+        """Bulk update point data from columns rather than PointDataUpdate objects
+        point_ids: integer array
+        values: numeric, boolean or string array
+        last_updated, first_updated: datetime64 arrays or pandas datetime columns
+        Requires numpy, see updates.encode_point_updates"""
+        from .updates import encode_point_updates
+        for body in encode_point_updates(point_ids, values, last_updated, first_updated):
+            self.__post_point_updates(body)
+
+    def update_point_data_frame(self, df: Any) -> None:
+        """Bulk update point data from a DataFrame with point_id, value, last_updated
+        and optionally first_updated columns"""
+        from .updates import encode_point_update_frame
+        for body in encode_point_update_frame(df):
+            self.__post_point_updates(body)
+
+    @json
+    def __post_point_updates(self, body: bytes) -> None:
+        headers = {'Content-Type': 'application/json'}
+        self.post('/points_update', data=body, headers=headers).raise_for_status()
+
     @json
     def send_ingest_stats(self, ingest_stats: IngestStats) -> None:
         """Send timing and diagnostic info to the portal
@@ -227,11 +574,20 @@ class APIClient(ClientBase):
         """returns ingest stats for all buildings"""
         return self.get('/ingest-stats')
 
+    def iter_ingest_stats(self) -> Iterator[Dict[str, str]]:
+        """Like get_ingest_stats, but yields each building's stats as they are read from
+        the response"""
+        return self.__iter_array('/ingest-stats')
+
     @json
     def get_alerts(self) -> List[Dict[str, str]]:
         """returns a list of active alerts for all buildings"""
         return self.get('/alerts')
 
+    def iter_alerts(self) -> Iterator[Dict[str, str]]:
+        """Like get_alerts, but yields each alert as it is read from the response"""
+        return self.__iter_array('/alerts')
+
     @json
     def copy_point_data(self, point_id_map: Dict[int, int],
                         start_time: Union[str, datetime],
@@ -250,14 +606,17 @@ class APIClient(ClientBase):
 
 
 class DevelopmentAPIClient(APIClient):
+    # keyword arguments are passed through to APIClient, e.g. max_workers
     def __init__(self,
                  user: Optional[str] = None,
                  pw: Optional[str] = None,
                  api_key: Optional[str] = None,
                  token: Optional[str] = None,
                  retry: Optional[Retry] = None,
+                 **kwargs: Any,
                  ) -> None:
-        super().__init__('https://devapi.onboarddata.io', user, pw, api_key, token, retry=retry)
+        super().__init__('https://devapi.onboarddata.io', user, pw, api_key, token, retry=retry,
+                         **kwargs)
 
 
 class ProductionAPIClient(APIClient):
@@ -267,13 +626,25 @@ class ProductionAPIClient(APIClient):
                  api_key: Optional[str] = None,
                  token: Optional[str] = None,
                  retry: Optional[Retry] = None,
+                 **kwargs: Any,
                  ) -> None:
-        super().__init__('https://api.onboarddata.io', user, pw, api_key, token, retry=retry)
+        super().__init__('https://api.onboarddata.io', user, pw, api_key, token, retry=retry,
+                         **kwargs)
 
 
 class RtemClient(APIClient):
     def __init__(self,
                  api_key: Optional[str] = None,
                  retry: Optional[Retry] = None,
+                 **kwargs: Any,
                  ) -> None:
-        super().__init__('https://api.ny-rtem.com', api_key=api_key, retry=retry)
+        super().__init__('https://api.ny-rtem.com', api_key=api_key, retry=retry,
+                         **kwargs)
+
+
+def _is_temporary(e: OnboardApiException) -> bool:
+    """Whether a failed call is worth retrying: the API reported a temporary failure or
+    the request didn't get a response, which json wraps in OnboardApiException"""
+    if isinstance(e, OnboardTemporaryException):
+        return True
+    return bool(e.args) and isinstance(e.args[0], requests.RequestException)
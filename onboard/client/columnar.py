@@ -0,0 +1,193 @@
+import numpy as np
+from typing import Any, Dict, List, Sequence
+from .models import PointData
+
+
+_ZERO = np.uint8(ord('0'))
+_SEPARATORS = {4: b'-', 7: b'-', 10: b'T ', 13: b':', 16: b':'}
+# by month, with February in leap years
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def parse_timestamps_ns(times: Sequence[Any]) -> np.ndarray:
+    """Parses timestamps from the API into an int64 array of epoch nanoseconds
+
+    Accepts epoch millisecond numbers or ISO 8601 strings laid out as the API writes them,
+    e.g. 2023-01-01T00:00:00.000Z, with any number of fractional digits and a Z, +HH:MM
+    or no offset. Strings without an offset are assumed to be UTC. Strings are parsed by
+    arithmetic on their bytes rather than one at a time. Raises ValueError for other
+    layouts and for nulls.
+    """
+    if len(times) == 0:
+        return np.empty(0, dtype=np.int64)
+    if not isinstance(times[0], (str, bytes)):
+        epoch_ms = np.asarray(times, dtype=np.float64)
+        if np.isnan(epoch_ms).any():
+            raise ValueError("Timestamps contain nulls")
+        return epoch_ms.astype(np.int64) * 1_000_000
+    try:
+        raw = np.asarray(times, dtype=np.bytes_)
+    except UnicodeEncodeError as e:
+        raise ValueError(f"Not an ISO 8601 timestamp: {e}")
+    n, width = len(raw), raw.dtype.itemsize
+    chars = raw.view(np.uint8).reshape(n, width)
+    if chars[:, -1].all():
+        return _parse_iso_layout(chars)
+    # strings shorter than the widest are padded with NULs
+    lengths = width - np.count_nonzero(chars == 0, axis=1)
+    out = np.empty(n, dtype=np.int64)
+    for length in np.unique(lengths):
+        rows = lengths == length
+        out[rows] = _parse_iso_layout(chars[rows, :length])
+    return out
+
+
+def _parse_iso_layout(chars: np.ndarray) -> np.ndarray:
+    """Parses a matrix of equally long ISO 8601 strings, one per row, which must share
+    the first row's layout"""
+    length = chars.shape[1]
+    template = chars[0].tobytes()
+    if length < 19 or any(template[i:i + 1] not in allowed for i, allowed in
+                          _SEPARATORS.items()):
+        raise ValueError(f"Not an ISO 8601 timestamp: {template.decode(errors='replace')}")
+
+    literals = list(_SEPARATORS)
+    pos = 19
+    fraction = 0
+    if length > 19 and template[19:20] == b'.':
+        literals.append(19)
+        pos = 20
+        while pos < length and template[pos:pos + 1].isdigit():
+            pos += 1
+        fraction = pos - 20
+    suffix = template[pos:]
+    sign_at = None
+    if suffix == b'Z':
+        literals.append(pos)
+    elif len(suffix) == 6 and suffix[:1] in (b'+', b'-') and suffix[3:4] == b':':
+        sign_at = pos
+        literals.append(pos + 3)
+    elif suffix:
+        raise ValueError(f"Not an ISO 8601 timestamp: {template.decode(errors='replace')}")
+
+    # one contiguous row per character position, rather than one per timestamp
+    positions = np.ascontiguousarray(chars.T)
+    # every timestamp must have the same separators and digits everywhere else
+    for i in literals:
+        if not (positions[i] == positions[i, 0]).all():
+            raise ValueError("Timestamps don't share a layout")
+    digits = positions - _ZERO  # bytes below '0' wrap around to large values
+    for i in range(length):
+        if i not in literals and i != sign_at and not (digits[i] < 10).all():
+            raise ValueError("Timestamps contain non-digits")
+    if sign_at is not None and not np.isin(positions[sign_at], (ord('+'), ord('-'))).all():
+        raise ValueError("Timestamps contain an invalid offset")
+
+    def number(start: int, stop: int) -> np.ndarray:
+        value = digits[start].astype(np.int64)
+        for i in range(start + 1, stop):
+            value *= 10
+            value += digits[i]
+        return value
+
+    year, month, day = number(0, 4), number(5, 7), number(8, 10)
+    hour, minute, second = number(11, 13), number(14, 16), number(17, 19)
+    # int64 nanoseconds only reach from 1677 to 2262
+    out_of_range = (year < 1678) | (year > 2261) | (month < 1) | (month > 12) | (day < 1)
+    out_of_range |= (hour > 23) | (minute > 59) | (second > 60)
+    if out_of_range.any():
+        raise ValueError("Timestamps contain out of range fields")
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    if (day > _DAYS_IN_MONTH[month] + (leap & (month == 2))).any():
+        raise ValueError("Timestamps contain out of range fields")
+
+    # days since the epoch of a proleptic Gregorian date, see
+    # https://howardhinnant.github.io/date_algorithms.html#days_from_civil
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    seconds = (era * 146097 + day_of_era - 719468) * 86400 + hour * 3600 + minute * 60 + second
+    if sign_at is not None:
+        offset = number(sign_at + 1, sign_at + 3) * 3600 + number(sign_at + 4, sign_at + 6) * 60
+        seconds -= np.where(positions[sign_at] == ord('-'), -offset, offset)
+
+    nanoseconds = seconds * 1_000_000_000
+    if fraction:
+        # digits past nanoseconds are truncated
+        nanoseconds += number(20, 20 + min(fraction, 9)) * 10 ** (9 - min(fraction, 9))
+    return nanoseconds
+
+
+def to_float_array(values: Sequence[Any]) -> np.ndarray:
+    """Converts a column of sample values into float64, with NaN for nulls and non-numbers"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    out = np.empty(len(values), dtype=np.float64)
+    for i, v in enumerate(values):
+        try:
+            out[i] = np.nan if v is None else float(v)
+        except (TypeError, ValueError):
+            out[i] = np.nan
+    return out
+
+
+class ColumnarPointData(object):
+    """Column-oriented equivalent of models.PointData backed by NumPy arrays
+
+    timestamps: int64 epoch milliseconds
+    values: float64 array per data column (e.g. 'raw' and the unit), NaN where null
+    """
+    __slots__ = ['point_id', 'raw', 'unit', 'columns', 'timestamps', 'values']
+
+    def __init__(self, point_id: int, raw: str, unit: str, columns: List[str],
+                 timestamps: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+        self.point_id = point_id
+        self.raw = raw
+        self.unit = unit
+        self.columns = columns
+        self.timestamps = timestamps
+        self.values = values
+
+    @staticmethod
+    def from_json(parsed: Dict[str, Any]) -> 'ColumnarPointData':
+        """Builds columns from a decoded /query-v2 record"""
+        columns: List[str] = parsed['columns']
+        rows = parsed['values']
+        ts_index = columns.index('time')
+        data = list(zip(*rows)) if rows else [()] * len(columns)
+        values = {c: to_float_array(data[i]) for i, c in enumerate(columns) if i != ts_index}
+        return ColumnarPointData(parsed['point_id'], parsed['raw'], parsed['unit'], columns,
+                                 parse_timestamps_ns(data[ts_index]) // 1_000_000, values)
+
+    @staticmethod
+    def from_point_data(point: PointData) -> 'ColumnarPointData':
+        return ColumnarPointData.from_json({
+            'point_id': point.point_id, 'raw': point.raw, 'unit': point.unit,
+            'columns': point.columns, 'values': point.values,
+        })
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __repr__(self) -> str:
+        return f"ColumnarPointData(point_id={self.point_id}, unit={self.unit}, rows={len(self)})"
+
+    @property
+    def clean(self) -> np.ndarray:
+        """Values converted to the point's unit"""
+        return self.values[self.unit]
+
+    def datetimes(self) -> np.ndarray:
+        """Timestamps as a datetime64[ms] view, no copy is made"""
+        return self.timestamps.view('datetime64[ms]')
+
+    def to_series(self, column=None):
+        """Returns a pandas Series of one column (default: the unit column) on a UTC index"""
+        import pandas as pd
+        index = pd.DatetimeIndex(self.datetimes()).tz_localize('UTC')
+        column = self.unit if column is None else column
+        return pd.Series(self.values[column], index=index, name=self.point_id, copy=False)
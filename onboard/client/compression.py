@@ -0,0 +1,61 @@
+import gzip
+import sys
+from typing import Any, Dict
+from orjson import OPT_NON_STR_KEYS, dumps
+from urllib3.util.request import ACCEPT_ENCODING
+
+# request bodies smaller than this are sent as is, compressing them costs more than it saves
+DEFAULT_MIN_SIZE = 1024
+
+ENCODINGS = ('gzip', 'zstd')
+
+
+def _zstd() -> Any:
+    # the same module urllib3 decodes zstd responses with
+    if sys.version_info >= (3, 14):
+        from compression import zstd  # type: ignore[import-not-found]
+    else:
+        from backports import zstd  # type: ignore[import-not-found]
+    return zstd
+
+
+def check_encoding(encoding: str) -> None:
+    """Raises ValueError unless request bodies can be compressed with encoding"""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"compression must be one of {', '.join(ENCODINGS)}, saw {encoding}")
+    if encoding == 'zstd':
+        try:
+            _zstd()
+        except ImportError:
+            raise ValueError("zstd compression requires Python 3.9 or later and "
+                             "backports.zstd, install onboard.client[zstd]")
+
+
+def accepts(encoding: str) -> bool:
+    """True if responses compressed with encoding are decoded by urllib3 here"""
+    return encoding in ACCEPT_ENCODING.split(',')
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'gzip':
+        # level 6 trades a little ratio for much faster compression than gzip's default 9
+        return gzip.compress(body, compresslevel=6)
+    return _zstd().compress(body)
+
+
+def compress_request(kwargs: Dict[str, Any], encoding: str,
+                     min_size: int = DEFAULT_MIN_SIZE) -> Dict[str, Any]:
+    """Returns request keyword arguments with a json or bytes body compressed
+
+    Bodies under min_size bytes, form data and streamed bodies are left untouched
+    """
+    body = kwargs.get('data')
+    if kwargs.get('json') is not None:
+        # non-str keys are written as strings, the same as requests' own json encoding
+        body = dumps(kwargs['json'], option=OPT_NON_STR_KEYS)
+        if len(body) >= min_size:
+            kwargs = {k: v for k, v in kwargs.items() if k != 'json'}
+    if not isinstance(body, bytes) or len(body) < min_size:
+        return kwargs
+    headers = {**(kwargs.get('headers') or {}), 'Content-Encoding': encoding}
+    return {**kwargs, 'data': compress(body, encoding), 'headers': headers}
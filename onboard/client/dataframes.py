@@ -1,5 +1,7 @@
+import numpy as np
 import pandas as pd
-from typing import Iterable, Dict, List, Union
+from typing import Iterable, Iterator, Dict, List, Tuple
+from onboard.client.columnar import parse_timestamps_ns, to_float_array
 from onboard.client.models import PointData
 
 
@@ -50,58 +52,226 @@ def points_df_from_timeseries(timeseries, points=[]) -> pd.DataFrame:
 def points_df_from_streaming_timeseries(timeseries: Iterable[PointData],
                                         points=[],
                                         point_column_label=None,
+                                        time_index=False,
                                         ) -> pd.DataFrame:
-    """Returns a pandas dataframe from the results of a timeseries query"""
+    """Returns a pandas dataframe from the results of a timeseries query
+
+    Each point becomes one column, aligned with the others on its timestamps.
+    By default timestamps are kept as they were returned by the API in a 'timestamp'
+    column, with time_index=True they are parsed into a UTC DatetimeIndex instead.
+    Accepts PointData or columnar.ColumnarPointData.
+    """
     if point_column_label is None:
         def point_column_label(p):
             return p.get('id')
 
     point_names = {p['id']: point_column_label(p) for p in points}
-    columns: List[Union[str, int]] = ['timestamp']
-    dates = set()
-    data_by_point = {}
-
+    labels = []
+    keys = []
+    data = []
     for point in timeseries:
-        columns.append(point.point_id)
-        ts_index = point.columns.index('time')
-        data_index = point.columns.index(point.unit)
+        labels.append(point_names.get(point.point_id, point.point_id))
+        point_keys, point_data = _point_columns(point, time_index)
+        keys.append(point_keys)
+        data.append(point_data)
+    if not labels:
+        return pd.DataFrame()
 
-        point_data: Dict[str, Union[str, float, None]] = {}
-        data_by_point[point.point_id] = point_data
+    # one hash join over every point's timestamps, then a scatter into a single block
+    rows, sorted_keys = _align_timestamps(np.concatenate(keys), parse=time_index)
+    block = np.full((len(sorted_keys), len(labels)), np.nan)
+    non_numeric = {}
+    offset = 0
+    for i, point_data in enumerate(data):
+        point_rows = rows[offset:offset + len(point_data)]
+        offset += len(point_data)
+        if point_data.dtype == object:
+            column = np.full(len(sorted_keys), None, dtype=object)
+            column[point_rows] = point_data
+            non_numeric[i] = column
+        else:
+            block[point_rows, i] = point_data
 
-        for val in point.values:
-            ts: str = val[ts_index]  # type: ignore[assignment]
-            dates.add(ts)
-            clean = val[data_index]
-            point_data[ts] = clean
+    index = _utc_index(sorted_keys) if time_index else None
+    if non_numeric:
+        columns = {i: non_numeric.get(i, block[:, i]) for i in range(len(labels))}
+        df = pd.DataFrame(columns, index=index)
+        df.columns = pd.Index(labels)
+    else:
+        df = pd.DataFrame(block, index=index, columns=labels)
+    if not time_index:
+        df.insert(0, 'timestamp', sorted_keys)
+    return df
 
-    sorted_dates = list(dates)
-    sorted_dates.sort()
-    data = []
 
-    for d in sorted_dates:
-        row = {'timestamp': d}
-        for p in columns[1:]:
-            val = data_by_point[p].get(d)  # type: ignore
-            point_col = point_names.get(p, p)
-            row[point_col] = val  # type: ignore
-        data.append(row)
+def _point_columns(point: PointData, time_index: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns a point's timestamps and values as arrays
 
-    df = pd.DataFrame(data)
-    return df
+    Timestamps are left as returned by the API, unless they have been parsed already.
+    Values are float64 unless the point has non-numeric data.
+    """
+    if hasattr(point, 'timestamps'):
+        # columnar.ColumnarPointData, which has already parsed its timestamps
+        if time_index:
+            return point.timestamps, point.clean  # type: ignore[attr-defined]
+        return point.datetimes(), point.clean  # type: ignore[attr-defined]
+
+    columns = list(zip(*point.values)) or [()] * len(point.columns)
+    keys = np.array(columns[point.columns.index('time')], dtype=object)
+    values = columns[point.columns.index(point.unit)]
+    try:
+        return keys, np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return keys, np.array(values, dtype=object)
+
+
+def _align_timestamps(keys: np.ndarray, parse: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the row each key belongs to and the distinct keys in sorted order
+
+    With parse set, string keys are parsed into epoch milliseconds first
+    """
+    codes, uniques = pd.factorize(keys)
+    if parse and uniques.dtype == object:
+        # only distinct timestamps need parsing, which may collapse some of them further
+        parsed_codes, uniques = pd.factorize(parse_timestamps_ns(uniques) // 1_000_000)
+        codes = parsed_codes[codes]
+    order = np.argsort(uniques, kind='stable')
+    rank = np.empty(len(order), dtype=np.intp)
+    rank[order] = np.arange(len(order))
+    return rank[codes], np.asarray(uniques)[order]
+
+
+def _utc_index(epoch_ms: np.ndarray) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(epoch_ms.view('datetime64[ms]')).tz_localize('UTC')
+
+
+class TimeseriesFrameBuilder(object):
+    """Incrementally assembles a time-indexed dataframe from streamed points
+
+    Each point's samples are copied into preallocated timestamp, value and column buffers
+    as soon as it is added, so the PointData itself can be dropped straight away. Buffers
+    grow by doubling when a point doesn't fit. Values are stored as float64, non-numeric
+    samples become NaN.
+
+    Usage:
+        builder = TimeseriesFrameBuilder(points)
+        for point in client.stream_point_timeseries(query):
+            builder.add(point)
+        df = builder.frame()
+    """
+
+    def __init__(self, points=[], point_column_label=None, capacity: int = 1 << 16) -> None:
+        if point_column_label is None:
+            def point_column_label(p):
+                return p.get('id')
+        self.point_names = {p['id']: point_column_label(p) for p in points}
+        self.labels: List = []
+        self.rows = 0
+        self._timestamps = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty(capacity, dtype=np.float64)
+        self._columns = np.empty(capacity, dtype=np.int32)
+
+    def __len__(self) -> int:
+        """Number of buffered samples"""
+        return self.rows
+
+    def add(self, point: PointData) -> None:
+        if hasattr(point, 'timestamps'):
+            timestamps, values = point.timestamps, point.clean  # type: ignore[attr-defined]
+        else:
+            columns = list(zip(*point.values)) or [()] * len(point.columns)
+            timestamps = parse_timestamps_ns(columns[point.columns.index('time')]) // 1_000_000
+            values = to_float_array(columns[point.columns.index(point.unit)])
+
+        start, end = self.rows, self.rows + len(timestamps)
+        if end > len(self._timestamps):
+            self._grow(end)
+        self._timestamps[start:end] = timestamps
+        self._values[start:end] = values
+        self._columns[start:end] = len(self.labels)
+        self.labels.append(self.point_names.get(point.point_id, point.point_id))
+        self.rows = end
+
+    def _grow(self, required: int) -> None:
+        capacity = max(required, 2 * len(self._timestamps))
+        for name in ('_timestamps', '_values', '_columns'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.rows] = old[:self.rows]
+            setattr(self, name, new)
+
+    def frame(self) -> pd.DataFrame:
+        """Returns the buffered points as one column per point on a UTC DatetimeIndex"""
+        rows, sorted_keys = _align_timestamps(self._timestamps[:self.rows], parse=False)
+        block = np.full((len(sorted_keys), len(self.labels)), np.nan)
+        block[rows, self._columns[:self.rows]] = self._values[:self.rows]
+        return pd.DataFrame(block, index=_utc_index(sorted_keys), columns=self.labels)
+
+    def clear(self) -> None:
+        """Drops buffered points while keeping the allocated buffers for reuse"""
+        self.labels = []
+        self.rows = 0
+
+
+def iter_timeseries_frames(timeseries: Iterable[PointData],
+                           points=[],
+                           point_column_label=None,
+                           max_rows: int = 1_000_000,
+                           ) -> Iterator[pd.DataFrame]:
+    """Yields partial dataframes as the results of a timeseries query arrive
+
+    Each frame has one column per point on a UTC DatetimeIndex, like
+    points_df_from_streaming_timeseries(..., time_index=True), and covers the points
+    received since the previous frame. A frame is emitted once at least max_rows samples
+    are buffered, which bounds memory to roughly one frame at a time.
+    """
+    builder = TimeseriesFrameBuilder(points, point_column_label, capacity=max_rows)
+    for point in timeseries:
+        builder.add(point)
+        if len(builder) >= max_rows:
+            yield builder.frame()
+            builder.clear()
+    if builder.labels:
+        yield builder.frame()
 
 
 def df_time_index(df: pd.DataFrame,
                   time_col='timestamp', utc=True) -> pd.DataFrame:
-    dt_series = pd.to_datetime(df[time_col], infer_datetime_format=True)
-    datetime_index = pd.DatetimeIndex(dt_series.values)
+    """Replaces a dataframe's time_col with a DatetimeIndex, in UTC
+
+    Timestamps as the API returns them, ISO 8601 strings or epoch milliseconds, are
+    parsed with columnar.parse_timestamps_ns. Other layouts are left to pandas.
+    utc: localize the index to UTC, otherwise it holds naive UTC times
+    """
+    column = df[time_col]
+    if pd.api.types.is_datetime64_any_dtype(column):
+        index = pd.DatetimeIndex(column)
+        if index.tz is not None:
+            index = index.tz_convert(None)
+    else:
+        try:
+            index = pd.DatetimeIndex(parse_timestamps_ns(column.to_numpy()).view('M8[ns]'))
+        except (TypeError, ValueError):
+            index = pd.DatetimeIndex(pd.to_datetime(column, utc=True)).tz_convert(None)
     if utc:
-        datetime_index = datetime_index.tz_localize('UTC')
-    df_indexed = df.set_index(datetime_index)
-    df_indexed.drop(time_col, axis=1, inplace=True)
+        index = index.tz_localize('UTC')
+    df_indexed = df.drop(columns=time_col)
+    df_indexed.index = index.rename(None)
     return df_indexed
 
 
-def df_objs_to_numeric(df: pd.DataFrame):
-    cols = df.columns[df.dtypes.eq('object')]
-    return df[cols].apply(pd.to_numeric, errors='coerce')
+def df_objs_to_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns a dataframe's object and string columns converted to float64, with NaN
+    for values which aren't numbers
+
+    All columns are converted together: as one cast when every value is a number, a
+    numeric string or None, and by a single pd.to_numeric call otherwise.
+    """
+    cols = df.columns[[pd.api.types.is_string_dtype(t) for t in df.dtypes]]
+    block = df[cols].to_numpy(dtype=object)
+    try:
+        values = block.astype(np.float64)
+    except (TypeError, ValueError):
+        flat = pd.to_numeric(block.ravel(), errors='coerce')
+        values = np.asarray(flat, dtype=np.float64).reshape(block.shape)
+    return pd.DataFrame(values, index=df.index, columns=cols)
@@ -8,3 +8,10 @@ class OnboardTemporaryException(OnboardApiException):
     and should be retried
     """
     pass
+
+
+class OnboardCircuitOpenException(OnboardTemporaryException):
+    """Raised without calling the API because the endpoint has been failing,
+    see resilience.Resilience
+    """
+    pass
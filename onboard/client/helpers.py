@@ -1,13 +1,26 @@
 import datetime
+import threading
+import time
+import urllib.parse
 import requests
-from requests.adapters import HTTPAdapter
+from requests.adapters import BaseAdapter, HTTPAdapter, DEFAULT_POOLSIZE, DEFAULT_RETRIES
 from urllib3.util.retry import Retry
-from typing import Optional, Union, Any
+from typing import Hashable, Optional, Union, Any
+from orjson import dumps, OPT_SORT_KEYS
+from .cache import MetadataCache
+from .compression import check_encoding, compress_request
+from .transport import HTTP2Adapter, TransportConfig, unsent
+from .metrics import ClientHooks, endpoint_label
+from .resilience import Resilience
+from .singleflight import SingleFlight
 from .exceptions import OnboardApiException
 from .util import json
 
 USER_AGENT = 'Onboard Py-SDK'
 
+# POST endpoints which only read, so identical concurrent calls can share one response
+COALESCED_POSTS = frozenset(['/points/select', '/equipment/query'])
+
 
 class ClientBase:
     """Base class that implements HTTP methods against the API on top of requests"""
@@ -18,6 +31,13 @@ class ClientBase:
                  token: Optional[str],
                  name: Optional[str],
                  retry: Optional[Retry],
+                 max_workers: int = 1,
+                 metadata_cache: Optional[MetadataCache] = None,
+                 compression: Optional[str] = None,
+                 transport: Optional[TransportConfig] = None,
+                 hooks: Optional[ClientHooks] = None,
+                 resilience: Optional[Resilience] = None,
+                 coalesce: bool = False,
                  ) -> None:
         self.api_url = api_url
         self.api_key = api_key
@@ -26,20 +46,61 @@ class ClientBase:
         self.token = token
         self.name = name
         self.retry = retry
+        # upper bound on concurrent requests made by a single client call
+        self.max_workers = max(1, max_workers)
+        # serves reference data GETs, like /buildings, from a local cache
+        self.metadata_cache = metadata_cache
+        # content encoding for large request bodies ('gzip' or 'zstd'), responses are
+        # decompressed whenever the server compressed them, independently of this
+        if compression is not None:
+            check_encoding(compression)
+        self.compression = compression
+        # connection pooling, keep-alive, timeouts and HTTP/2
+        self.transport = transport or TransportConfig()
+        # notified of requests, retries, re-authentication and streams, see metrics
+        self.hooks = hooks
+        # retries with backoff, rate limiting and circuit breaking, see resilience
+        self.resilience = resilience
+        # identical concurrent GETs and read-only POSTs share one request and its response
+        self.coalesce = coalesce
+        self.__flights: SingleFlight[requests.Response] = SingleFlight()
         if not (api_key or token or (user and pw)):
             raise OnboardApiException("Need one of: user & pw, token or api_key")
         self.session: Optional[requests.Session] = None
+        self.__session_lock = threading.RLock()
 
     def __session(self):
-        if self.session is None:
-            self.session = requests.Session()
-            self.session.headers.update(self.headers())
-            self.session.headers.update(self.auth())
-        if self.retry:
-            # http adapter is probably superfluous but no harm as a 'just in case'
-            self.session.mount('http://', HTTPAdapter(max_retries=self.retry))
-            self.session.mount('https://', HTTPAdapter(max_retries=self.retry))
-        return self.session
+        # re-entrant because logging in with user & pw goes through the session being built
+        with self.__session_lock:
+            if self.session is None:
+                self.session = requests.Session()
+                # adapters are mounted once, with a connection pool sized so that
+                # concurrent calls don't have to discard connections
+                adapter = self.__adapter()
+                if adapter is not None:
+                    for prefix in ('http://', 'https://'):
+                        self.session.mount(prefix, adapter)
+                # HTTP/2 has no Connection header, its adapter limits kept alive connections
+                if not self.transport.keep_alive and not self.transport.http2:
+                    self.session.headers['Connection'] = 'close'
+                self.session.headers.update(self.headers())
+                self.session.headers.update(self.auth())
+            return self.session
+
+    def __adapter(self) -> Optional[BaseAdapter]:
+        transport = self.transport
+        pool_size = transport.pool_maxsize or max(self.max_workers, DEFAULT_POOLSIZE)
+        if transport.http2:
+            retries = self.retry.total if self.retry and isinstance(self.retry.total, int) else 0
+            return HTTP2Adapter(pool_size, transport.keep_alive, retries)
+        if self.retry or self.max_workers > 1 or transport.pool_maxsize:
+            return HTTPAdapter(max_retries=self.retry or DEFAULT_RETRIES,
+                               pool_maxsize=pool_size)
+        return None
+
+    def _workers(self, max_workers: Optional[int]) -> int:
+        """Per-call override of the client's concurrency limit"""
+        return self.max_workers if max_workers is None else max_workers
 
     def headers(self):
         agent = f"{USER_AGENT} ({self.name})" if self.name else USER_AGENT
@@ -60,6 +121,28 @@ class ClientBase:
         }
         return self.post('/login', json=payload)
 
+    @property
+    def max_reauth(self) -> int:
+        """How many times a call is retried with a new access token after a 401"""
+        return self.resilience.max_reauth if self.resilience is not None else 1
+
+    def reauthenticate(self, stale: Optional[str]) -> bool:
+        """Replaces the access token stale after the API rejected it
+
+        Returns False when a new one can't be had, because the client was only given a
+        token, or isn't needed, because it uses an API key. Concurrent calls which were
+        rejected with the same token log in once.
+        """
+        if self.api_key is not None or not (self.user and self.pw):
+            return False
+        with self.__session_lock:
+            if self.token == stale:
+                self.token = None
+                auth = self.auth()
+                if self.session is not None:
+                    self.session.headers.update(auth)
+        return True
+
     def __get_token(self):
         if self.token is None:
             login_res = self.__pw_login()
@@ -82,20 +165,105 @@ class ClientBase:
     # client as readable as possible
     # same idea here: each of these methods actually returns request.Response
 
+    def request(self, method: str, url: str, **kwargs) -> Any:
+        if 'timeout' not in kwargs:
+            kwargs['timeout'] = self.transport.timeout(url)
+        if self.compression is not None:
+            kwargs = compress_request(kwargs, self.compression)
+        key = self.__flight_key(method, url, kwargs)
+        if key is not None:
+            return self.__coalesced(key, lambda: self.__send(method, url, **kwargs))
+        return self.__send(method, url, **kwargs)
+
+    def __flight_key(self, method: str, url: str, kwargs: dict) -> Optional[Hashable]:
+        """Identifies a request which may share the response of an identical one in
+        flight, None if it must be sent on its own"""
+        if not self.coalesce or kwargs.get('stream'):
+            return None
+        if method == 'POST':
+            if urllib.parse.urlsplit(url).path not in COALESCED_POSTS:
+                return None
+        elif method != 'GET':
+            return None
+        body: Any
+        if 'json' in kwargs:
+            body = dumps(kwargs['json'], option=OPT_SORT_KEYS)
+        else:
+            body = kwargs.get('data')
+            if body is not None and not isinstance(body, (bytes, str)):
+                return None
+        headers = tuple(sorted((kwargs.get('headers') or {}).items()))
+        params = kwargs.get('params')
+        return (method, self.url(url), body, headers, repr(params) if params else None)
+
+    def __coalesced(self, key: Any, send: Any) -> requests.Response:
+        res, shared = self.__flights.do(key, send)
+        if shared and self.hooks is not None:
+            self.hooks.on_coalesce(key[0], endpoint_label(key[1]))
+        return res
+
+    def __send(self, method: str, url: str, **kwargs) -> requests.Response:
+        if self.resilience is not None:
+            errors = (requests.ConnectionError, requests.Timeout)
+            return self.resilience.send(endpoint_label(url),
+                                        lambda: self.__attempt(method, url, **kwargs),
+                                        errors, self.hooks, method, unsent)
+        return self.__attempt(method, url, **kwargs)
+
+    def __attempt(self, method: str, url: str, **kwargs) -> requests.Response:
+        if self.hooks is None:
+            return self.__session().request(method, self.url(url), **kwargs)
+
+        start = time.perf_counter()
+        res = self.__session().request(method, self.url(url), **kwargs)
+        seconds = time.perf_counter() - start
+        self.__record(method, url, res, seconds, kwargs.get('stream', False))
+        return res
+
+    def __record(self, method: str, url: str, res: requests.Response, seconds: float,
+                 stream: bool) -> None:
+        hooks: ClientHooks = self.hooks  # type: ignore[assignment]
+        endpoint = endpoint_label(url)
+        # urllib3 keeps a history of the retries its Retry made for this response
+        history = getattr(getattr(res.raw, 'retries', None), 'history', None) or ()
+        for attempt, retried in enumerate(history, 1):
+            hooks.on_retry(endpoint, attempt, retried.error)
+        body = res.request.body if res.request is not None else None
+        sent = len(body) if isinstance(body, (bytes, str)) else 0
+        if stream:
+            received = int(res.headers.get('Content-Length') or 0)
+        else:
+            received = len(res.content)
+        hooks.on_request(method, endpoint, res.status_code, seconds, sent, received)
+
     def get(self, url: str, **kwargs) -> Any:
-        return self.__session().get(self.url(url), **kwargs)
+        if self.metadata_cache is not None and not kwargs:
+            timeout = self.transport.timeout(url)
+            # ttls are by endpoint path, which doesn't include a path in api_url
+            path = url[len(self.api_url):] if url.startswith(self.api_url) else url
+
+            def fetch() -> requests.Response:
+                return self.metadata_cache.fetch(  # type: ignore[union-attr]
+                    self.url(url),
+                    lambda headers: self.__send('GET', url, headers=headers, timeout=timeout),
+                    path)
+
+            if self.coalesce:
+                return self.__coalesced(('GET', self.url(url), None, (), None), fetch)
+            return fetch()
+        return self.request('GET', url, **kwargs)
 
     def delete(self, url: str, **kwargs) -> Any:
-        return self.__session().delete(self.url(url), **kwargs)
+        return self.request('DELETE', url, **kwargs)
 
     def put(self, url: str, **kwargs) -> Any:
-        return self.__session().put(self.url(url), **kwargs)
+        return self.request('PUT', url, **kwargs)
 
     def post(self, url: str, **kwargs) -> Any:
-        return self.__session().post(self.url(url), **kwargs)
+        return self.request('POST', url, **kwargs)
 
     def patch(self, url: str, **kwargs) -> Any:
-        return self.__session().patch(self.url(url), **kwargs)
+        return self.request('PATCH', url, **kwargs)
 
     def ts_to_dt(self, ts: Optional[float]) -> Optional[datetime.datetime]:
         if ts is None:
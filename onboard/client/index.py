@@ -0,0 +1,239 @@
+from collections import defaultdict
+from typing import TYPE_CHECKING, AbstractSet, Any, Dict, Iterable, List, Optional, Set, \
+    Tuple
+from .models import PointSelector
+from .util import bounded_map
+
+if TYPE_CHECKING:
+    from .client import APIClient
+
+
+class PointIndex(object):
+    """Local index over points and equipment for evaluating PointSelectors in memory
+
+    Built from the same records the API returns: buildings (id, name, org_id),
+    organizations (id, name, short_name, name_abbr), equipment (id, building_id, suffix,
+    equip_type_id, points), point types and equipment types (id, tag_name) and points
+    (id, building_id, equip_id, point_type_id, name, datasource_hash, topic, last_updated).
+
+    select() mirrors APIClient.select_points: criteria of different kinds are combined
+    with AND, point ids, names, hashes and topics are combined with OR.
+    """
+
+    def __init__(self) -> None:
+        self.points: Dict[int, Dict[str, Any]] = {}
+        self.buildings: Dict[int, Dict[str, Any]] = {}
+        self.org_aliases: Dict[str, int] = {}
+        self.point_type_tags: Dict[Any, int] = {}
+        self.equipment_type_tags: Dict[Any, int] = {}
+        # building id -> id of the latest changelog entry when its equipment was indexed
+        self.changelog_cursors: Dict[int, int] = {}
+
+        self._building_points: Dict[int, Set[int]] = defaultdict(set)
+        self._building_equipment: Dict[int, Set[int]] = defaultdict(set)
+        self._equipment_points: Dict[int, Set[int]] = defaultdict(set)
+        self._equipment_suffixes: Dict[str, Set[int]] = defaultdict(set)
+        self._equipment_type_points: Dict[int, Set[int]] = defaultdict(set)
+        self._point_type_points: Dict[int, Set[int]] = defaultdict(set)
+        self._point_names: Dict[str, Set[int]] = defaultdict(set)
+        self._point_hashes: Dict[str, Set[int]] = defaultdict(set)
+        self._point_topics: Dict[str, Set[int]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __repr__(self) -> str:
+        return f"PointIndex(buildings={len(self.buildings)}, points={len(self.points)})"
+
+    @staticmethod
+    def from_client(client: 'APIClient', max_workers: Optional[int] = None) -> 'PointIndex':
+        """Fetches every visible building's equipment and points and indexes them"""
+        index = PointIndex()
+        for org_id, org in client.get_organizations().items():
+            index.add_organization({'id': int(org_id), **org})
+        index.set_point_types(client.get_all_point_types())
+        index.set_equipment_types(client.get_equipment_types())
+        buildings = client.get_all_buildings()
+        checked = [(b, None) for b in buildings]
+        for building, cursor, equipment in index._fetch(client, checked, max_workers):
+            index.add_building(building, equipment, cursor)
+        return index
+
+    @staticmethod
+    def _fetch(client: 'APIClient', buildings: Iterable[Tuple[Dict, Optional[int]]],
+               max_workers: Optional[int]
+               ) -> Iterable[Tuple[Dict, Optional[int], List[Dict]]]:
+        """Fetches the equipment of buildings paired with the id of their latest
+        changelog entry, or None to read the whole changelog first"""
+        def fetch(checked: Tuple[Dict, Optional[int]]
+                  ) -> Tuple[Dict, Optional[int], List[Dict]]:
+            # the changelog is read before the equipment so that changes made while the
+            # equipment is being fetched show up on the next refresh
+            building, cursor = checked
+            if cursor is None:
+                cursor = latest_change(client.get_building_changelog(building['id']))
+            return building, cursor, client.get_building_equipment(building['id'])
+
+        return bounded_map(fetch, buildings, client._workers(max_workers))
+
+    def refresh(self, client: 'APIClient', max_workers: Optional[int] = None) -> List[int]:
+        """Re-indexes buildings whose changelog changed, returns their ids
+
+        Only the changelog entries after the latest one already seen are requested.
+        Buildings which are no longer visible are dropped and new ones are added
+        """
+        buildings: Dict[Any, Dict[str, Any]] = {b['id']: b for b in client.get_all_buildings()}
+        for building_id in set(self.buildings) - set(buildings):
+            self.remove_building(building_id)
+
+        def check(building: Dict[str, Any]) -> Tuple[Dict, Optional[int], bool]:
+            cursor = self.changelog_cursors.get(building['id'])
+            changes = client.get_building_changelog(building['id'], since_id=cursor)
+            latest = latest_change(changes, cursor)
+            return building, latest, building['id'] not in self.buildings or latest != cursor
+
+        checked = bounded_map(check, buildings.values(), client._workers(max_workers))
+        stale = [(b, latest) for b, latest, changed in checked if changed]
+        for building, cursor, equipment in self._fetch(client, stale, max_workers):
+            self.remove_building(building['id'])
+            self.add_building(building, equipment, cursor)
+        return [b['id'] for b, _ in stale]
+
+    def add_organization(self, org: Dict[str, Any]) -> None:
+        for key in ('id', 'name', 'short_name', 'name_abbr'):
+            if org.get(key) is not None:
+                self.org_aliases[str(org[key])] = org['id']
+
+    def set_point_types(self, point_types: Iterable[Dict[str, Any]]) -> None:
+        self.point_type_tags = {t['tag_name']: t['id'] for t in point_types
+                                if t.get('tag_name') is not None}
+
+    def set_equipment_types(self, equipment_types: Iterable[Dict[str, Any]]) -> None:
+        self.equipment_type_tags = {t['tag_name']: t['id'] for t in equipment_types
+                                    if t.get('tag_name') is not None}
+
+    def add_building(self, building: Dict[str, Any], equipment: Iterable[Dict[str, Any]],
+                     changelog_cursor: Optional[int] = None) -> None:
+        building_id = building['id']
+        self.buildings[building_id] = building
+        if changelog_cursor is not None:
+            self.changelog_cursors[building_id] = changelog_cursor
+        for e in equipment:
+            self._building_equipment[building_id].add(e['id'])
+            if e.get('suffix') is not None:
+                self._equipment_suffixes[e['suffix']].add(e['id'])
+            for p in e.get('points', []):
+                self._add_point(p, building_id, e)
+
+    def _add_point(self, point: Dict[str, Any], building_id: int,
+                   equipment: Dict[str, Any]) -> None:
+        point_id = point['id']
+        self.points[point_id] = point
+        self._building_points[building_id].add(point_id)
+        self._equipment_points[equipment['id']].add(point_id)
+        if equipment.get('equip_type_id') is not None:
+            self._equipment_type_points[equipment['equip_type_id']].add(point_id)
+        if point.get('point_type_id') is not None:
+            self._point_type_points[point['point_type_id']].add(point_id)
+        for key, lookup in (('name', self._point_names),
+                            ('datasource_hash', self._point_hashes),
+                            ('topic', self._point_topics)):
+            if point.get(key) is not None:
+                lookup[point[key]].add(point_id)
+
+    def remove_building(self, building_id: int) -> None:
+        point_ids = self._building_points.pop(building_id, set())
+        equipment_ids = self._building_equipment.pop(building_id, set())
+        self.buildings.pop(building_id, None)
+        self.changelog_cursors.pop(building_id, None)
+        lookups: List[Dict[Any, Set[int]]] = [
+            self._equipment_points, self._equipment_type_points, self._point_type_points,
+            self._point_names, self._point_hashes, self._point_topics,
+        ]
+        for lookup in lookups:
+            for key in list(lookup):
+                lookup[key] -= point_ids
+                if not lookup[key]:
+                    del lookup[key]
+        for key in list(self._equipment_suffixes):
+            self._equipment_suffixes[key] -= equipment_ids
+            if not self._equipment_suffixes[key]:
+                del self._equipment_suffixes[key]
+        for point_id in point_ids:
+            self.points.pop(point_id, None)
+
+    def _building_ids(self, buildings: Iterable[Any]) -> Set[int]:
+        ids = set()
+        for b in buildings:
+            if isinstance(b, int):
+                ids.add(b)
+            else:
+                ids.update(i for i, bldg in self.buildings.items() if bldg.get('name') == b)
+        return ids
+
+    def _union(self, lookup: Dict[Any, Set[int]], keys: Iterable[Any]) -> Set[int]:
+        found: Set[int] = set()
+        for key in keys:
+            found |= lookup.get(key, set())
+        return found
+
+    def select(self, selector: PointSelector) -> Dict[str, List[int]]:
+        """Evaluates a selector against the index, returns the matching point ids along
+        with their buildings and equipment"""
+        matches: Optional[Set[int]] = None
+
+        def narrow(ids: Set[int]) -> None:
+            nonlocal matches
+            matches = ids if matches is None else matches & ids
+
+        if selector.orgs:
+            org_ids = {self.org_aliases.get(str(o)) for o in selector.orgs}
+            building_ids = {i for i, b in self.buildings.items() if b.get('org_id') in org_ids}
+            narrow(self._union(self._building_points, building_ids))
+        if selector.buildings:
+            narrow(self._union(self._building_points, self._building_ids(selector.buildings)))
+        if selector.point_ids or selector.point_names or selector.point_hashes \
+                or selector.point_topics:
+            explicit = {p for p in selector.point_ids if p in self.points}
+            explicit |= self._union(self._point_names, selector.point_names)
+            explicit |= self._union(self._point_hashes, selector.point_hashes)
+            explicit |= self._union(self._point_topics, selector.point_topics)
+            narrow(explicit)
+        if selector.point_types:
+            type_ids = [self.point_type_tags.get(t, t) for t in selector.point_types]
+            narrow(self._union(self._point_type_points, type_ids))
+        if selector.equipment:
+            equipment_ids = [e for e in selector.equipment if isinstance(e, int)]
+            equipment_ids += [i for e in selector.equipment if isinstance(e, str)
+                              for i in self._equipment_suffixes.get(e, set())]
+            narrow(self._union(self._equipment_points, equipment_ids))
+        if selector.equipment_types:
+            type_ids = [self.equipment_type_tags.get(t, t) for t in selector.equipment_types]
+            narrow(self._union(self._equipment_type_points, type_ids))
+
+        selected: AbstractSet[int] = self.points.keys() if matches is None else matches
+        if selector.updated_since is not None:
+            since = selector.updated_since.timestamp() * 1000
+            selected = {p for p in selected
+                        if (self.points[p].get('last_updated') or 0) >= since}
+
+        points = sorted(selected)
+        return {
+            'points': points,
+            'buildings': self._related(points, 'building_id'),
+            'equipment': self._related(points, 'equip_id'),
+        }
+
+    def _related(self, point_ids: List[int], key: str) -> List[int]:
+        return sorted({self.points[p][key] for p in point_ids
+                       if self.points[p].get(key) is not None})
+
+
+def latest_change(changelog: List[Dict[str, Any]], since_id: Optional[int] = None
+                  ) -> Optional[int]:
+    """Id of the latest entry in a building's changelog, or since_id if there is none
+    after it. Entries up to since_id are ignored in case the API returned them anyway"""
+    ids = [e['id'] for e in changelog if e.get('id') is not None]
+    if since_id is not None:
+        ids.append(since_id)
+    return max(ids, default=None)
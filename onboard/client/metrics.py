@@ -0,0 +1,226 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+# upper bounds in seconds, the same defaults Prometheus client libraries use
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_label(url: str) -> str:
+    """Groups urls by endpoint, e.g. /buildings/12/equipment?points=true becomes
+    /buildings/{id}/equipment"""
+    return _ID_SEGMENT.sub('/{id}', urlparse(url).path)
+
+
+class ClientHooks(object):
+    """Callbacks a client invokes as it works, subclass and override the ones you need
+
+    endpoint is a url path with ids replaced, see endpoint_label
+    """
+
+    def on_request(self, method: str, endpoint: str, status: int, seconds: float,
+                   bytes_sent: int, bytes_received: int) -> None:
+        """Called once a response's headers arrive. For streamed responses bytes_received
+        is the Content-Length, when the server sent one, and seconds is the time to the
+        first byte."""
+
+    def on_retry(self, endpoint: str, attempt: int, error: Optional[BaseException]) -> None:
+        """Called before a failed request or batch is attempted again"""
+
+    def on_reauth(self, endpoint: str) -> None:
+        """Called when a 401 discards the client's access token"""
+
+    def on_stream(self, endpoint: str, records: int, decode_seconds: float,
+                  total_seconds: float, bytes_received: int) -> None:
+        """Called when a timeseries stream has been consumed. decode_seconds is the part
+        of total_seconds spent parsing records rather than waiting on the network."""
+
+    def on_coalesce(self, method: str, endpoint: str) -> None:
+        """Called when a call shares the response of an identical one already in flight
+        instead of sending its own request"""
+
+
+class Histogram(object):
+    """Cumulative bucket counts of observed values"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        out = []
+        for bound, count in zip(list(self.buckets) + [float('inf')], self.counts):
+            total += count
+            out.append(('+Inf' if bound == float('inf') else repr(bound), total))
+        return out
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile by interpolating within its bucket, like Prometheus'
+        histogram_quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if seen + count >= rank and count:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.buckets[-1]
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics(ClientHooks):
+    """Aggregates client activity into counters and latency histograms
+
+        metrics = Metrics()
+        client = OnboardClient(api_key=..., hooks=metrics)
+        ...
+        print(metrics.prometheus())  # or serve it from a /metrics endpoint
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 prefix: str = 'onboard_client') -> None:
+        self.buckets = buckets
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = defaultdict(dict)
+        self.counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+
+    def _observe(self, name: str, labels: Labels, value: float) -> None:
+        histograms = self.histograms[name]
+        if labels not in histograms:
+            histograms[labels] = Histogram(self.buckets)
+        histograms[labels].observe(value)
+
+    def on_request(self, method: str, endpoint: str, status: int, seconds: float,
+                   bytes_sent: int, bytes_received: int) -> None:
+        labels = (('method', method), ('endpoint', endpoint), ('status', str(status)))
+        with self._lock:
+            self._observe('request_seconds', labels, seconds)
+            self.counters['sent_bytes'][labels[:2]] += bytes_sent
+            self.counters['received_bytes'][labels[:2]] += bytes_received
+
+    def on_retry(self, endpoint: str, attempt: int, error: Optional[BaseException]) -> None:
+        with self._lock:
+            self.counters['retries'][(('endpoint', endpoint),)] += 1
+
+    def on_reauth(self, endpoint: str) -> None:
+        with self._lock:
+            self.counters['reauths'][(('endpoint', endpoint),)] += 1
+
+    def on_stream(self, endpoint: str, records: int, decode_seconds: float,
+                  total_seconds: float, bytes_received: int) -> None:
+        labels = (('endpoint', endpoint),)
+        with self._lock:
+            self._observe('stream_decode_seconds', labels, decode_seconds)
+            self._observe('stream_seconds', labels, total_seconds)
+            self.counters['stream_records'][labels] += records
+            self.counters['stream_received_bytes'][labels] += bytes_received
+
+    def on_coalesce(self, method: str, endpoint: str) -> None:
+        with self._lock:
+            self.counters['coalesced'][(('method', method), ('endpoint', endpoint))] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values as plain dicts, with p50/p95/p99 estimates for histograms"""
+        with self._lock:
+            out: Dict[str, Any] = {}
+            for name, series in self.histograms.items():
+                out[name] = {labels: {'count': h.count, 'sum': h.sum,
+                                      'p50': h.quantile(0.5), 'p95': h.quantile(0.95),
+                                      'p99': h.quantile(0.99)}
+                             for labels, h in series.items()}
+            for name, values in self.counters.items():
+                out[name] = dict(values)
+            return out
+
+    def prometheus(self) -> str:
+        """Renders every metric in the Prometheus text exposition format, which
+        OpenTelemetry collectors can also scrape"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self.histograms.items()):
+                metric = f'{self.prefix}_{name}'
+                lines.append(f'# TYPE {metric} histogram')
+                for labels, h in sorted(series.items()):
+                    for le, count in h.cumulative():
+                        bucket_labels = _format_labels(labels + (('le', le),))
+                        lines.append(f'{metric}_bucket{bucket_labels} {count}')
+                    lines.append(f'{metric}_sum{_format_labels(labels)} {h.sum}')
+                    lines.append(f'{metric}_count{_format_labels(labels)} {h.count}')
+            for name, values in sorted(self.counters.items()):
+                metric = f'{self.prefix}_{name}_total'
+                lines.append(f'# TYPE {metric} counter')
+                for labels, value in sorted(values.items()):
+                    lines.append(f'{metric}{_format_labels(labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"'))
+                     for k, v in labels)
+    return '{' + pairs + '}'
+
+
+class OpenTelemetryHooks(ClientHooks):
+    """Records client activity with OpenTelemetry instruments from the given meter
+
+        from opentelemetry import metrics
+        hooks = OpenTelemetryHooks(metrics.get_meter('onboard.client'))
+    """
+
+    def __init__(self, meter: Any, prefix: str = 'onboard.client') -> None:
+        self.request_duration = meter.create_histogram(
+            f'{prefix}.request.duration', unit='s', description='Time to response headers')
+        self.sent = meter.create_counter(f'{prefix}.request.body.size', unit='By')
+        self.received = meter.create_counter(f'{prefix}.response.body.size', unit='By')
+        self.retries = meter.create_counter(f'{prefix}.retries')
+        self.reauths = meter.create_counter(f'{prefix}.reauths')
+        self.decode_duration = meter.create_histogram(f'{prefix}.stream.decode.duration',
+                                                      unit='s')
+        self.stream_records = meter.create_counter(f'{prefix}.stream.records')
+        # kept apart from response.body.size, on_request already counted the streamed
+        # response's Content-Length there
+        self.stream_received = meter.create_counter(f'{prefix}.stream.body.size', unit='By')
+        self.coalesced = meter.create_counter(f'{prefix}.coalesced')
+
+    def on_request(self, method: str, endpoint: str, status: int, seconds: float,
+                   bytes_sent: int, bytes_received: int) -> None:
+        attributes = {'http.method': method, 'endpoint': endpoint, 'http.status_code': status}
+        self.request_duration.record(seconds, attributes)
+        self.sent.add(bytes_sent, attributes)
+        self.received.add(bytes_received, attributes)
+
+    def on_retry(self, endpoint: str, attempt: int, error: Optional[BaseException]) -> None:
+        self.retries.add(1, {'endpoint': endpoint})
+
+    def on_reauth(self, endpoint: str) -> None:
+        self.reauths.add(1, {'endpoint': endpoint})
+
+    def on_stream(self, endpoint: str, records: int, decode_seconds: float,
+                  total_seconds: float, bytes_received: int) -> None:
+        self.decode_duration.record(decode_seconds, {'endpoint': endpoint})
+        self.stream_records.add(records, {'endpoint': endpoint})
+        self.stream_received.add(bytes_received, {'endpoint': endpoint})
+
+    def on_coalesce(self, method: str, endpoint: str) -> None:
+        self.coalesced.add(1, {'http.method': method, 'endpoint': endpoint})
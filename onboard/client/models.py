@@ -1,6 +1,6 @@
 import math
-from datetime import datetime, timezone
-from typing import List, Optional, Union, Dict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Union, Dict
 from dataclasses import field
 from pydantic.dataclasses import dataclass
 from pydantic import validator, BaseModel
@@ -61,6 +61,12 @@ class IngestStats(object):
         }
 
 
+# how samples within a resampling bucket are combined
+AGGREGATIONS = ('mean', 'min', 'max', 'sum', 'count', 'first', 'last')
+# what resampling buckets are aligned to
+ALIGNMENTS = ('epoch', 'start')
+
+
 @dataclass
 class PointSelector:
     """A flexible interface to allow users to select sets of points"""
@@ -121,12 +127,21 @@ class TimeseriesQuery:
     {'temperature': 'f', 'power': 'kw'}
 
     See https://portal.onboarddata.io/account?tab=unitPrefs for available measurements and units
+
+    Setting interval resamples each point into buckets of that length, one value per
+    bucket computed with aggregation (see AGGREGATIONS). Buckets start at multiples of
+    interval since the epoch, or since start with align='start', and are labelled with
+    their start time. Clients resample locally by default, see
+    APIClient.stream_point_timeseries.
     """
     start: datetime  # timezone required
     end: datetime  # timezone required
     selector: Optional[PointSelector] = None
     point_ids: List[int] = field(default_factory=list)
     units: Dict[str, str] = field(default_factory=dict)  # unit conversion preferences
+    interval: Optional[timedelta] = None  # raw samples when None
+    aggregation: str = 'mean'
+    align: str = 'epoch'
 
     @validator('point_ids')
     def points_or_selector_required(cls, point_ids, values):
@@ -142,14 +157,44 @@ class TimeseriesQuery:
             raise ValueError(f'Time boundaries require a timezone, saw: {value}')
         return value
 
+    @validator('interval')
+    def interval_positive(cls, value):
+        if value is not None and value <= timedelta(0):
+            raise ValueError(f'Resampling interval must be positive, saw {value}')
+        return value
+
+    @validator('aggregation')
+    def aggregation_known(cls, value):
+        if value not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {value}, expected one of "
+                             f"{', '.join(AGGREGATIONS)}")
+        return value
+
+    @validator('align')
+    def align_known(cls, value):
+        if value not in ALIGNMENTS:
+            raise ValueError(f"Unknown alignment {value}, expected one of "
+                             f"{', '.join(ALIGNMENTS)}")
+        return value
+
     def json(self):
-        return {
+        query = {
             'start': self.start.timestamp(),
             'end': self.end.timestamp(),
             'selector': self.selector.json() if self.selector is not None else None,
             'point_ids': self.point_ids,
             'units': self.units,
         }
+        if self.interval is not None:
+            query.update(interval=self.interval.total_seconds(), aggregation=self.aggregation,
+                         align=self.align)
+        return query
+
+    def bucket_origin(self) -> datetime:
+        """The time resampling buckets are counted from"""
+        if self.align == 'start':
+            return self.start
+        return datetime.fromtimestamp(0, timezone.utc)
 
 
 @dataclass
@@ -159,3 +204,13 @@ class PointData(BaseModel):
     unit: str
     columns: List[str]
     values: List[List[Union[str, float, int, None]]]
+
+
+def point_data_constructor() -> Callable[..., PointData]:
+    """Returns the validation-free constructor for PointData"""
+    try:
+        # Pydantic v1
+        return PointData.__pydantic_model__.construct  # type: ignore[attr-defined]
+    except AttributeError:
+        # Pydantic v2
+        return PointData.model_construct  # type: ignore[attr-defined]
@@ -0,0 +1,109 @@
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional
+from .columnar import parse_timestamps_ns, to_float_array
+from .models import AGGREGATIONS, PointData, TimeseriesQuery, point_data_constructor
+
+
+def resample_point_data(points: Iterable[PointData], interval: timedelta,
+                        aggregation: str = 'mean',
+                        origin: Optional[datetime] = None) -> Iterator[PointData]:
+    """Downsamples each point into one row per bucket of interval as it arrives
+
+    Only one point's raw samples are held at a time, so memory is bounded by the largest
+    point rather than the whole query. Buckets start at multiples of interval since
+    origin, the epoch by default, and are labelled with their start time in the format
+    the point's timestamps came in. Every column besides 'time' is aggregated as float,
+    non-numeric samples count as nulls. Buckets without any samples are left out and
+    buckets without any non-null samples for a column are None in that column (0 with
+    aggregation='count').
+    """
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation {aggregation}, expected one of "
+                         f"{', '.join(AGGREGATIONS)}")
+    interval_ms = round(interval.total_seconds() * 1000)
+    if interval_ms <= 0:
+        raise ValueError(f"Resampling interval must be positive, saw {interval}")
+    epoch = datetime.fromtimestamp(0, timezone.utc)
+    origin_ms = round(((origin or epoch) - epoch).total_seconds() * 1000)
+
+    point_data = point_data_constructor()
+    for point in points:
+        values = _resample_values(point, interval_ms, origin_ms, aggregation)
+        yield point_data(point_id=point.point_id, raw=point.raw, unit=point.unit,
+                         columns=point.columns, values=values)
+
+
+def resample_query_results(points: Iterable[PointData],
+                           query: TimeseriesQuery) -> Iterator[PointData]:
+    """Resamples raw results as the server would have for a query with an interval"""
+    if query.interval is None:
+        return iter(points)
+    return resample_point_data(points, query.interval, query.aggregation,
+                               query.bucket_origin())
+
+
+def _resample_values(point: PointData, interval_ms: int, origin_ms: int,
+                     aggregation: str) -> List[List]:
+    if not point.values:
+        return []
+    ts_index = point.columns.index('time')
+    columns = list(zip(*point.values))
+    times = parse_timestamps_ns(columns[ts_index]) // 1_000_000
+    buckets = (times - origin_ms) // interval_ms
+    order = None
+    if len(buckets) > 1 and (buckets[1:] < buckets[:-1]).any():
+        order = np.argsort(buckets, kind='stable')
+        buckets = buckets[order]
+    # index of each sample's bucket among the distinct buckets
+    new_bucket = np.empty(len(buckets), dtype=bool)
+    new_bucket[0] = True
+    np.not_equal(buckets[1:], buckets[:-1], out=new_bucket[1:])
+    bucket_index = np.cumsum(new_bucket) - 1
+    labels = buckets[new_bucket] * interval_ms + origin_ms
+
+    out: List[List] = []
+    for i, column in enumerate(columns):
+        if i == ts_index:
+            out.append(_format_times(labels, isinstance(column[0], str)))
+            continue
+        samples = to_float_array(column)
+        if order is not None:
+            samples = samples[order]
+        out.append(_aggregate(samples, bucket_index, len(labels), aggregation))
+    return [list(row) for row in zip(*out)]
+
+
+def _aggregate(samples: np.ndarray, bucket_index: np.ndarray, n_buckets: int,
+               aggregation: str) -> List:
+    """Combines the non-null samples of each bucket, None for buckets without any"""
+    valid = ~np.isnan(samples)
+    samples = samples[valid]
+    index = bucket_index[valid]
+    counts = np.bincount(index, minlength=n_buckets)
+    if aggregation == 'count':
+        return counts.tolist()
+
+    result = np.full(n_buckets, np.nan)
+    if len(samples):
+        starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+        keys = index[starts]
+        if aggregation in ('mean', 'sum'):
+            result[keys] = np.add.reduceat(samples, starts)
+            if aggregation == 'mean':
+                result[keys] /= counts[keys]
+        elif aggregation == 'min':
+            result[keys] = np.minimum.reduceat(samples, starts)
+        elif aggregation == 'max':
+            result[keys] = np.maximum.reduceat(samples, starts)
+        elif aggregation == 'first':
+            result[keys] = samples[starts]
+        else:
+            result[keys] = samples[np.r_[starts[1:], len(samples)] - 1]
+    return [None if v != v else v for v in result.tolist()]
+
+
+def _format_times(epoch_ms: np.ndarray, iso: bool) -> List:
+    if not iso:
+        return epoch_ms.tolist()
+    return [t + 'Z' for t in np.datetime_as_string(epoch_ms.astype('datetime64[ms]'))]
@@ -0,0 +1,296 @@
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Tuple, Type
+from .exceptions import OnboardCircuitOpenException
+
+# statuses which mean the request was not served and may succeed later
+RETRY_STATUSES = (429, 502, 503, 504)
+# statuses which also mean the server did not act on the request, unlike a gateway error
+# which may arrive after the API applied it
+UNPROCESSED_STATUSES = (429, 503)
+# methods which may be sent again after failing partway, as with urllib3's Retry
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'])
+# POST endpoints which only read
+READ_ONLY_POSTS = frozenset(['/query', '/query-v2', '/points/select', '/equipment/query',
+                             '/points/data-availability'])
+
+
+class TokenBucket(object):
+    """Limits requests to rate per second on average, with bursts of up to burst
+
+    Thread safe, share one between clients to limit them together. A bucket which has
+    been paused, for instance by a Retry-After header, holds back every request until
+    the pause is over rather than letting each caller find out for itself.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token, returns the seconds to wait before it may be used"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker(object):
+    """Rejects calls after failures consecutive failures, for reset_after seconds
+
+    Once reset_after has passed a single trial call is let through: the circuit closes
+    again if it succeeds and stays open for another reset_after if it fails.
+    """
+
+    def __init__(self, failures: int = 5, reset_after: float = 30.0) -> None:
+        self.failures = failures
+        self.reset_after = reset_after
+        self._failed = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_after:
+                return 'half-open'
+            return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_after:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if success:
+                self._failed = 0
+                self._opened_at = None
+            else:
+                self._failed += 1
+                if self._probing or self._failed >= self.failures:
+                    self._opened_at = time.monotonic()
+            self._probing = False
+
+
+def retry_after(headers: Any) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header, in seconds or as an HTTP date"""
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+@dataclass
+class Resilience:
+    """How a client retries, paces and sheds its requests
+
+    retries: attempts after the first for responses with a status in retry_statuses and
+        for connection errors and timeouts
+    backoff, max_backoff: bounds in seconds of the decorrelated jitter between attempts,
+        each wait is drawn between backoff and three times the previous wait
+    max_retry_after: a Retry-After header is honoured up to this many seconds, longer
+        waits are not retried and the response is returned as is
+    rate_limit: paces every request, and is paused for everyone when the API asks for a
+        Retry-After
+    breaker_failures, breaker_reset: each endpoint's circuit opens after this many
+        consecutive 5xx responses or connection errors and rejects calls with
+        OnboardCircuitOpenException until breaker_reset seconds pass. None disables it
+    max_reauth: logins to retry a call with after a 401 says its access token expired
+    retry_methods, read_only_posts: requests with these methods, or POSTs to these
+        endpoints, are retried as above. Others, such as the POSTs writing point data,
+        might be applied twice by a retry, so they are only retried when the connection
+        failed before they were sent or with a status in UNPROCESSED_STATUSES
+    """
+    retries: int = 3
+    backoff: float = 0.1
+    max_backoff: float = 20.0
+    retry_statuses: Tuple[int, ...] = RETRY_STATUSES
+    max_retry_after: float = 60.0
+    rate_limit: Optional[TokenBucket] = None
+    breaker_failures: Optional[int] = 5
+    breaker_reset: float = 30.0
+    max_reauth: int = 1
+    retry_methods: FrozenSet[str] = IDEMPOTENT_METHODS
+    read_only_posts: FrozenSet[str] = READ_ONLY_POSTS
+    _breakers: Dict[str, CircuitBreaker] = field(default_factory=dict, init=False,
+                                                 repr=False, compare=False)
+    _lock: Any = field(default_factory=threading.Lock, init=False, repr=False,
+                       compare=False)
+
+    def breaker(self, endpoint: str) -> Optional[CircuitBreaker]:
+        if self.breaker_failures is None:
+            return None
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(self.breaker_failures, self.breaker_reset)
+                self._breakers[endpoint] = breaker
+            return breaker
+
+    def _admit(self, endpoint: str, breaker: Optional[CircuitBreaker]) -> float:
+        """Raises if endpoint's circuit is open, returns the seconds to wait for the
+        rate limit otherwise"""
+        if breaker is not None and not breaker.allow():
+            raise OnboardCircuitOpenException(
+                f"{endpoint} failed {breaker.failures} times in a row, not retrying for "
+                f"up to {breaker.reset_after}s")
+        return self.rate_limit.reserve() if self.rate_limit is not None else 0.0
+
+    def idempotent(self, method: str, endpoint: str) -> bool:
+        """Whether a request may be retried after it failed partway"""
+        method = method.upper()
+        return method in self.retry_methods or \
+            (method == 'POST' and endpoint in self.read_only_posts)
+
+    def _next_wait(self, breaker: Optional[CircuitBreaker], res: Any,
+                   error: Optional[BaseException], attempt: int, previous: float,
+                   idempotent: bool,
+                   unsent: Optional[Callable[[BaseException], bool]]) -> Optional[float]:
+        """Records the outcome of an attempt, returns the seconds to wait before retrying
+        it or None if it should not be retried"""
+        status = res.status_code if res is not None else None
+        if breaker is not None:
+            breaker.record(error is None and status < 500)  # type: ignore[operator]
+        if attempt >= self.retries:
+            return None
+        if error is not None:
+            if not idempotent and (unsent is None or not unsent(error)):
+                return None
+        elif status not in self.retry_statuses or \
+                (not idempotent and status not in UNPROCESSED_STATUSES):
+            return None
+        if res is not None:
+            wait = retry_after(res.headers)
+            if wait is not None:
+                if wait > self.max_retry_after:
+                    return None
+                if self.rate_limit is not None:
+                    self.rate_limit.pause(wait)
+                return wait
+        return self.jitter(previous)
+
+    def jitter(self, previous: float) -> float:
+        """The seconds to wait before another attempt, given the previous wait"""
+        return min(self.max_backoff, random.uniform(self.backoff, previous * 3))
+
+    def send(self, endpoint: str, send: Callable[[], Any],
+             errors: Tuple[Type[BaseException], ...], hooks: Any = None,
+             method: str = 'GET',
+             unsent: Optional[Callable[[BaseException], bool]] = None) -> Any:
+        """Calls send until it returns a response which needn't be retried, or until it
+        runs out of retries. Exceptions in errors are retried, others propagate.
+        unsent tells which of those errors mean the request never reached the server,
+        the only ones a request which isn't idempotent is retried for."""
+        idempotent = self.idempotent(method, endpoint)
+        breaker = self.breaker(endpoint)
+        wait = self.backoff
+        attempt = 0
+        while True:
+            pace = self._admit(endpoint, breaker)
+            if pace > 0:
+                time.sleep(pace)
+            res = None
+            error: Optional[BaseException] = None
+            try:
+                res = send()
+            except errors as e:
+                error = e
+            except BaseException:
+                # not retried, but still a failed call: a half-open circuit must not wait
+                # for the outcome of its trial call forever
+                if breaker is not None:
+                    breaker.record(False)
+                raise
+            next_wait = self._next_wait(breaker, res, error, attempt, wait, idempotent,
+                                        unsent)
+            if next_wait is None:
+                if error is not None:
+                    raise error
+                return res
+            if res is not None:
+                res.close()
+            attempt += 1
+            wait = next_wait
+            if hooks is not None:
+                hooks.on_retry(endpoint, attempt, error)
+            time.sleep(wait)
+
+    async def asend(self, endpoint: str, send: Callable[[], Awaitable[Any]],
+                    errors: Tuple[Type[BaseException], ...], hooks: Any = None,
+                    method: str = 'GET',
+                    unsent: Optional[Callable[[BaseException], bool]] = None) -> Any:
+        """Async counterpart of send"""
+        idempotent = self.idempotent(method, endpoint)
+        breaker = self.breaker(endpoint)
+        wait = self.backoff
+        attempt = 0
+        while True:
+            pace = self._admit(endpoint, breaker)
+            if pace > 0:
+                await asyncio.sleep(pace)
+            res = None
+            error: Optional[BaseException] = None
+            try:
+                res = await send()
+            except errors as e:
+                error = e
+            except BaseException:
+                # not retried, but still a failed call: a half-open circuit must not wait
+                # for the outcome of its trial call forever
+                if breaker is not None:
+                    breaker.record(False)
+                raise
+            next_wait = self._next_wait(breaker, res, error, attempt, wait, idempotent,
+                                        unsent)
+            if next_wait is None:
+                if error is not None:
+                    raise error
+                return res
+            if res is not None:
+                await res.aclose()
+            attempt += 1
+            wait = next_wait
+            if hooks is not None:
+                hooks.on_retry(endpoint, attempt, error)
+            await asyncio.sleep(wait)
@@ -0,0 +1,91 @@
+import dataclasses
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from .models import PointData, TimeseriesQuery
+from .util import divide_chunks
+
+
+def time_windows(start: datetime, end: datetime,
+                 interval: timedelta) -> List[Tuple[datetime, datetime]]:
+    """Splits [start, end] into consecutive windows no longer than interval"""
+    if interval <= timedelta(0):
+        raise ValueError(f"Shard interval must be positive, saw {interval}")
+    windows = []
+    window_start = start
+    while True:
+        window_end = min(window_start + interval, end)
+        windows.append((window_start, window_end))
+        if window_end >= end:
+            return windows
+        window_start = window_end
+
+
+def shard_query(query: TimeseriesQuery,
+                interval: Optional[timedelta] = None,
+                points_per_shard: Optional[int] = None) -> List[List[TimeseriesQuery]]:
+    """Splits a query into groups of smaller queries
+
+    Each group covers one shard of query's point ids and holds one query per time window,
+    in chronological order. Sharding by point requires an explicit list of point ids.
+    Windows of a resampled query are aligned to its buckets so none is split between two
+    windows, which requires interval to be a multiple of the query's interval.
+    """
+    if points_per_shard is not None:
+        if query.selector is not None:
+            raise ValueError("Sharding by point requires a query with explicit point ids")
+        point_shards: List[List[int]] = list(divide_chunks(query.point_ids, points_per_shard))
+    else:
+        point_shards = [query.point_ids]
+
+    if interval is not None and query.interval is not None:
+        windows = bucket_windows(query, interval)
+    elif interval is not None:
+        windows = time_windows(query.start, query.end, interval)
+    else:
+        windows = [(query.start, query.end)]
+
+    return [[dataclasses.replace(query, start=start, end=end, point_ids=point_ids)
+             for start, end in windows]
+            for point_ids in point_shards]
+
+
+def bucket_windows(query: TimeseriesQuery,
+                   interval: timedelta) -> List[Tuple[datetime, datetime]]:
+    """Splits a resampled query's time range into windows of whole buckets
+
+    Boundaries fall on bucket starts and each window but the last ends a millisecond
+    before the next begins, since both ends of a query are inclusive.
+    """
+    assert query.interval is not None
+    if interval <= timedelta(0) or interval % query.interval:
+        raise ValueError(f"Shard interval {interval} must be a multiple of the query's "
+                         f"resampling interval {query.interval}")
+    origin = query.bucket_origin()
+    first = origin + (query.start - origin) // interval * interval
+    windows = time_windows(first, query.end, interval)
+    windows[0] = (query.start, windows[0][1])
+    last = len(windows) - 1
+    return [(start, end if i == last else end - timedelta(milliseconds=1))
+            for i, (start, end) in enumerate(windows)]
+
+
+def merge_point_data(windows: Iterable[Iterable[PointData]]) -> List[PointData]:
+    """Merges the results of consecutive time windows into a single PointData per point
+
+    Points are returned in the order they first appear. Samples repeated on the boundary
+    between two windows are only kept once.
+    """
+    merged: Dict[int, PointData] = {}
+    for window in windows:
+        for point in window:
+            existing = merged.get(point.point_id)
+            if existing is None:
+                merged[point.point_id] = point
+                continue
+            values = point.values
+            if values and existing.values and 'time' in point.columns:
+                ts_index = point.columns.index('time')
+                if values[0][ts_index] == existing.values[-1][ts_index]:
+                    values = values[1:]
+            existing.values.extend(values)
+    return list(merged.values())
@@ -0,0 +1,160 @@
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+from urllib.parse import urlparse
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+# seconds, or a (connect, read) pair as accepted by requests, None waits indefinitely
+Timeout = Union[None, float, Tuple[Optional[float], Optional[float]]]
+
+# endpoint classes by path prefix, anything else is 'default'
+ENDPOINT_CLASSES = (
+    ('/query-v2', 'stream'),
+    ('/points_update', 'write'),
+    ('/ingest-stats', 'write'),
+)
+TIMEOUT_CLASSES = ('default', 'stream', 'write')
+
+
+def endpoint_class(url: str) -> str:
+    path = urlparse(url).path
+    for prefix, name in ENDPOINT_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return 'default'
+
+
+@dataclass
+class TransportConfig:
+    """Connection settings shared by every request a client makes
+
+    pool_maxsize: connections kept open per host, by default the client's max_workers or
+        10, whichever is larger
+    keep_alive: reuse connections between requests
+    timeouts: timeout per endpoint class: 'stream' for /query-v2, 'write' for
+        /points_update and /ingest-stats and 'default' for everything else.
+        Classes without an entry use 'default', requests waits indefinitely without one.
+    http2: multiplex requests over one HTTP/2 connection per host with httpx,
+        requires onboard.client[http2]. urllib3 Retry settings are not applied, only
+        Retry.total connection attempts are retried.
+    """
+    pool_maxsize: Optional[int] = None
+    keep_alive: bool = True
+    timeouts: Dict[str, Timeout] = field(default_factory=dict)
+    http2: bool = False
+
+    def __post_init__(self) -> None:
+        unknown = set(self.timeouts) - set(TIMEOUT_CLASSES)
+        if unknown:
+            raise ValueError(f"Unknown endpoint classes {sorted(unknown)}, "
+                             f"expected some of {', '.join(TIMEOUT_CLASSES)}")
+
+    def timeout(self, url: str) -> Timeout:
+        return self.timeouts.get(endpoint_class(url), self.timeouts.get('default'))
+
+
+def httpx_timeout(timeout: Timeout) -> Any:
+    import httpx
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(None, connect=connect, read=read)
+    return httpx.Timeout(timeout)
+
+
+def unsent(e: BaseException) -> bool:
+    """Whether a requests error means the connection failed, so the request never
+    reached the server"""
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(e, requests.exceptions.ConnectionError) or not e.args:
+        return False
+    reason = e.args[0]
+    reason = getattr(reason, 'reason', reason)  # urllib3's MaxRetryError wraps the cause
+    if isinstance(reason, (NewConnectionError, ConnectTimeoutError)):
+        return True
+    httpx = sys.modules.get('httpx')  # HTTP2Adapter wraps httpx's errors
+    return httpx is not None and isinstance(reason, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def httpx_unsent(e: BaseException) -> bool:
+    """Whether an httpx error means the request never reached the server"""
+    import httpx
+    return isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+class _RawStream(object):
+    """Stands in for urllib3's response so requests can stream an httpx response body"""
+
+    def __init__(self, response: Any) -> None:
+        self.response = response
+
+    def stream(self, chunk_size: int, decode_content: bool = True) -> Iterator[bytes]:
+        import httpx
+        try:
+            # httpx has already decoded any Content-Encoding
+            yield from self.response.iter_bytes(chunk_size)
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        finally:
+            self.response.close()
+
+    def close(self) -> None:
+        self.response.close()
+
+    def release_conn(self) -> None:
+        self.response.close()
+
+
+class HTTP2Adapter(BaseAdapter):
+    """requests transport adapter which sends requests with an HTTP/2 httpx.Client
+
+    Concurrent requests to one host share a single multiplexed connection. Hosts which
+    don't negotiate HTTP/2 are spoken to over HTTP/1.1. Certificate verification and
+    proxies follow httpx's defaults rather than the session's settings.
+    """
+
+    def __init__(self, pool_maxsize: int = 10, keep_alive: bool = True,
+                 retries: int = 0) -> None:
+        super().__init__()
+        import httpx
+        limits = httpx.Limits(max_connections=pool_maxsize,
+                              max_keepalive_connections=pool_maxsize if keep_alive else 0)
+        transport = httpx.HTTPTransport(http2=True, limits=limits, retries=retries)
+        self.client = httpx.Client(http2=True, transport=transport, timeout=None)
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False,
+             timeout: Timeout = None, verify: Any = True, cert: Any = None,
+             proxies: Any = None) -> requests.Response:
+        import httpx
+        body = request.body.encode() if isinstance(request.body, str) else request.body
+        built = self.client.build_request(request.method or 'GET', request.url or '',
+                                          headers=dict(request.headers), content=body,
+                                          timeout=httpx_timeout(timeout))
+        try:
+            res = self.client.send(built, stream=True)
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(e, request=request)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        response = requests.Response()
+        response.status_code = res.status_code
+        response.reason = res.reason_phrase
+        response.headers = CaseInsensitiveDict(res.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _RawStream(res)
+        response.url = str(res.url)
+        response.request = request
+        response.connection = self  # type: ignore[assignment]
+        if not stream:
+            response.content  # read the body now, as requests does
+        return response
+
+    def close(self) -> None:
+        self.client.close()
@@ -0,0 +1,155 @@
+from typing import Any, Iterator, List, Optional, Union
+import numpy as np
+from orjson import dumps, OPT_SERIALIZE_NUMPY
+
+NULL = b'null'
+
+# updates laid out at once, the payload of a few batches rather than of every update
+BLOCK_ROWS = 1 << 16
+
+
+def epoch_ms(times: Any, name: str = 'last_updated') -> np.ndarray:
+    """Converts datetime64 values or a pandas datetime column to int64 epoch milliseconds
+
+    Every value's wall clock time is taken as UTC, like PointDataUpdate does, so naive
+    values are UTC and timezone aware ones drop their offset. NaT is kept as numpy's NaT
+    sentinel so callers can test for it with np.isnat on the datetime view.
+    """
+    accessor = getattr(times, 'dt', times)
+    if getattr(accessor, 'tz', None) is not None:
+        times = accessor.tz_localize(None)
+    arr = np.asarray(times)
+    if arr.dtype.kind != 'M':
+        raise ValueError(f"{name} must hold datetimes, saw {arr.dtype}")
+    return arr.astype('datetime64[ms]').astype(np.int64)
+
+
+def _digits(ints: np.ndarray) -> np.ndarray:
+    """Renders non-negative integers as right aligned ASCII digits, one row per integer"""
+    width = len(str(int(ints.max()))) if len(ints) else 1
+    out = np.zeros((len(ints), width), dtype=np.uint8)
+    rest = ints.astype(np.uint64)
+    for col in range(width - 1, -1, -1):
+        significant = rest > 0
+        rest, digit = np.divmod(rest, np.uint64(10))
+        out[:, col] = digit + ord('0')
+        if col < width - 1:
+            out[:, col] *= significant  # leading zeros become NUL padding
+    return out
+
+
+def _json_ints(ints: np.ndarray) -> np.ndarray:
+    if len(ints) and ints.min() < 0:
+        return _as_matrix(ints.astype('S'))
+    return _digits(ints)
+
+
+def _json_values(values: np.ndarray) -> np.ndarray:
+    """Renders each element of values as a JSON scalar, one NUL padded row per element"""
+    kind = values.dtype.kind
+    if kind == 'f' and len(values):
+        # orjson formats floats far faster than numpy's astype(str) and writes NaN as null
+        raw = dumps(np.ascontiguousarray(values, dtype=np.float64), option=OPT_SERIALIZE_NUMPY)
+        return _as_matrix(np.array(raw[1:-1].split(b','), dtype='S'))
+    if kind in 'iu':
+        return _json_ints(values)
+    if kind == 'b':
+        return _as_matrix(np.where(values, b'true', b'false'))
+    # strings and mixed objects have no vectorized JSON encoding, and may hold numpy scalars
+    encoded = [dumps(v, option=OPT_SERIALIZE_NUMPY) for v in values.tolist()]
+    return _as_matrix(np.array(encoded, dtype='S'))
+
+
+def _json_times(ms: np.ndarray) -> np.ndarray:
+    missing = np.isnat(ms.view('datetime64[ms]'))
+    out = _json_ints(np.where(missing, 0, ms))
+    if missing.any():
+        if out.shape[1] < len(NULL):
+            out = np.pad(out, ((0, 0), (len(NULL) - out.shape[1], 0)))
+        out[missing] = 0
+        out[missing, -len(NULL):] = np.frombuffer(NULL, dtype=np.uint8)
+    return out
+
+
+def _as_matrix(strings: np.ndarray) -> np.ndarray:
+    """Views a fixed width bytes array as a uint8 matrix"""
+    return strings.view(np.uint8).reshape(len(strings), strings.dtype.itemsize)
+
+
+def _lay_out(ids: np.ndarray, vals: np.ndarray, last_ms: np.ndarray,
+             first_ms: Optional[np.ndarray]) -> np.ndarray:
+    """Lays every update out as one fixed width row of bytes, padded with NUL"""
+    first_json: Union[bytes, np.ndarray] = NULL
+    if first_ms is not None:
+        first_json = _json_times(first_ms)
+    fields: List[Union[bytes, np.ndarray]] = [
+        b'{"id":', _json_ints(ids), b',"value":', _json_values(vals),
+        b',"last_updated":', _json_ints(last_ms), b',"first_updated":', first_json, b'},',
+    ]
+    widths = [len(f) if isinstance(f, bytes) else f.shape[1] for f in fields]
+    rows = np.zeros((len(ids), sum(widths)), dtype=np.uint8)
+    col = 0
+    for field, width in zip(fields, widths):
+        if isinstance(field, bytes):
+            field = np.frombuffer(field, dtype=np.uint8)
+        rows[:, col:col + width] = field
+        col += width
+    return rows
+
+
+def validate_point_updates(point_ids: np.ndarray, values: np.ndarray,
+                           last_updated: np.ndarray,
+                           first_updated: Optional[np.ndarray] = None) -> None:
+    """Checks arrays of updates the way PointDataUpdate checks a single update"""
+    errors: List[str] = []
+    lengths = {len(point_ids), len(values), len(last_updated)}
+    if first_updated is not None:
+        lengths.add(len(first_updated))
+    if len(lengths) > 1:
+        errors.append(f"columns must have the same length, saw {sorted(lengths)}")
+    if point_ids.dtype.kind not in 'iu':
+        errors.append(f"point ids must be integers, saw {point_ids.dtype}")
+    missing = np.flatnonzero(np.isnat(last_updated.view('datetime64[ms]')))
+    if len(missing):
+        errors.append(f"last updated is missing for {len(missing)} updates, "
+                      f"first at row {missing[0]}")
+    if errors:
+        raise ValueError(f"Invalid point data updates: {', '.join(errors)}")
+
+
+def encode_point_updates(point_ids: Any, values: Any, last_updated: Any,
+                         first_updated: Any = None,
+                         batch_size: int = 500) -> Iterator[bytes]:
+    """Serializes columns of point updates to /points_update request bodies
+
+    point_ids: integer array
+    values: numeric, boolean or string array
+    last_updated, first_updated: datetime64 arrays or pandas datetime columns
+    Yields one JSON array of up to batch_size updates at a time. Integers and datetimes
+    are rendered with NumPy arithmetic and floats with one orjson call per column, no
+    PointDataUpdate or dict is built per update. Updates are laid out a block of at most
+    BLOCK_ROWS at a time, so memory stays bounded however many there are.
+    """
+    ids = np.asarray(point_ids)
+    vals = np.asarray(values)
+    last_ms = epoch_ms(last_updated)
+    first_ms = epoch_ms(first_updated, 'first_updated') if first_updated is not None else None
+    validate_point_updates(ids, vals, last_ms, first_ms)
+
+    block_rows = max(batch_size, BLOCK_ROWS // batch_size * batch_size)
+    for block in range(0, len(ids), block_rows):
+        rows = slice(block, block + block_rows)
+        matrix = _lay_out(ids[rows], vals[rows], last_ms[rows],
+                          first_ms[rows] if first_ms is not None else None)
+        for start in range(0, len(matrix), batch_size):
+            # NUL never occurs in the JSON itself, so dropping it leaves the payload
+            body = matrix[start:start + batch_size].tobytes().replace(b'\0', b'')
+            yield b'[' + body[:-1] + b']'
+
+
+def encode_point_update_frame(df: Any, batch_size: int = 500) -> Iterator[bytes]:
+    """Serializes a DataFrame with point_id, value, last_updated and optionally
+    first_updated columns, see encode_point_updates"""
+    first_updated = df['first_updated'] if 'first_updated' in df.columns else None
+    return encode_point_updates(df['point_id'].to_numpy(), df['value'].to_numpy(),
+                                df['last_updated'], first_updated, batch_size)
@@ -1,8 +1,17 @@
+import codecs
+import re
 import requests
+from collections import deque
+from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor
+from json import JSONDecoder
 from .exceptions import OnboardApiException, OnboardTemporaryException
-from typing import List, Iterable, TypeVar, Callable
+from .metrics import endpoint_label
+from typing import List, Iterable, Iterator, TypeVar, Callable, Deque, Awaitable, Any, \
+    Optional, Union, AsyncIterable, AsyncIterator
 
 T = TypeVar('T')
+R = TypeVar('R')
 
 
 def divide_chunks(input_list: List[T], n: int) -> Iterable[List[T]]:
@@ -11,31 +20,263 @@ def divide_chunks(input_list: List[T], n: int) -> Iterable[List[T]]:
         yield input_list[i:i + n]
 
 
+def changelog_url(building_id: int, since_id: Optional[int] = None) -> str:
+    url = f'/buildings/{building_id}/changelog'
+    return url if since_id is None else f'{url}?since_id={since_id}'
+
+
+def timestamp_ms(value: Union[str, int, float]) -> int:
+    """Converts a timestamp from the API, epoch milliseconds or ISO 8601, to epoch ms
+
+    ISO timestamps without an offset are assumed to be UTC
+    """
+    if not isinstance(value, str):
+        return int(value)
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return round(dt.timestamp() * 1000)
+
+
+def bounded_map(func: Callable[[T], R], items: Iterable[T],
+                max_workers: int = 1) -> Iterator[R]:
+    """Lazily maps func over items on up to max_workers threads
+
+    Results are yielded in input order and at most 2 * max_workers calls are
+    outstanding at any time, so consumers can stop early without paying for the
+    whole input. The first exception raised by func is re-raised to the consumer.
+    """
+    if max_workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    pending: Deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= 2 * max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # don't wait on work nobody is going to consume
+            for f in pending:
+                f.cancel()
+
+
+def iter_records(chunks: Iterable[bytes]) -> Iterator[memoryview]:
+    """Splits a stream of byte chunks into newline delimited records
+
+    Records are memoryviews into the chunk they were read from, so they are not copied
+    unless they span two chunks. Empty lines are skipped.
+    """
+    # pieces of a record spanning chunks, joined once its end arrives
+    tail: List[bytes] = []
+    for chunk in chunks:
+        start = 0
+        if tail:
+            end = chunk.find(b'\n')
+            if end == -1:
+                tail.append(chunk)
+                continue
+            tail.append(chunk[:end])
+            yield memoryview(b''.join(tail))
+            start = end + 1
+        view = memoryview(chunk)
+        end = chunk.find(b'\n', start)
+        while end != -1:
+            if end > start:
+                yield view[start:end]
+            start = end + 1
+            end = chunk.find(b'\n', start)
+        tail = [chunk[start:]] if start < len(chunk) else []
+    last = b''.join(tail)
+    if last.strip():
+        yield memoryview(last)
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_DELIMITERS = ' \t\n\r,]'
+
+
+class JsonArrayDecoder(object):
+    """Decodes the elements of a JSON array incrementally, from chunks of its bytes
+
+    Only the elements not decoded yet are buffered, so memory is bounded by the chunk and
+    element size rather than the whole array. Raises ValueError if the document isn't an
+    array or is malformed, including when it ends before the array is closed.
+    """
+
+    def __init__(self) -> None:
+        # orjson only decodes whole documents, the stdlib decoder can stop after one value
+        self._decoder = JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._text = ''
+        self._opened = False
+        self._expect_value = True  # after [ or a comma, rather than after an element
+        self._empty = True
+        self._wait_for = 0  # buffer length to reach before retrying an incomplete element
+        self.closed = False  # whether the closing ] has been read
+
+    def decode(self, chunk: bytes, final: bool = False) -> List[Any]:
+        """Returns the elements completed by chunk, pass final=True with the last one"""
+        text = self._text + self._utf8.decode(chunk, final)
+        self._text = text
+        if self.closed:
+            if text.strip():
+                raise ValueError("Unexpected data after the JSON array")
+            self._text = ''
+            return []
+        if len(text) < self._wait_for and not final:
+            return []
+        values = []
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(text, pos).end()  # type: ignore[union-attr]
+            if pos == len(text):
+                break
+            char = text[pos]
+            if not self._opened:
+                if char != '[':
+                    raise ValueError("Expected a JSON array")
+                self._opened = True
+                pos += 1
+            elif char == ']' and (not self._expect_value or self._empty):
+                if text[pos + 1:].strip():
+                    raise ValueError("Unexpected data after the JSON array")
+                self.closed = True
+                pos = len(text)
+                break
+            elif char == ',' and not self._expect_value:
+                self._expect_value = True
+                pos += 1
+            elif not self._expect_value:
+                raise ValueError(f"Expected , or ] in JSON array, saw {char}")
+            else:
+                try:
+                    value, end = self._decoder.raw_decode(text, pos)
+                except ValueError:
+                    if final:
+                        raise
+                    end = len(text)
+                if not final and (end == len(text) or text[end] not in _DELIMITERS):
+                    # the element may continue in the next chunk, a number could have
+                    # been cut short. Wait until the buffer doubles so large elements
+                    # aren't decoded over and over
+                    self._wait_for = 2 * (len(text) - pos)
+                    break
+                self._expect_value = self._empty = False
+                self._wait_for = 0
+                pos = end
+                values.append(value)
+        self._text = text[pos:]
+        if final and not self.closed:
+            raise ValueError("JSON array ended early")
+        return values
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Yields the elements of a JSON array as its bytes arrive, see JsonArrayDecoder"""
+    decoder = JsonArrayDecoder()
+    for chunk in chunks:
+        # read on past the closing ], anything but whitespace after it is an error
+        yield from decoder.decode(chunk)
+    yield from decoder.decode(b'', final=True)
+
+
+async def aiter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """Async counterpart of iter_json_array"""
+    decoder = JsonArrayDecoder()
+    async for chunk in chunks:
+        for value in decoder.decode(chunk):
+            yield value
+    for value in decoder.decode(b'', final=True):
+        yield value
+
+
+def _reauth_hook(client: Any, res: Any) -> None:
+    hooks = getattr(client, 'hooks', None)
+    if hooks is not None:
+        hooks.on_reauth(endpoint_label(str(res.url or '')))
+
+
 def json(func: Callable[..., T]) -> Callable[..., T]:
     """Decorator for making sure requests responses are handled consistently"""
     # the type annotations on json are a lie to let us type the methods in client
     # with approximate descriptions of the JSON they return, even though the methods
     # as implemented return requests.Response objects
     def wrapper(*args, **kwargs):
+        client = args[0] if args else None
+        reauths = 0
+        try:
+            while True:
+                token = getattr(client, 'token', None)
+                res: requests.Response = func(*args, **kwargs)  # type: ignore[assignment]
+                if res is None:
+                    return None
+
+                # log in again if authorization failed, the access token likely just expired
+                if res.status_code == 401 and token is not None \
+                        and reauths < getattr(client, 'max_reauth', 0) \
+                        and client.reauthenticate(token):  # type: ignore[union-attr]
+                    reauths += 1
+                    _reauth_hook(client, res)
+                    res.close()
+                    continue
+
+                if res.status_code > 499:
+                    raise OnboardTemporaryException(res.text or res.status_code)
+                if res.status_code > 399:
+                    raise OnboardApiException(res.text or res.status_code)
+
+                if hasattr(wrapper, 'raw_response'):
+                    return res
+                # coalesced calls share the response, but each decodes its own copy
+                return res.json()
+        except OnboardApiException as e:
+            raise e
+        except Exception as e:
+            raise OnboardApiException(e)
+    return wrapper
+
+
+def async_json(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Async counterpart of json for clients built on httpx"""
+    # as with json, the annotations on decorated methods describe the decoded JSON
+    # even though the methods themselves return httpx.Response objects
+    async def wrapper(*args, **kwargs):
+        client = args[0] if args else None
+        reauths = 0
         try:
-            res: requests.Response = func(*args, **kwargs)  # type: ignore[assignment]
-            if res is None:
-                return None
-
-            # remove the cached access token if authorization failed
-            # it's likely just expired
-            if res.status_code == 401 and args and args[0].token is not None:
-                args[0].token = None
-                return wrapper(*args, **kwargs)
-
-            if res.status_code > 499:
-                raise OnboardTemporaryException(res.text or res.status_code)
-            if res.status_code > 399:
-                raise OnboardApiException(res.text or res.status_code)
-
-            if hasattr(wrapper, 'raw_response'):
-                return res
-            return res.json()
+            while True:
+                token = getattr(client, 'token', None)
+                res: Any = await func(*args, **kwargs)
+                if res is None:
+                    return None
+
+                # log in again if authorization failed, the access token likely just expired
+                if res.status_code == 401 and token is not None \
+                        and reauths < getattr(client, 'max_reauth', 0) \
+                        and await client.reauthenticate(token):  # type: ignore[union-attr]
+                    reauths += 1
+                    _reauth_hook(client, res)
+                    await res.aclose()
+                    continue
+
+                if res.status_code > 399:
+                    # streamed responses must be read before their text is available
+                    await res.aread()
+                    if res.status_code > 499:
+                        raise OnboardTemporaryException(res.text or res.status_code)
+                    raise OnboardApiException(res.text or res.status_code)
+
+                if hasattr(wrapper, 'raw_response'):
+                    return res
+                return res.json()
         except OnboardApiException as e:
             raise e
         except Exception as e:
@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterable, List, Optional
+import requests
+from .exceptions import OnboardApiException
+from .models import PointDataUpdate
+from .resilience import UNPROCESSED_STATUSES
+from .transport import unsent
+from .util import json
+
+if TYPE_CHECKING:
+    from .client import APIClient
+
+
+@dataclass
+class WriterStats:
+    """Counters describing the batches a PointDataWriter has sent"""
+    batches: int = 0
+    updates: int = 0
+    retries: int = 0
+    failed_batches: int = 0
+    # seconds spent sending each of the latest successful batches, including retries
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=10_000))
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def throughput(self) -> float:
+        """Updates written per second since the writer was opened"""
+        elapsed = time.monotonic() - self.started
+        return self.updates / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0.0
+
+
+class PointDataWriter(object):
+    """Sends point data updates to the API in concurrent batches
+
+    Updates passed to write() are grouped into batches of up to batch_size, a partial
+    batch is sent once its oldest update has waited flush_interval seconds. Up to
+    max_in_flight batches are posted at once. write() blocks while max_queued updates
+    are waiting to be acknowledged, so a slow API slows the producer down rather than
+    growing the queue without bound.
+
+    A batch might be applied twice if it is sent again after the API received it, so
+    batches are only retried, up to retries times with exponential backoff, when the API
+    answered 429 or 503 or the connection failed before the batch was sent. A client
+    with a Resilience retries batches itself on the same terms, and the writer leaves
+    retries to it. Other failures, and batches which run out of retries, are counted in
+    stats and the first such error is raised from flush() or close().
+
+        with PointDataWriter(client, max_in_flight=4) as writer:
+            for update in updates:
+                writer.write(update)
+        print(writer.stats.throughput)
+    """
+
+    def __init__(self, client: 'APIClient', batch_size: int = 500,
+                 flush_interval: float = 1.0, max_in_flight: int = 4,
+                 max_queued: int = 10_000, retries: int = 3,
+                 backoff: float = 0.5) -> None:
+        if batch_size < 1 or max_in_flight < 1 or max_queued < batch_size:
+            raise ValueError("batch_size and max_in_flight must be positive and "
+                             "max_queued must hold at least one batch")
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.max_queued = max_queued
+        self.stats = WriterStats()
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffered_at: Optional[float] = None
+        self._pending = 0  # updates written but not yet acknowledged or failed
+        self._error: Optional[Exception] = None
+        self._closed = False
+        self._lock = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight,
+                                            thread_name_prefix='onboard-writer')
+        self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._timer.start()
+
+    def __enter__(self) -> 'PointDataWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, update: PointDataUpdate) -> None:
+        """Queues one update, blocking while the writer is at max_queued"""
+        with self._lock:
+            if self._closed:
+                raise OnboardApiException("Cannot write to a closed PointDataWriter")
+            while self._pending >= self.max_queued:
+                self._lock.wait()
+            self._pending += 1
+            if not self._buffer:
+                self._buffered_at = time.monotonic()
+            self._buffer.append(update.json())
+            if len(self._buffer) >= self.batch_size:
+                self._send_buffer()
+
+    def write_many(self, updates: Iterable[PointDataUpdate]) -> None:
+        for update in updates:
+            self.write(update)
+
+    def flush(self) -> None:
+        """Sends any partial batch and waits until every queued update has been handled"""
+        with self._lock:
+            if self._buffer:
+                self._send_buffer()
+            while self._pending:
+                self._lock.wait()
+            self._raise_error()
+
+    def close(self) -> None:
+        """Flushes outstanding updates and stops the writer's threads"""
+        with self._lock:
+            if self._closed:
+                return
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._closed = True
+                self._lock.notify_all()
+            self._timer.join()
+            self._executor.shutdown()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _send_buffer(self) -> Future:
+        # callers hold self._lock
+        batch, self._buffer, self._buffered_at = self._buffer, [], None
+        return self._executor.submit(self._send, batch)
+
+    def _flush_periodically(self) -> None:
+        with self._lock:
+            while not self._closed:
+                if self._buffered_at is None:
+                    self._lock.wait(self.flush_interval)
+                    continue
+                wait = self._buffered_at + self.flush_interval - time.monotonic()
+                if wait > 0:
+                    self._lock.wait(wait)
+                else:
+                    self._send_buffer()
+
+    def _send(self, batch: List[Dict[str, Any]]) -> None:
+        # the client's Resilience retries batches on the same terms as below
+        retries = self.retries if self.client.resilience is None else 0
+        attempts = 0
+
+        @json
+        def post():
+            nonlocal attempts
+            while True:
+                try:
+                    res = self.client.post('/points_update', json=batch)
+                except requests.RequestException as e:
+                    if attempts >= retries or not unsent(e):
+                        raise
+                    error: Optional[BaseException] = e
+                else:
+                    if attempts >= retries or res.status_code not in UNPROCESSED_STATUSES:
+                        return res
+                    res.close()
+                    error = None
+                attempts += 1
+                if self.client.hooks is not None:
+                    self.client.hooks.on_retry('/points_update', attempts, error)
+                time.sleep(self.backoff * 2 ** (attempts - 1))
+        post.raw_response = True  # type: ignore[attr-defined]
+
+        start = time.monotonic()
+        error: Optional[Exception] = None
+        try:
+            post()
+        except Exception as e:
+            error = e
+
+        with self._lock:
+            self.stats.retries += attempts
+            if error is None:
+                self.stats.batches += 1
+                self.stats.updates += len(batch)
+                self.stats.latencies.append(time.monotonic() - start)
+            else:
+                self.stats.failed_batches += 1
+                if self._error is None:
+                    self._error = error
+            self._pending -= len(batch)
+            self._lock.notify_all()
@@ -16,6 +16,13 @@ setup(name='onboard.client',
       url='https://github.com/onboard-data/client-py',
       packages=['onboard.client'],
       install_requires=requirements,
+      extras_require={
+          'async': ['httpx>=0.23'],
+          'arrow': ['numpy', 'pyarrow'],
+          'http2': ['httpx[http2]>=0.23'],
+          # backports.zstd supports Python 3.9 and later, 3.14 ships compression.zstd
+          'zstd': ['backports.zstd; python_version >= "3.9" and python_version < "3.14"'],
+      },
       package_data={
           'onboard.client': ['py.typed'],
       },
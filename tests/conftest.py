@@ -0,0 +1,85 @@
+# type: ignore
+
+from io import BytesIO
+
+import orjson
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from urllib3 import HTTPResponse
+
+from onboard.client import APIClient
+from onboard.client.compression import compress
+
+
+class FakeAdapter(BaseAdapter):
+    """Answers the requests a client's session sends in place of the network
+
+    respond: the answer to every request, a list of answers given in turn which repeats
+        its last, or a function of the request returning an answer. An answer is a
+        requests.Response, an HTTP status, a body as bytes or JSON, or an exception to
+        raise instead
+    headers: added to every response
+    encoding: compresses response bodies with Content-Encoding, as the API does for
+        clients which accept it
+    Requests are recorded in requests and the keyword arguments they were sent with,
+    e.g. timeout, in sent_kwargs.
+    """
+
+    def __init__(self, respond, headers=None, encoding=None):
+        super().__init__()
+        self.respond = respond
+        self.headers = headers or {}
+        self.encoding = encoding
+        self.requests = []
+        self.sent_kwargs = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        self.sent_kwargs.append(kwargs)
+        answer = self.respond
+        if callable(answer):
+            answer = answer(request)
+        elif isinstance(answer, list):
+            answer = answer.pop(0) if len(answer) > 1 else answer[0]
+        if isinstance(answer, BaseException):
+            raise answer
+        res = answer if isinstance(answer, requests.Response) else self.__response(answer)
+        res.request = request
+        res.url = request.url
+        return res
+
+    def __response(self, answer):
+        status = 200
+        if isinstance(answer, int) and not isinstance(answer, bool):
+            status, answer = answer, {'status': answer}
+        body = answer if isinstance(answer, bytes) else orjson.dumps(answer)
+        headers = dict(self.headers)
+        if self.encoding:
+            body = compress(body, self.encoding)
+            headers['Content-Encoding'] = self.encoding
+        res = requests.Response()
+        res.status_code = status
+        res.raw = HTTPResponse(body=BytesIO(body), headers=headers, status=status,
+                               preload_content=False, decode_content=True)
+        res.headers = requests.structures.CaseInsensitiveDict(headers)
+        return res
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_client():
+    """Makes an APIClient whose session sends its requests to a FakeAdapter
+
+    Called with the adapter's respond, headers and encoding and the client's keyword
+    arguments, returns the client and the adapter
+    """
+    def make(respond, headers=None, encoding=None, **kwargs):
+        kwargs.setdefault('api_key', 'ob-p-test')
+        client = APIClient('http://localhost', **kwargs)
+        adapter = FakeAdapter(respond, headers, encoding)
+        client._ClientBase__session().mount('http://', adapter)
+        return client, adapter
+    return make
@@ -0,0 +1,74 @@
+# type: ignore
+"""Fakes shared by the tests, see conftest.py for the adapter behind a client's session"""
+
+import httpx
+import orjson
+import requests
+
+from onboard.client import APIClient
+from onboard.client.aio import AsyncAPIClient
+from onboard.client.metrics import ClientHooks
+from onboard.client.models import point_data_constructor
+
+
+def response(body, status=200):
+    res = requests.Response()
+    res.status_code = status
+    res._content = body if isinstance(body, bytes) else orjson.dumps(body)
+    res._content_consumed = True
+    return res
+
+
+class FakeApi:
+    """Serves canned responses keyed by url instead of talking to the network"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+
+    def __call__(self, url, **kwargs):
+        self.calls.append(url)
+        route = self.routes[url]
+        return route(url, **kwargs) if callable(route) else response(route)
+
+
+def point(point_id, values, columns=('time', 'raw', 'C')):
+    """A point's timeseries as the API returns it, raw in F and converted to C"""
+    return point_data_constructor()(point_id=point_id, raw='F', unit='C',
+                                    columns=list(columns), values=values)
+
+
+def client_with(routes, **kwargs):
+    client = APIClient('http://localhost', api_key='ob-p-test', **kwargs)
+    api = FakeApi(routes)
+    client.get = api
+    client.post = api
+    return client, api
+
+
+def async_client_with(handler, **kwargs):
+    client = AsyncAPIClient('http://localhost', **kwargs)
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler),
+                                      headers=client.headers())
+    return client
+
+
+class Recorder(ClientHooks):
+    def __init__(self):
+        self.calls = []
+
+    def on_request(self, *args):
+        self.calls.append(('request',) + args[:3] + args[4:])
+
+    def on_retry(self, endpoint, attempt, error):
+        self.calls.append(('retry', endpoint, attempt))
+
+    def on_reauth(self, endpoint):
+        self.calls.append(('reauth', endpoint))
+
+    def on_stream(self, endpoint, records, decode_seconds, total_seconds, bytes_received):
+        assert 0 <= decode_seconds <= total_seconds
+        self.calls.append(('stream', endpoint, records, bytes_received))
+
+    def on_coalesce(self, method, endpoint):
+        self.calls.append(('coalesce', method, endpoint))
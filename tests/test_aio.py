@@ -0,0 +1,180 @@
+# type: ignore
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import orjson
+import pytest
+
+from onboard.client import OnboardApiException, OnboardTemporaryException
+from onboard.client.cache import RecordCache
+from onboard.client.models import TimeseriesQuery
+
+from .helpers import async_client_with
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_get_all_points():
+    def handler(request):
+        path = request.url.path
+        if path == '/buildings':
+            return httpx.Response(200, json=[{'id': i} for i in range(6)])
+        bldg = int(path.split('/')[2])
+        return httpx.Response(200, json=[{'id': bldg, 'points': [{'id': bldg * 10}]}])
+
+    async def go():
+        async with async_client_with(handler, api_key='ob-p-test', max_workers=3) as client:
+            return await client.get_all_points()
+
+    assert [p['id'] for p in run(go())] == [i * 10 for i in range(6)]
+
+
+def test_error_semantics():
+    def handler(request):
+        status = 503 if request.url.path == '/alerts' else 400
+        return httpx.Response(status, text='nope')
+
+    async def go():
+        async with async_client_with(handler, api_key='ob-p-test') as client:
+            with pytest.raises(OnboardTemporaryException):
+                await client.get_alerts()
+            with pytest.raises(OnboardApiException):
+                await client.whoami()
+
+    run(go())
+
+
+def test_token_refresh():
+    tokens = []
+
+    def handler(request):
+        if request.url.path == '/login':
+            return httpx.Response(200, json={'access_token': 'fresh'})
+        tokens.append(request.headers['Authorization'])
+        if request.headers['Authorization'] == 'Bearer stale':
+            return httpx.Response(401)
+        return httpx.Response(200, json={'ok': True})
+
+    async def go():
+        client = async_client_with(handler, user='u', pw='p', token='stale')
+        return await client.whoami()
+
+    assert run(go()) == {'ok': True}
+    assert tokens == ['Bearer stale', 'Bearer fresh']
+
+
+def test_concurrent_token_refresh_logs_in_once():
+    logins = []
+
+    async def handler(request):
+        if request.url.path == '/login':
+            logins.append(request)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={'access_token': f'token-{len(logins)}'})
+        if request.headers['Authorization'] == 'Bearer stale':
+            return httpx.Response(401)
+        return httpx.Response(200, json={'ok': True})
+
+    async def go():
+        client = async_client_with(handler, user='u', pw='p', token='stale')
+        return await asyncio.gather(*[client.whoami() for _ in range(5)])
+
+    assert run(go()) == [{'ok': True}] * 5
+    assert len(logins) == 1
+
+
+def test_stream_point_timeseries():
+    lines = [{'point_id': i, 'raw': 'F', 'unit': 'C', 'columns': ['time', 'raw', 'C'],
+              'values': [['2020-12-16T00:00:00Z', 32.0, 0.0]]} for i in range(3)]
+    body = b'\n'.join(orjson.dumps(line) for line in lines)
+
+    def handler(request):
+        assert request.headers['Accept'] == 'application/x-ndjson'
+        return httpx.Response(200, content=body)
+
+    now = datetime.now(timezone.utc)
+    query = TimeseriesQuery(point_ids=[0, 1, 2], start=now, end=now)
+
+    async def go():
+        async with async_client_with(handler, api_key='ob-p-test') as client:
+            return [p async for p in client.stream_point_timeseries(query)]
+
+    assert [p.point_id for p in run(go())] == [0, 1, 2]
+
+
+def test_stream_point_timeseries_resamples_locally():
+    sent = []
+
+    def handler(request):
+        sent.append(orjson.loads(request.content))
+        values = [[i * 60_000, float(i)] for i in range(10)]
+        return httpx.Response(200, content=orjson.dumps({
+            'point_id': 1, 'raw': 'F', 'unit': 'C', 'columns': ['time', 'C'], 'values': values}))
+
+    start = datetime.fromtimestamp(0, timezone.utc)
+    query = TimeseriesQuery(point_ids=[1], start=start, end=start + timedelta(minutes=10),
+                            interval=timedelta(minutes=5), aggregation='sum')
+
+    async def go():
+        async with async_client_with(handler, api_key='ob-p-test') as client:
+            return [p async for p in client.stream_point_timeseries(query)]
+
+    [point] = run(go())
+    assert point.values == [[0, 10.0], [300_000, 35.0]]
+    assert 'interval' not in sent[0]
+
+
+def test_iter_alerts():
+    alerts = [{'id': i, 'message': 'x' * 100} for i in range(50)]
+
+    def handler(request):
+        return httpx.Response(200, content=orjson.dumps(alerts))
+
+    async def go():
+        async with async_client_with(handler, api_key='ob-p-test') as client:
+            return [a async for a in client.iter_alerts()]
+
+    assert run(go()) == alerts
+
+
+class BrokenBody(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b'[{"id": 1}, {"id"'
+        raise httpx.ReadError('connection reset')
+
+
+def test_iter_alerts_errors_partway():
+    def handler(request):
+        if request.url.path == '/alerts':
+            return httpx.Response(200, stream=BrokenBody())
+        return httpx.Response(200, content=b'[1, 2,, 3]')
+
+    async def go():
+        async with async_client_with(handler, api_key='ob-p-test') as client:
+            with pytest.raises(OnboardTemporaryException, match='connection reset'):
+                [a async for a in client.iter_alerts()]
+            with pytest.raises(OnboardApiException):
+                [a async for a in client.iter_account_actions()]
+
+    run(go())
+
+
+def test_get_equipment_by_ids_in_order():
+    cache = RecordCache()
+    cache.put_many([{'id': 4}])
+
+    def handler(request):
+        ids = orjson.loads(request.content)['equipment_ids']
+        return httpx.Response(200, json=[{'id': i} for i in reversed(ids)])
+
+    async def go():
+        async with async_client_with(handler, api_key='ob-p-test', max_workers=2,
+                                     equipment_cache=cache) as client:
+            equipment = client.iter_equipment_by_ids([5, 4, 3, 2, 1, 4], chunk_size=2)
+            return [e async for e in equipment]
+
+    assert [e['id'] for e in run(go())] == [5, 4, 3, 2, 1]
@@ -0,0 +1,47 @@
+# type: ignore
+
+import math
+
+import pyarrow.parquet as pq
+
+from onboard.client.arrow import iter_record_batches, wide_table, write_parquet
+from onboard.client.columnar import ColumnarPointData
+
+from .helpers import point
+
+
+TIMESERIES = [
+    point(1, [['2023-01-01T00:00:00Z', None, 0.0], ['2023-01-01T00:01:00Z', None, None]]),
+    point(2, [['2023-01-01T00:01:00Z', None, 2.0], ['2023-01-01T00:02:00Z', None, 3.0]]),
+    point(3, [['2023-01-01T00:02:00Z', None, 4.0]]),
+]
+
+
+def test_iter_record_batches():
+    batches = list(iter_record_batches(TIMESERIES, batch_rows=3))
+    assert [b.num_rows for b in batches] == [4, 1]
+    assert batches[0].column('point_id').to_pylist() == [1, 1, 2, 2]
+    assert batches[0].column('value').to_pylist() == [0.0, None, 2.0, 3.0]
+    assert batches[1].column('time')[0].as_py().minute == 2
+
+
+def test_wide_table():
+    columnar = [ColumnarPointData.from_point_data(p) for p in TIMESERIES]
+    table = wide_table(columnar, points=[{'id': 3, 'type': 'Temp'}],
+                       point_column_label=lambda p: p['type'])
+    assert table.column_names == ['time', '1', '2', 'Temp']
+    assert table.column('2').to_pylist() == [None, 2.0, 3.0]
+
+
+def test_write_parquet(tmp_path):
+    long_path = str(tmp_path / 'long.parquet')
+    assert write_parquet(TIMESERIES, long_path, row_group_size=2) == 5
+    long = pq.ParquetFile(long_path)
+    assert long.metadata.num_row_groups == 3
+    assert long.read().column('point_id').to_pylist() == [1, 1, 2, 2, 3]
+
+    wide_path = str(tmp_path / 'wide.parquet')
+    assert write_parquet(TIMESERIES, wide_path, layout='wide') == 3
+    wide = pq.read_table(wide_path).to_pandas()
+    assert math.isnan(wide['1'][1])
+    assert wide['3'].tolist()[2] == 4.0
@@ -0,0 +1,18 @@
+# type: ignore
+
+from benchmarks.suite import run
+
+
+def test_suite_runs_against_mock_api():
+    results = run(n_points=30, n_rows=10, n_updates=600, latency=0.0, max_workers=2,
+                  repeat=1)
+    counts = {r['case']: r['count'] for r in results}
+    assert counts == {'stream_point_timeseries': 300,
+                      'points_df_from_streaming_timeseries': 300,
+                      'get_points_by_ids': 30,
+                      'get_all_points': 200,
+                      'update_point_data': 600}
+    for r in results:
+        assert r['requests'] >= 1
+        assert r['p50_ms'] <= r['p99_ms']
+        assert r['peak_mb'] > 0
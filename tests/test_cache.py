@@ -0,0 +1,177 @@
+# type: ignore
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import requests
+
+from onboard.client.cache import TimeseriesCache, MetadataCache, RecordCache
+from onboard.client.models import TimeseriesQuery, point_data_constructor
+
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeServer:
+    """Serves one sample per hour for every point"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, query):
+        self.queries.append(query)
+        construct = point_data_constructor()
+        hours = int((query.end - query.start).total_seconds() // 3600)
+        times = [query.start + timedelta(hours=h) for h in range(hours + 1)]
+        for point_id in query.point_ids:
+            values = [[t.strftime('%Y-%m-%dT%H:%M:%SZ'), point_id, t.hour] for t in times]
+            yield construct(point_id=point_id, raw='F', unit='C',
+                            columns=['time', 'raw', 'C'], values=values)
+
+
+def query(start, end, point_ids=(1, 2)):
+    return TimeseriesQuery(point_ids=list(point_ids), start=start, end=end)
+
+
+def test_cache_hit(tmp_path):
+    cache = TimeseriesCache(str(tmp_path / 'ts.db'))
+    server = FakeServer()
+    q = query(START + timedelta(hours=6), START + timedelta(days=1, hours=6))
+    first = list(cache.stream(q, server))
+    assert len(server.queries) == 1
+    # whole days are fetched so that they can be cached
+    assert server.queries[0].start == START
+    assert server.queries[0].end == START + timedelta(days=2)
+
+    second = list(cache.stream(q, server))
+    assert len(server.queries) == 1
+    assert [p.point_id for p in second] == [1, 2]
+    assert second[0].values == first[0].values
+    assert second[0].values[0][0] == '2023-01-01T06:00:00Z'
+    assert second[0].values[-1][0] == '2023-01-02T06:00:00Z'
+    assert len(second[0].values) == 25
+
+
+def test_cache_fetches_missing_buckets(tmp_path):
+    cache = TimeseriesCache(str(tmp_path / 'ts.db'))
+    server = FakeServer()
+    list(cache.stream(query(START, START + timedelta(hours=23), point_ids=[1]), server))
+    points = list(cache.stream(query(START, START + timedelta(days=2, hours=23)), server))
+    assert [(q.point_ids, q.start, q.end) for q in server.queries[1:]] == [
+        ([1], START + timedelta(days=1), START + timedelta(days=3)),
+        ([2], START, START + timedelta(days=3)),
+    ]
+    assert [len(p.values) for p in points] == [72, 72]
+
+
+def test_cache_refetches_recent_buckets(tmp_path):
+    cache = TimeseriesCache(str(tmp_path / 'ts.db'), freshness=timedelta(hours=6))
+    server = FakeServer()
+    now = datetime.now(timezone.utc)
+    q = query(now - timedelta(days=3), now)
+    list(cache.stream(q, server))
+    list(cache.stream(q, server))
+    assert len(server.queries) == 2
+    assert server.queries[1].start >= now - timedelta(days=1, hours=1)
+
+
+def test_cache_eviction(tmp_path):
+    cache = TimeseriesCache(str(tmp_path / 'ts.db'), max_bytes=4000)
+    server = FakeServer()
+    for day in range(5):
+        day_start = START + timedelta(days=day)
+        list(cache.stream(query(day_start, day_start + timedelta(hours=23)), server))
+    assert 0 < cache.size() <= 4000
+    list(cache.stream(query(START, START + timedelta(hours=23)), server))
+    assert len(server.queries) == 6
+
+
+class FakeEndpoint:
+    def __init__(self, etag=None):
+        self.etag = etag
+        self.requests = []
+
+    def __call__(self, headers):
+        self.requests.append(headers)
+        res = requests.Response()
+        if self.etag is not None and headers.get('If-None-Match') == self.etag:
+            res.status_code = 304
+            return res
+        res.status_code = 200
+        res._content = orjson.dumps([{'id': len(self.requests)}])
+        if self.etag is not None:
+            res.headers['ETag'] = self.etag
+        return res
+
+
+URL = 'https://api.onboarddata.io/buildings'
+
+
+def test_metadata_cache_ttl(monkeypatch):
+    cache = MetadataCache(ttls={'/buildings': 60})
+    endpoint = FakeEndpoint()
+    assert cache.fetch(URL, endpoint).json() == [{'id': 1}]
+    assert cache.fetch(URL, endpoint).json() == [{'id': 1}]
+    assert len(endpoint.requests) == 1
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert cache.fetch(URL, endpoint).json() == [{'id': 2}]
+
+
+def test_metadata_cache_uncached_endpoint():
+    cache = MetadataCache()
+    endpoint = FakeEndpoint()
+    cache.fetch('https://api.onboarddata.io/whoami', endpoint)
+    cache.fetch('https://api.onboarddata.io/whoami', endpoint)
+    assert len(endpoint.requests) == 2
+
+
+def test_metadata_cache_revalidation(monkeypatch):
+    cache = MetadataCache(ttls={'/buildings': 60})
+    endpoint = FakeEndpoint(etag='"v1"')
+    cache.fetch(URL, endpoint)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert cache.fetch(URL, endpoint).json() == [{'id': 1}]
+    assert endpoint.requests[1] == {'If-None-Match': '"v1"'}
+
+
+def test_metadata_cache_persistence_and_invalidation(tmp_path):
+    path = str(tmp_path / 'meta.db')
+    endpoint = FakeEndpoint()
+    MetadataCache(path=path).fetch(URL, endpoint)
+    cache = MetadataCache(path=path)
+    assert cache.fetch(URL, endpoint).json() == [{'id': 1}]
+    assert len(endpoint.requests) == 1
+
+    cache.invalidate('/buildings')
+    assert MetadataCache(path=path).fetch(URL, endpoint).json() == [{'id': 2}]
+
+
+def test_metadata_cache_under_api_path_prefix(fake_client):
+    cache = MetadataCache(ttls={'/buildings': 60})
+    client, adapter = fake_client([[{'id': 1}]], metadata_cache=cache)
+    client.api_url = 'http://localhost/api/v1'
+    assert client.get_all_buildings() == [{'id': 1}]
+    assert client.get_all_buildings() == [{'id': 1}]
+    assert [r.path_url for r in adapter.requests] == ['/api/v1/buildings']
+
+    cache.invalidate('/buildings')
+    client.get_all_buildings()
+    assert len(adapter.requests) == 2
+
+
+def test_record_cache(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('onboard.client.cache.time.monotonic', lambda: now[0])
+    cache = RecordCache(max_entries=2, ttl=10)
+    cache.put_many([{'id': 1}, {'id': 2}, {'name': 'no id'}])
+    assert cache.get_many([1]) == {1: {'id': 1}}
+    cache.get_many([1])[1]['id'] = 'changed'  # callers get copies
+    assert cache.get_many([1]) == {1: {'id': 1}}
+    cache.put_many([{'id': 3}])  # evicts 2, which was used least recently
+    assert cache.get_many([1, 2, 3]) == {1: {'id': 1}, 3: {'id': 3}}
+    now[0] = 10
+    assert cache.get_many([1, 3]) == {}
+    assert len(cache) == 0
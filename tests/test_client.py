@@ -0,0 +1,325 @@
+# type: ignore
+
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import pytest
+import requests
+
+from onboard.client import OnboardApiException, OnboardTemporaryException
+from onboard.client.cache import RecordCache, TimeseriesCache
+from onboard.client.exceptions import OnboardCircuitOpenException
+from onboard.client.models import TimeseriesQuery
+from onboard.client.resilience import Resilience
+
+from .helpers import client_with, response
+
+
+def building_routes(n):
+    routes = {'/buildings': [{'id': i} for i in range(n)]}
+    for i in range(n):
+        routes[f'/buildings/{i}/equipment?points=true'] = [
+            {'id': i * 10, 'points': [{'id': i * 100}, {'id': i * 100 + 1}]},
+        ]
+    return routes
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_get_all_equipment_ordering(max_workers):
+    client, _ = client_with(building_routes(12), max_workers=max_workers)
+    equipment = client.get_all_equipment()
+    assert [e['id'] for e in equipment] == [i * 10 for i in range(12)]
+
+
+def test_get_all_points_concurrent():
+    client, _ = client_with(building_routes(5))
+    points = client.get_all_points(max_workers=3)
+    assert [p['id'] for p in points] == [i * 100 + j for i in range(5) for j in range(2)]
+
+
+def test_get_all_equipment_reports_building():
+    routes = building_routes(3)
+    routes['/buildings/1/equipment?points=true'] = lambda url, **kw: response({}, status=503)
+    client, _ = client_with(routes, max_workers=2)
+    with pytest.raises(OnboardTemporaryException, match='building 1'):
+        client.get_all_equipment()
+
+
+def points_routes(point_ids, missing_chunks=()):
+    routes = {}
+    for i in range(0, len(point_ids), 500):
+        chunk = point_ids[i:i + 500]
+        url = '/points?point_ids=[' + ','.join(str(id) for id in chunk) + ']'
+        if i // 500 in missing_chunks:
+            routes[url] = lambda url, **kw: response(b'{"status": 404}', status=404)
+        else:
+            routes[url] = [{'id': id} for id in chunk]
+    return routes
+
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_get_points_by_ids_skips_missing_chunks(max_workers):
+    point_ids = list(range(2200))
+    client, api = client_with(points_routes(point_ids, missing_chunks=[1]))
+    points = client.get_points_by_ids(point_ids, max_workers=max_workers)
+    assert [p['id'] for p in points] == point_ids[:500] + point_ids[1000:]
+    assert len(api.calls) == 5
+
+
+def test_iter_points_by_ids():
+    point_ids = list(range(1200))
+    client, _ = client_with(points_routes(point_ids), max_workers=2)
+    points = client.iter_points_by_ids(point_ids)
+    assert next(points) == {'id': 0}
+    assert [p['id'] for p in points] == point_ids[1:]
+
+
+def test_stream_point_timeseries_sharded():
+    point_data = {i: [[f'2023-01-0{d}T00:00:00Z', float(i), float(d)] for d in range(1, 8)]
+                  for i in range(4)}
+    failures = []
+
+    def query_v2(url, json, **kwargs):
+        start = datetime.fromtimestamp(json['start'], timezone.utc).strftime('%Y-%m-%d')
+        end = datetime.fromtimestamp(json['end'], timezone.utc).strftime('%Y-%m-%d')
+        if json['point_ids'] == [2, 3] and start == '2023-01-04' and not failures:
+            failures.append(start)
+            return response(b'oops', status=502)
+        lines = []
+        for point_id in json['point_ids']:
+            values = [v for v in point_data[point_id] if start <= v[0][:10] <= end]
+            lines.append(orjson.dumps({'point_id': point_id, 'raw': 'F', 'unit': 'C',
+                                       'columns': ['time', 'raw', 'C'], 'values': values}))
+        return response(b'\n'.join(lines))
+
+    client, api = client_with({'/query-v2': query_v2}, max_workers=3)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    query = TimeseriesQuery(point_ids=[0, 1, 2, 3], start=start,
+                            end=start + timedelta(days=6))
+    points = list(client.stream_point_timeseries(query, shard_interval=timedelta(days=3),
+                                                 points_per_shard=2))
+    assert [p.point_id for p in points] == [0, 1, 2, 3]
+    for p in points:
+        assert p.values == point_data[p.point_id]
+    # 2 point shards x 2 time windows, plus one retried window
+    assert len(api.calls) == 5
+
+
+def test_stream_point_timeseries_shard_retries_connection_errors():
+    calls = []
+
+    def query_v2(url, json, **kwargs):
+        calls.append(url)
+        if len(calls) == 1:
+            raise requests.ConnectionError('connection reset')
+        if len(calls) == 3:
+            return response(b'bad request', status=400)
+        return response(orjson.dumps({'point_id': 1, 'raw': 'F', 'unit': 'C',
+                                      'columns': ['time', 'raw', 'C'], 'values': []}))
+
+    client, _ = client_with({'/query-v2': query_v2})
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    query = TimeseriesQuery(point_ids=[1], start=start, end=start + timedelta(days=1))
+    points = list(client.stream_point_timeseries(query, shard_interval=timedelta(days=1)))
+    assert [p.point_id for p in points] == [1]
+    assert len(calls) == 2
+    # errors which aren't temporary are raised without retrying
+    with pytest.raises(OnboardApiException, match='bad request'):
+        list(client.stream_point_timeseries(query, shard_interval=timedelta(days=1)))
+    assert len(calls) == 3
+
+
+def test_stream_point_timeseries_columnar():
+    line = orjson.dumps({'point_id': 1, 'raw': 'F', 'unit': 'C', 'columns': ['time', 'raw', 'C'],
+                         'values': [['2023-01-01T00:00:00Z', 32.0, None]]})
+    client, _ = client_with({'/query-v2': lambda url, **kw: response(line)})
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    query = TimeseriesQuery(point_ids=[1], start=start, end=start + timedelta(days=1))
+    [point] = client.stream_point_timeseries(query, columnar=True)
+    assert point.timestamps.tolist() == [1672531200000]
+    assert point.values['raw'].tolist() == [32.0]
+
+
+def test_stream_point_timeseries_raw():
+    lines = [orjson.dumps({'point_id': i, 'values': []}) for i in range(3)]
+    client, _ = client_with({'/query-v2': lambda url, **kw: response(b'\n'.join(lines))})
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    query = TimeseriesQuery(point_ids=[0, 1, 2], start=start, end=start)
+    assert [p['point_id'] for p in client.stream_point_timeseries_raw(query)] == [0, 1, 2]
+    records = client.stream_point_timeseries_raw(query, decode=False, chunk_size=5)
+    assert [bytes(r) for r in records] == lines
+
+
+class BrokenStream:
+    """A response body which breaks off after the given number of bytes"""
+
+    def __init__(self, body, fail_after):
+        self.body = body
+        self.fail_after = fail_after
+
+    def stream(self, chunk_size, decode_content=True):
+        yield self.body[:self.fail_after]
+        raise requests.exceptions.ChunkedEncodingError('connection reset')
+
+    def close(self):
+        pass
+
+
+def test_stream_point_timeseries_resumes(monkeypatch):
+    monkeypatch.setattr('onboard.client.client.time.sleep', lambda s: None)
+    records = {i: orjson.dumps({'point_id': i, 'raw': 'F', 'unit': 'C', 'columns': ['time', 'C'],
+                                'values': [[1672531200000, float(i)]]}) for i in range(4)}
+    requested = []
+
+    def query_v2(url, json, **kwargs):
+        requested.append(json['point_ids'])
+        body = b'\n'.join(records[i] for i in json['point_ids'])
+        if len(requested) > 1:
+            return response(body)
+        res = requests.Response()
+        res.status_code = 200
+        # the third record is cut short
+        res.raw = BrokenStream(body, len(records[0]) + len(records[1]) + 10)
+        return res
+
+    client, api = client_with({'/query-v2': query_v2})
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    query = TimeseriesQuery(point_ids=[0, 1, 2, 3], start=start, end=start + timedelta(days=1))
+    points = list(client.stream_point_timeseries(query))
+    assert [p.point_id for p in points] == [0, 1, 2, 3]
+    assert requested == [[0, 1, 2, 3], [2, 3]]
+
+    requested.clear()
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        list(client.stream_point_timeseries(query, stream_retries=0))
+    assert requested == [[0, 1, 2, 3]]
+
+
+def test_stream_point_timeseries_resumes_with_resilience_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('onboard.client.client.time.sleep', sleeps.append)
+    failures = [OnboardTemporaryException('unavailable')] * 2
+
+    def query_v2(url, json, **kwargs):
+        if failures:
+            raise failures.pop()
+        return response(b'')
+
+    resilience = Resilience(backoff=0.01, max_backoff=0.05)
+    client, api = client_with({'/query-v2': query_v2}, resilience=resilience)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    query = TimeseriesQuery(point_ids=[1], start=start, end=start + timedelta(days=1))
+    assert list(client.stream_point_timeseries(query)) == []
+    assert len(sleeps) == 2 and all(0.01 <= s <= 0.05 for s in sleeps)
+
+    sleeps.clear()
+    failures[:] = [OnboardCircuitOpenException('/query-v2 failed 5 times in a row')]
+    with pytest.raises(OnboardCircuitOpenException):
+        list(client.stream_point_timeseries(query))
+    assert sleeps == []
+
+
+def test_get_equipment_by_ids_chunked_and_cached():
+    requested = []
+
+    def query(url, json, **kwargs):
+        requested.append(json['equipment_ids'])
+        return response([{'id': i, 'points': []} for i in json['equipment_ids']])
+
+    cache = RecordCache()
+    client, _ = client_with({'/equipment/query': query}, max_workers=2,
+                            equipment_cache=cache)
+    ids = list(range(1200)) + [5, 7]
+    assert [e['id'] for e in client.get_equipment_by_ids(ids)] == list(range(1200))
+    assert requested == [list(range(500)), list(range(500, 1000)), list(range(1000, 1200))]
+
+    requested.clear()
+    equipment = list(client.iter_equipment_by_ids([3, 1300, 4, 1301]))
+    assert [e['id'] for e in equipment] == [3, 1300, 4, 1301]
+    assert requested == [[1300, 1301]]
+
+    # the API leaves out ids without equipment and answers in its own order
+    def unordered(url, json, **kwargs):
+        return response([{'id': i, 'points': []} for i in reversed(json['equipment_ids'])
+                         if i % 2 == 0])
+
+    client, _ = client_with({'/equipment/query': unordered}, max_workers=3)
+    equipment = client.iter_equipment_by_ids(list(range(10, 0, -1)), chunk_size=3)
+    assert [e['id'] for e in equipment] == [10, 8, 6, 4, 2]
+
+
+def test_iter_building_equipment_pages():
+    def page(url, **kwargs):
+        assert kwargs['stream']
+        if url.endswith('page=2'):
+            return response([{'id': 3}])
+        res = response([{'id': 1}, {'id': 2}])
+        res.headers['Link'] = '<http://localhost/buildings/1/equipment?points=true&page=2>; ' \
+                              'rel="next"'
+        return res
+
+    client, api = client_with({
+        '/buildings/1/equipment?points=true': page,
+        'http://localhost/buildings/1/equipment?points=true&page=2': page,
+    })
+    equipment = client.iter_building_equipment(1)
+    assert next(equipment) == {'id': 1}
+    assert len(api.calls) == 1
+    assert [e['id'] for e in equipment] == [2, 3]
+    assert len(api.calls) == 2
+
+
+def test_iter_alerts_errors_partway():
+    body = orjson.dumps([{'id': i} for i in range(3)])
+
+    def broken(url, **kwargs):
+        res = requests.Response()
+        res.status_code = 200
+        res.raw = BrokenStream(body, 10)
+        return res
+
+    client, _ = client_with({'/alerts': broken})
+    with pytest.raises(OnboardTemporaryException, match='connection reset'):
+        list(client.iter_alerts())
+
+    client, _ = client_with({'/alerts': lambda url, **kw: response(b'[{"id": 1}, {"id"')})
+    alerts = client.iter_alerts()
+    assert next(alerts) == {'id': 1}
+    with pytest.raises(OnboardApiException) as e:
+        next(alerts)
+    assert not isinstance(e.value, OnboardTemporaryException)
+
+
+def test_stream_point_timeseries_resample_locally():
+    sent = []
+
+    def query_v2(url, json, **kwargs):
+        sent.append(json)
+        values = [[i * 60_000, float(i), float(i)] for i in range(10)]
+        return response(orjson.dumps({'point_id': 1, 'raw': 'F', 'unit': 'C',
+                                      'columns': ['time', 'raw', 'C'], 'values': values}))
+
+    client, _ = client_with({'/query-v2': query_v2})
+    start = datetime.fromtimestamp(0, timezone.utc)
+    query = TimeseriesQuery(point_ids=[1], start=start, end=start + timedelta(minutes=10),
+                            interval=timedelta(minutes=5), aggregation='max')
+    [point] = client.stream_point_timeseries(query)
+    assert point.values == [[0, 4.0, 4.0], [300_000, 9.0, 9.0]]
+    assert 'interval' not in sent[-1]
+
+    list(client.stream_point_timeseries(query, resample_locally=False))
+    assert sent[-1]['interval'] == 300.0 and sent[-1]['aggregation'] == 'max'
+
+
+def test_stream_point_timeseries_cached(tmp_path):
+    line = orjson.dumps({'point_id': 1, 'raw': 'F', 'unit': 'C', 'columns': ['time', 'raw', 'C'],
+                         'values': [['2023-01-01T12:00:00Z', 32.0, 0.0]]})
+    cache = TimeseriesCache(str(tmp_path / 'ts.db'))
+    client, api = client_with({'/query-v2': lambda url, **kw: response(line)},
+                              timeseries_cache=cache)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    query = TimeseriesQuery(point_ids=[1], start=start, end=start + timedelta(hours=23))
+    for _ in range(2):
+        [point] = client.stream_point_timeseries(query)
+        assert point.values == [['2023-01-01T12:00:00Z', 32.0, 0.0]]
+    assert api.calls == ['/query-v2']
@@ -0,0 +1,79 @@
+# type: ignore
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from onboard.client.columnar import ColumnarPointData, parse_timestamps_ns
+from onboard.client.models import point_data_constructor
+
+RECORD = {
+    'point_id': 7,
+    'raw': 'F',
+    'unit': 'C',
+    'columns': ['time', 'raw', 'C'],
+    'values': [
+        ['2023-01-01T00:00:00.000Z', 32.0, 0.0],
+        ['2023-01-01T00:01:00.000Z', None, None],
+        ['2023-01-01T00:02:00.000Z', 'off', 1],
+    ],
+}
+
+
+@pytest.mark.filterwarnings('error')
+def test_parse_timestamps_mixed_layouts():
+    stamps = ['2023-01-01T00:00:00Z', '2023-01-01T05:01:00+05:00', '2023-01-01T00:02:00.000Z',
+              1672531380000]
+    ms = parse_timestamps_ns(stamps[:3]) // 1_000_000
+    assert ms.tolist() == [1672531200000, 1672531260000, 1672531320000]
+    assert (parse_timestamps_ns(stamps[3:]) // 1_000_000).tolist() == stamps[3:]
+
+
+def test_parse_timestamps_ns():
+    stamps = ['2023-01-01T00:00:00.000Z', '2024-02-29T23:59:59.123456789Z',
+              '1969-12-31T23:59:59Z', '2023-06-01T12:00:00+05:30', '2023-06-01T12:00:00-07:00',
+              '2023-06-01 12:00:00', '2000-03-01T00:00:00.5Z']
+    parsed = [pd.Timestamp(s) for s in stamps]
+    expected = [(t if t.tz else t.tz_localize('UTC')).as_unit('ns').value for t in parsed]
+    assert parse_timestamps_ns(stamps).tolist() == expected
+    assert parse_timestamps_ns(np.array(stamps[:1] * 3, dtype=object)).tolist() \
+        == expected[:1] * 3
+    assert parse_timestamps_ns([1672531200000]).tolist() == [1672531200000000000]
+    assert len(parse_timestamps_ns([])) == 0
+
+    for invalid in (['2023-01-01'], ['2023-13-01T00:00:00Z'], ['2023/01/01T00:00:00Z'],
+                    ['2023-01-01T00:00:00Z', '2023-01-01T00:00:0xZ'], ['1600-01-01T00:00:00Z'],
+                    ['2023-02-29T00:00:00Z'], ['2100-02-29T00:00:00Z'], ['2023-04-31T00:00:00Z'],
+                    [None], [1.0, None]):
+        with pytest.raises(ValueError):
+            parse_timestamps_ns(invalid)
+
+
+def test_from_json():
+    point = ColumnarPointData.from_json(RECORD)
+    assert len(point) == 3
+    assert point.timestamps.dtype == np.int64
+    assert point.timestamps[1] - point.timestamps[0] == 60000
+    assert point.clean.tolist()[0] == 0.0
+    assert math.isnan(point.clean[1])
+    assert point.clean[2] == 1.0
+    assert math.isnan(point.values['raw'][2])
+
+    with pytest.raises(ValueError, match='nulls'):
+        ColumnarPointData.from_json({**RECORD, 'values': [[None, 1.0, 1], [1.0, 2.0, 2]]})
+
+
+def test_from_point_data_empty():
+    point = point_data_constructor()(**{**RECORD, 'values': []})
+    columnar = ColumnarPointData.from_point_data(point)
+    assert len(columnar) == 0
+    assert columnar.clean.dtype == np.float64
+
+
+def test_to_series():
+    series = ColumnarPointData.from_json(RECORD).to_series()
+    assert series.name == 7
+    assert str(series.index.tz) == 'UTC'
+    assert series.index[2].minute == 2
@@ -0,0 +1,67 @@
+# type: ignore
+
+import gzip
+from datetime import datetime, timezone
+
+import numpy as np
+import orjson
+import pytest
+
+from onboard.client import APIClient
+from onboard.client.compression import accepts, compress_request
+from onboard.client.models import TimeseriesQuery
+
+
+def test_compress_request_thresholds():
+    small = compress_request({'json': {'a': 1}}, 'gzip')
+    assert small == {'json': {'a': 1}}
+    large = compress_request({'json': ['x' * 2000], 'headers': {'Accept': 'x'}}, 'gzip')
+    assert large['headers'] == {'Accept': 'x', 'Content-Encoding': 'gzip'}
+    assert orjson.loads(gzip.decompress(large['data'])) == ['x' * 2000]
+    assert compress_request({'params': {'a': 1}}, 'gzip') == {'params': {'a': 1}}
+
+
+def test_compress_request_non_str_keys():
+    # copy_point_data maps int point ids to int point ids
+    point_id_map = {i: i + 100_000 for i in range(500)}
+    small = compress_request({'json': {1: 2}}, 'gzip')
+    assert small == {'json': {1: 2}}
+    large = compress_request({'json': {'point_id_map': point_id_map}}, 'gzip')
+    assert 'json' not in large
+    decoded = orjson.loads(gzip.decompress(large['data']))
+    assert decoded['point_id_map'] == {str(k): v for k, v in point_id_map.items()}
+
+
+def test_invalid_compression():
+    with pytest.raises(ValueError, match='compression must be one of'):
+        APIClient('http://localhost', api_key='ob-p-test', compression='br')
+
+
+@pytest.mark.parametrize('encoding', ['gzip', 'zstd'])
+def test_compressed_round_trip(fake_client, encoding):
+    if not accepts(encoding):
+        pytest.skip(f'urllib3 cannot decode {encoding} here')
+    records = [{'point_id': i, 'raw': 'F', 'unit': 'F', 'columns': ['time', 'F'],
+                'values': [[1640995200000 + j, j] for j in range(200)]} for i in range(20)]
+    body = b'\n'.join(orjson.dumps(r) for r in records)
+    client, adapter = fake_client(body, encoding=encoding, compression=encoding)
+
+    query = TimeseriesQuery(point_ids=list(range(20)),
+                            start=datetime(2022, 1, 1, tzinfo=timezone.utc),
+                            end=datetime(2022, 1, 2, tzinfo=timezone.utc))
+    points = list(client.stream_point_timeseries(query, chunk_size=1024))
+    assert [p.point_id for p in points] == list(range(20))
+    assert points[-1].values[-1] == [1640995200199, 199]
+
+    client.update_point_data_arrays([1] * 100, [1.0] * 100,
+                                    np.full(100, np.datetime64('2022-01-01', 'ms')))
+    update = adapter.requests[-1]
+    assert update.headers['Content-Encoding'] == encoding
+    assert len(orjson.loads(decompress(update.body, encoding))) == 100
+
+
+def decompress(body, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    from onboard.client.compression import _zstd
+    return _zstd().decompress(body)
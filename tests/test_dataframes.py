@@ -0,0 +1,106 @@
+# type: ignore
+
+import math
+
+import pandas as pd
+
+from onboard.client.columnar import ColumnarPointData
+from onboard.client.dataframes import points_df_from_streaming_timeseries, \
+    TimeseriesFrameBuilder, iter_timeseries_frames, df_time_index, df_objs_to_numeric
+
+from .helpers import point
+
+
+TIMESERIES = [
+    point(1, [['2023-01-01T00:01:00Z', None, 1.0], ['2023-01-01T00:00:00Z', None, 0.0]]),
+    point(2, [['2023-01-01T00:01:00Z', None, 2.0], ['2023-01-01T00:02:00Z', None, None]]),
+]
+
+
+def test_points_df_from_streaming_timeseries():
+    df = points_df_from_streaming_timeseries(TIMESERIES, points=[{'id': 2, 'type': 'Temp'}],
+                                             point_column_label=lambda p: p['type'])
+    assert list(df.columns) == ['timestamp', 1, 'Temp']
+    assert list(df['timestamp']) == ['2023-01-01T00:00:00Z', '2023-01-01T00:01:00Z',
+                                     '2023-01-01T00:02:00Z']
+    assert df[1].tolist()[:2] == [0.0, 1.0]
+    assert math.isnan(df[1][2])
+    assert df['Temp'].tolist()[1] == 2.0
+    assert math.isnan(df['Temp'][0]) and math.isnan(df['Temp'][2])
+
+
+def test_points_df_time_index():
+    df = points_df_from_streaming_timeseries(TIMESERIES, time_index=True)
+    assert list(df.columns) == [1, 2]
+    assert str(df.index.tz) == 'UTC'
+    assert [ts.minute for ts in df.index] == [0, 1, 2]
+
+
+def test_points_df_columnar():
+    columnar = [ColumnarPointData.from_point_data(p) for p in TIMESERIES]
+    df = points_df_from_streaming_timeseries(columnar, time_index=True)
+    expected = points_df_from_streaming_timeseries(TIMESERIES, time_index=True)
+    assert df.equals(expected)
+
+
+def test_points_df_duplicate_timestamps():
+    duplicated = point(1, [['2023-01-01T00:00:00Z', None, 1.0],
+                           ['2023-01-01T00:00:00Z', None, 2.0]])
+    df = points_df_from_streaming_timeseries([duplicated])
+    assert df[1].tolist() == [2.0]
+
+
+def test_points_df_non_numeric():
+    states = point(3, [['2023-01-01T00:02:00Z', None, 'on'],
+                       ['2023-01-01T00:01:00Z', None, 'off']])
+    df = points_df_from_streaming_timeseries(TIMESERIES + [states])
+    assert list(df.columns) == ['timestamp', 1, 2, 3]
+    assert pd.isna(df[3][0])
+    assert df[3].tolist()[1:] == ['off', 'on']
+    assert df[2].tolist()[1] == 2.0
+
+
+def test_points_df_empty():
+    assert points_df_from_streaming_timeseries([]).empty
+
+
+def test_frame_builder_matches_batch_builder():
+    builder = TimeseriesFrameBuilder(capacity=1)
+    for p in TIMESERIES:
+        builder.add(p)
+    assert len(builder) == 4
+    expected = points_df_from_streaming_timeseries(TIMESERIES, time_index=True)
+    assert builder.frame().equals(expected)
+
+
+def test_iter_timeseries_frames():
+    timeseries = [point(i, [[f'2023-01-01T00:0{m}:00Z', None, float(i)] for m in range(3)])
+                  for i in range(5)]
+    frames = list(iter_timeseries_frames(timeseries, max_rows=6))
+    assert [list(df.columns) for df in frames] == [[0, 1], [2, 3], [4]]
+    assert all(len(df) == 3 for df in frames)
+    assert frames[1][3].tolist() == [3.0, 3.0, 3.0]
+
+
+def test_df_time_index():
+    df = points_df_from_streaming_timeseries(TIMESERIES)
+    indexed = df_time_index(df)
+    assert list(indexed.columns) == [1, 2]
+    assert indexed.index.equals(points_df_from_streaming_timeseries(TIMESERIES,
+                                                                    time_index=True).index)
+    assert df_time_index(df, utc=False).index.tz is None
+
+    # layouts the fast parser doesn't handle, and nulls, are left to pandas
+    other = pd.DataFrame({'timestamp': ['01/02/2023 00:00', None], 'v': [1, 2]})
+    assert df_time_index(other).index[0] == pd.Timestamp('2023-01-02', tz='UTC')
+    assert pd.isna(df_time_index(other).index[1])
+
+
+def test_df_objs_to_numeric():
+    df = pd.DataFrame({'n': [1, 2, 3], 'a': [1.5, None, '2'], 'b': ['x', 3, None],
+                       'f': [1.0, 2.0, 3.0]}, dtype=object).astype({'n': int, 'f': float})
+    converted = df_objs_to_numeric(df)
+    assert list(converted.columns) == ['a', 'b']
+    assert (converted.dtypes == 'float64').all()
+    assert converted['a'].tolist()[::2] == [1.5, 2.0] and math.isnan(converted['a'][1])
+    assert converted['b'][1] == 3.0 and converted['b'].isna().sum() == 2
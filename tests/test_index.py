@@ -0,0 +1,89 @@
+# type: ignore
+
+from datetime import datetime, timezone
+
+from onboard.client.index import PointIndex
+from onboard.client.models import PointSelector
+
+from .helpers import client_with
+
+
+def point(point_id, building_id, equip_id, point_type_id, last_updated=0):
+    return {'id': point_id, 'building_id': building_id, 'equip_id': equip_id,
+            'point_type_id': point_type_id, 'name': f'point {point_id}',
+            'datasource_hash': f'hash{point_id}', 'topic': f'site/{point_id}',
+            'last_updated': last_updated}
+
+
+def routes():
+    return {
+        '/organizations': {'1': {'name': 'Acme', 'short_name': 'acme'}},
+        '/pointtypes': [{'id': 5, 'tag_name': 'Zone Temperature'},
+                        {'id': 6, 'tag_name': 'Fan Status'}],
+        '/equiptype': [{'id': 7, 'tag_name': 'ahu'}, {'id': 8, 'tag_name': 'vav'}],
+        '/buildings': [{'id': 1, 'name': 'HQ', 'org_id': 1},
+                       {'id': 2, 'name': 'Lab', 'org_id': 2}],
+        '/buildings/1/changelog': [{'id': 1}],
+        '/buildings/2/changelog': [{'id': 2}],
+        '/buildings/1/equipment?points=true': [
+            {'id': 10, 'suffix': 'AHU-1', 'equip_type_id': 7,
+             'points': [point(100, 1, 10, 5, 2000), point(101, 1, 10, 6)]},
+            {'id': 11, 'suffix': 'VAV-1', 'equip_type_id': 8,
+             'points': [point(102, 1, 11, 5, 2000)]},
+        ],
+        '/buildings/2/equipment?points=true': [
+            {'id': 20, 'suffix': 'AHU-1', 'equip_type_id': 7,
+             'points': [point(200, 2, 20, 5)]},
+        ],
+    }
+
+
+def index_with(api_routes):
+    client, api = client_with(api_routes, max_workers=2)
+    return PointIndex.from_client(client), client, api
+
+
+def test_select_combines_criteria():
+    index, _, _ = index_with(routes())
+    assert len(index) == 4
+    assert index.select(PointSelector(buildings=['HQ']))['points'] == [100, 101, 102]
+    assert index.select(PointSelector(orgs=['acme']))['points'] == [100, 101, 102]
+    assert index.select(PointSelector(point_types=['Zone Temperature']))['points'] \
+        == [100, 102, 200]
+    selection = index.select(PointSelector(buildings=[1], equipment_types=['ahu'],
+                                           point_types=[5]))
+    assert selection == {'points': [100], 'buildings': [1], 'equipment': [10]}
+    assert index.select(PointSelector(equipment=['AHU-1']))['points'] == [100, 101, 200]
+    assert index.select(PointSelector(point_ids=[100], point_topics=['site/200'],
+                                      point_hashes=['hash102'], point_names=['nope'])
+                        )['points'] == [100, 102, 200]
+    since = datetime.fromtimestamp(1, timezone.utc)
+    assert index.select(PointSelector(updated_since=since))['points'] == [100, 102]
+
+
+def test_refresh_reindexes_changed_buildings():
+    api_routes = routes()
+    index, client, api = index_with(api_routes)
+
+    # only entries after the latest one seen are asked for, an API which returns the
+    # older ones anyway doesn't make the building look changed
+    api_routes['/buildings/1/changelog?since_id=1'] = [{'id': 1}]
+    api_routes['/buildings/2/changelog?since_id=2'] = []
+    api.calls.clear()
+    assert index.refresh(client) == []
+    assert '/buildings/1/changelog' not in api.calls
+    api_routes['/buildings/2/changelog?since_id=2'] = [{'id': 3}]
+    api_routes['/buildings/2/equipment?points=true'] = [
+        {'id': 20, 'suffix': 'AHU-1', 'equip_type_id': 7, 'points': [point(201, 2, 20, 6)]},
+    ]
+    api.calls.clear()
+    assert index.refresh(client) == [2]
+    assert api.calls.count('/buildings/2/changelog?since_id=2') == 1
+    assert '/buildings/1/equipment?points=true' not in api.calls
+    assert index.changelog_cursors == {1: 1, 2: 3}
+    assert index.select(PointSelector(buildings=[2]))['points'] == [201]
+    assert index.select(PointSelector(point_ids=[200]))['points'] == []
+
+    api_routes['/buildings'] = [{'id': 1, 'name': 'HQ', 'org_id': 1}]
+    index.refresh(client)
+    assert index.select(PointSelector(equipment=['AHU-1']))['points'] == [100, 101]
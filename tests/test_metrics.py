@@ -0,0 +1,129 @@
+# type: ignore
+
+from datetime import datetime, timedelta, timezone
+
+import orjson
+
+from onboard.client import APIClient
+from onboard.client.metrics import Histogram, Metrics, OpenTelemetryHooks, endpoint_label
+from onboard.client.models import TimeseriesQuery
+
+from .helpers import FakeApi, Recorder, client_with, response
+
+
+def test_endpoint_label():
+    assert endpoint_label('/buildings/12/equipment?points=true') == '/buildings/{id}/equipment'
+    assert endpoint_label('https://api.onboarddata.io/buildings/7') == '/buildings/{id}'
+    assert endpoint_label('/query-v2') == '/query-v2'
+
+
+def test_histogram_quantiles():
+    h = Histogram([1, 2, 4])
+    for v in [0.5, 1.5, 1.5, 3, 10]:
+        h.observe(v)
+    assert h.cumulative() == [('1', 1), ('2', 3), ('4', 4), ('+Inf', 5)]
+    assert h.quantile(0.5) == 1.75
+    assert h.quantile(0.99) == 4
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_metrics_prometheus():
+    metrics = Metrics(buckets=[0.1, 1])
+    metrics.on_request('GET', '/buildings', 200, 0.05, 0, 120)
+    metrics.on_request('GET', '/buildings', 200, 0.5, 0, 80)
+    metrics.on_retry('/query-v2', 1, None)
+    metrics.on_stream('/query-v2', 10, 0.01, 0.2, 4096)
+
+    snapshot = metrics.snapshot()
+    labels = (('method', 'GET'), ('endpoint', '/buildings'), ('status', '200'))
+    assert snapshot['request_seconds'][labels]['count'] == 2
+    assert snapshot['received_bytes'][labels[:2]] == 200
+    assert snapshot['retries'] == {(('endpoint', '/query-v2'),): 1}
+
+    text = metrics.prometheus()
+    assert '# TYPE onboard_client_request_seconds histogram' in text
+    assert ('onboard_client_request_seconds_bucket{method="GET",endpoint="/buildings",'
+            'status="200",le="0.1"} 1') in text
+    assert 'onboard_client_request_seconds_count{method="GET",endpoint="/buildings",' \
+           'status="200"} 2' in text
+    assert 'onboard_client_stream_records_total{endpoint="/query-v2"} 10' in text
+    assert 'onboard_client_retries_total{endpoint="/query-v2"} 1' in text
+
+
+class FakeInstrument:
+    def __init__(self):
+        self.values = []
+
+    def add(self, value, attributes):
+        self.values.append(value)
+
+    record = add
+
+
+class FakeMeter:
+    def __init__(self):
+        self.instruments = {}
+
+    def create_counter(self, name, **kwargs):
+        return self.instruments.setdefault(name, FakeInstrument())
+
+    create_histogram = create_counter
+
+
+def test_open_telemetry_hooks_count_streamed_bytes_apart():
+    meter = FakeMeter()
+    hooks = OpenTelemetryHooks(meter)
+    hooks.on_request('POST', '/query-v2', 200, 0.1, 50, 4096)
+    hooks.on_stream('/query-v2', 10, 0.01, 0.2, 4096)
+    assert meter.instruments['onboard.client.response.body.size'].values == [4096]
+    assert meter.instruments['onboard.client.stream.body.size'].values == [4096]
+    assert meter.instruments['onboard.client.stream.records'].values == [10]
+
+
+def test_request_and_stream_hooks(fake_client):
+    body = b'\n'.join(orjson.dumps({'point_id': i, 'raw': 'F', 'unit': 'F',
+                                    'columns': ['time', 'F'], 'values': [[0, i]]})
+                      for i in range(3))
+    hooks = Recorder()
+    client, adapter = fake_client(body, hooks=hooks)
+    query = TimeseriesQuery(point_ids=[0, 1, 2],
+                            start=datetime(2022, 1, 1, tzinfo=timezone.utc),
+                            end=datetime(2022, 1, 2, tzinfo=timezone.utc))
+    assert len(list(client.stream_point_timeseries(query))) == 3
+    sent = len(adapter.requests[0].body)
+    assert hooks.calls == [('request', 'POST', '/query-v2', 200, sent, 0),
+                           ('stream', '/query-v2', 3, len(body))]
+
+    hooks.calls.clear()
+    client.get('/buildings/4/equipment?points=true')
+    assert hooks.calls == [('request', 'GET', '/buildings/{id}/equipment', 200, 0, len(body))]
+
+
+def test_reauth_hook():
+    responses = [response(b'', status=401), response({'ok': True})]
+    hooks = Recorder()
+    client = APIClient('http://localhost', user='u', pw='p', token='stale', hooks=hooks)
+    client.get = client.post = FakeApi({'/whoami': lambda url, **kw: responses.pop(0),
+                                        '/login': {'access_token': 'fresh'}})
+    assert client.whoami() == {'ok': True}
+    assert client.token == 'fresh'
+    assert hooks.calls == [('reauth', '')]
+
+
+def test_shard_retry_hook():
+    failures = []
+
+    def query_v2(url, json, **kwargs):
+        if not failures:
+            failures.append(url)
+            return response(b'oops', status=502)
+        return response(orjson.dumps({'point_id': 1, 'raw': 'F', 'unit': 'C',
+                                      'columns': ['time', 'raw'], 'values': []}))
+
+    hooks = Recorder()
+    client, _ = client_with({'/query-v2': query_v2}, hooks=hooks)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    query = TimeseriesQuery(point_ids=[1], start=start, end=start + timedelta(days=1))
+    assert len(list(client.stream_point_timeseries(query, shard_interval=timedelta(days=1)))) \
+        == 1
+    assert ('retry', '/query-v2', 1) in hooks.calls
@@ -1,8 +1,10 @@
 # type: ignore
 
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any
 
+import pytest
+
 from onboard.client.models import TimeseriesQuery, PointData
 
 
@@ -65,3 +67,20 @@ def test_point_data_extra_keys():
     constructed = construct(dict)
     assert constructed.foo == 'bar'
     assert constructed.point_id == 1
+
+
+def test_timeseries_query_resampling():
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    query = TimeseriesQuery(point_ids=[1], start=start, end=start + timedelta(days=1))
+    assert 'interval' not in query.json()
+
+    query = TimeseriesQuery(point_ids=[1], start=start, end=start + timedelta(days=1),
+                            interval=timedelta(minutes=15), aggregation='max', align='start')
+    json = query.json()
+    assert (json['interval'], json['aggregation'], json['align']) == (900.0, 'max', 'start')
+    assert query.bucket_origin() == start
+
+    for invalid in ({'interval': timedelta(0)}, {'aggregation': 'median'},
+                    {'align': 'end'}):
+        with pytest.raises(ValueError):
+            TimeseriesQuery(point_ids=[1], start=start, end=start, **invalid)
@@ -0,0 +1,52 @@
+# type: ignore
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from onboard.client.models import TimeseriesQuery
+from onboard.client.resample import resample_point_data, resample_query_results
+
+from .helpers import point
+
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+MINUTE = 60_000
+
+
+# two five minute buckets, the second with a null, and a third with only a null
+SAMPLES = [[0, 1.0, 10.0], [2 * MINUTE, 3.0, 30.0], [6 * MINUTE, 5.0, None],
+           [4 * MINUTE, 2.0, 20.0], [9 * MINUTE, 7.0, 70.0], [12 * MINUTE, None, None]]
+
+
+@pytest.mark.parametrize('aggregation, expected', [
+    ('mean', [[0, 2.0, 20.0], [5 * MINUTE, 6.0, 70.0], [10 * MINUTE, None, None]]),
+    ('sum', [[0, 6.0, 60.0], [5 * MINUTE, 12.0, 70.0], [10 * MINUTE, None, None]]),
+    ('min', [[0, 1.0, 10.0], [5 * MINUTE, 5.0, 70.0], [10 * MINUTE, None, None]]),
+    ('max', [[0, 3.0, 30.0], [5 * MINUTE, 7.0, 70.0], [10 * MINUTE, None, None]]),
+    ('count', [[0, 3, 3], [5 * MINUTE, 2, 1], [10 * MINUTE, 0, 0]]),
+    ('first', [[0, 1.0, 10.0], [5 * MINUTE, 5.0, 70.0], [10 * MINUTE, None, None]]),
+    ('last', [[0, 2.0, 20.0], [5 * MINUTE, 7.0, 70.0], [10 * MINUTE, None, None]]),
+])
+def test_resample_point_data(aggregation, expected):
+    resampled, = resample_point_data([point(1, SAMPLES)], timedelta(minutes=5), aggregation)
+    assert resampled.values == expected
+    assert resampled.columns == ['time', 'raw', 'C']
+
+
+def test_resample_iso_times_and_origin():
+    values = [['2023-01-01T00:01:00.000Z', 1.0], ['2023-01-01T00:04:00.000Z', 3.0],
+              ['2023-01-01T00:07:00.000Z', 5.0]]
+    query = TimeseriesQuery(point_ids=[1], start=START + timedelta(minutes=1),
+                            end=START + timedelta(minutes=10), interval=timedelta(minutes=5),
+                            align='start')
+    resampled, = resample_query_results([point(1, values, ('time', 'C'))], query)
+    assert resampled.values == [['2023-01-01T00:01:00.000Z', 2.0],
+                                ['2023-01-01T00:06:00.000Z', 5.0]]
+
+    resampled, = resample_point_data([point(1, [])], timedelta(minutes=5))
+    assert resampled.values == []
+    with pytest.raises(ValueError):
+        next(resample_point_data([point(1, SAMPLES)], timedelta(minutes=5), 'median'))
+    with pytest.raises(ValueError, match='nulls'):
+        next(resample_point_data([point(1, [[0, 1.0, 1.0], [None, 2.0, 2.0]])],
+                                 timedelta(minutes=5)))
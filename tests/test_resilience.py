@@ -0,0 +1,181 @@
+# type: ignore
+
+import asyncio
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from onboard.client import OnboardApiException, OnboardTemporaryException
+from onboard.client.exceptions import OnboardCircuitOpenException
+from onboard.client.models import PointSelector
+from onboard.client.resilience import CircuitBreaker, Resilience, TokenBucket, retry_after
+
+from .helpers import Recorder, async_client_with, response
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert 0.09 < bucket.reserve() <= 0.1
+    bucket.pause(5)
+    assert 4.9 < bucket.reserve() <= 5
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_circuit_breaker(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr('onboard.client.resilience.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker(failures=2, reset_after=10)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open' and not breaker.allow()
+    now[0] = 10
+    assert breaker.allow()  # a single trial call
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == 'open'
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == 'closed'
+
+
+def test_retry_after():
+    assert retry_after({'Retry-After': '3'}) == 3
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 28 < retry_after({'Retry-After': format_datetime(later, usegmt=True)}) <= 30
+    assert retry_after({'Retry-After': 'soon'}) is None
+    assert retry_after({}) is None
+
+
+def test_retries_rate_limited_and_failed_requests(fake_client):
+    hooks = Recorder()
+    resilience = Resilience(retries=3, backoff=0.001)
+    client, adapter = fake_client(
+        [429, requests.ConnectionError('reset'), 503, 200],
+        headers={'Retry-After': '0'}, resilience=resilience, hooks=hooks)
+    assert client.whoami() == {'status': 200}
+    assert len(adapter.requests) == 4
+    assert [c[2] for c in hooks.calls if c[0] == 'retry'] == [1, 2, 3]
+
+
+def test_gives_up_after_retries_and_long_retry_after(fake_client):
+    client, adapter = fake_client([503], resilience=Resilience(retries=2, backoff=0.001))
+    with pytest.raises(OnboardTemporaryException):
+        client.whoami()
+    assert len(adapter.requests) == 3
+
+    client, adapter = fake_client([429], headers={'Retry-After': '120'},
+                                  resilience=Resilience(max_retry_after=60))
+    with pytest.raises(OnboardApiException, match='429'):
+        client.whoami()
+    assert len(adapter.requests) == 1
+
+
+def test_writes_are_only_retried_when_not_applied(fake_client):
+    def write(client):
+        return client.post('/points_update', json=[])
+
+    for step in (502, requests.ReadTimeout('read timed out')):
+        client, adapter = fake_client([step, 200], resilience=Resilience(backoff=0.001))
+        try:
+            write(client)
+        except requests.ReadTimeout:
+            pass
+        assert len(adapter.requests) == 1
+
+    refused = requests.ConnectionError(MaxRetryError(None, '/points_update',
+                                                     NewConnectionError(None, 'refused')))
+    client, adapter = fake_client([503, refused, 200], resilience=Resilience(backoff=0.001))
+    assert write(client).status_code == 200
+    assert len(adapter.requests) == 3
+
+    # reads sent as POSTs are retried like GETs
+    client, adapter = fake_client([502, 200], resilience=Resilience(backoff=0.001))
+    assert client.select_points(PointSelector()) == {'status': 200}
+    assert len(adapter.requests) == 2
+
+
+def test_circuit_opens_per_endpoint(fake_client):
+    resilience = Resilience(retries=0, breaker_failures=2, breaker_reset=60)
+    client, adapter = fake_client([500], resilience=resilience)
+    for _ in range(2):
+        with pytest.raises(OnboardTemporaryException):
+            client.get_all_buildings()
+    with pytest.raises(OnboardCircuitOpenException, match='/buildings'):
+        client.get_all_buildings()
+    assert len(adapter.requests) == 2
+
+    adapter.respond = [200]
+    assert client.whoami() == {'status': 200}
+
+
+def test_circuit_recovers_from_unexpected_errors(monkeypatch, fake_client):
+    now = [0.0]
+    monkeypatch.setattr('onboard.client.resilience.time.monotonic', lambda: now[0])
+    resilience = Resilience(retries=0, breaker_failures=1, breaker_reset=10)
+    client, adapter = fake_client(
+        [requests.ConnectionError('reset'), requests.exceptions.ChunkedEncodingError('cut'),
+         200], resilience=resilience)
+    with pytest.raises(OnboardApiException):
+        client.whoami()
+    now[0] = 10
+    with pytest.raises(OnboardApiException, match='cut'):
+        client.whoami()  # the trial call fails with an error which isn't retried
+    assert resilience.breaker('/whoami').state == 'open'
+    now[0] = 20
+    assert client.whoami() == {'status': 200}
+
+
+def test_reauthentication_is_capped(fake_client):
+    logins = []
+
+    def respond(request):
+        if request.path_url == '/login':
+            logins.append(request)
+            return {'access_token': f'token-{len(logins)}'}
+        res = response(b'', status=401)
+        res.headers['X-Auth'] = request.headers['Authorization']
+        return res
+
+    seen = []
+    for max_reauth in (1, 3):
+        logins.clear()
+        client, _ = fake_client(respond, api_key=None, user='u', pw='p', token='stale',
+                                resilience=Resilience(max_reauth=max_reauth))
+        session = client._ClientBase__session()
+        session.hooks['response'].append(lambda res, **kw: seen.append(res.headers.get('X-Auth')))
+        seen.clear()
+        with pytest.raises(OnboardApiException):
+            client.whoami()
+        assert len(logins) == max_reauth
+        assert seen[-1] == f'Bearer token-{max_reauth}'
+
+    # a client which was only given a token has no way to get another
+    client, adapter = fake_client([401], token='only', api_key=None)
+    with pytest.raises(OnboardApiException):
+        client.whoami()
+    assert len(adapter.requests) == 1
+
+
+def test_async_retries():
+    statuses = [429, 502, 200]
+
+    def handler(request):
+        status = statuses.pop(0)
+        return httpx.Response(status, json={'ok': True}, headers={'Retry-After': '0'})
+
+    async def go():
+        client = async_client_with(handler, api_key='ob-p-test',
+                                   resilience=Resilience(backoff=0.001))
+        return await client.whoami()
+
+    assert asyncio.run(go()) == {'ok': True}
+    assert statuses == []
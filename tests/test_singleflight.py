@@ -0,0 +1,97 @@
+# type: ignore
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from onboard.client.models import PointSelector
+from onboard.client.singleflight import SingleFlight
+
+from .helpers import Recorder
+
+
+def test_single_flight_shares_results_and_errors():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow(value):
+        def run():
+            calls.append(value)
+            release.wait(5)
+            if isinstance(value, Exception):
+                raise value
+            return value
+        return run
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flights.do, 'key', slow(1)) for _ in range(3)]
+        futures.append(pool.submit(flights.do, 'other', slow(2)))
+        while len(flights) < 2 or len(calls) < 2:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        results = [f.result() for f in futures]
+    assert sorted(calls) == [1, 2]
+    assert sorted(results) == [(1, False), (1, True), (1, True), (2, False)]
+    assert len(flights) == 0
+
+    release.clear()
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(flights.do, 'key', slow(ValueError('boom'))) for _ in range(2)]
+        while len(flights) < 1:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        for f in futures:
+            with pytest.raises(ValueError, match='boom'):
+                f.result()
+
+
+def gated_client(fake_client, **kwargs):
+    """A client whose requests are all held until release is set, to line up concurrent
+    identical calls"""
+    release = threading.Event()
+
+    def respond(request):
+        release.wait(5)
+        return {'points': [1, 2, 3]}
+
+    client, adapter = fake_client(respond, **kwargs)
+    return client, adapter, release
+
+
+def concurrently(adapter, release, calls, expected_requests):
+    with ThreadPoolExecutor(len(calls)) as pool:
+        futures = [pool.submit(call) for call in calls]
+        while len(adapter.requests) < expected_requests:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        return [f.result() for f in futures]
+
+
+def test_coalesces_identical_calls(fake_client):
+    hooks = Recorder()
+    client, adapter, release = gated_client(fake_client, coalesce=True, hooks=hooks)
+    selector = PointSelector(buildings=[1])
+    calls = [lambda: client.select_points(selector)] * 4
+    calls.append(lambda: client.select_points(PointSelector(buildings=[2])))
+    results = concurrently(adapter, release, calls, 2)
+    assert len(adapter.requests) == 2
+    assert all(r == {'points': [1, 2, 3]} for r in results)
+    assert results[0] is not results[1]  # each caller decodes its own copy
+    assert len([c for c in hooks.calls if c[0] == 'coalesce']) == 3
+
+
+def test_coalescing_is_opt_in_and_skips_writes(fake_client):
+    client, adapter, release = gated_client(fake_client)
+    concurrently(adapter, release, [client.whoami] * 3, 3)
+    assert len(adapter.requests) == 3
+
+    client, adapter, release = gated_client(fake_client, coalesce=True)
+    post = lambda: client.post('/points_update', json=[])  # noqa: E731
+    concurrently(adapter, release, [post] * 2, 2)
+    assert len(adapter.requests) == 2
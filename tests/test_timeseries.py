@@ -0,0 +1,69 @@
+# type: ignore
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from onboard.client.models import TimeseriesQuery, PointSelector
+from onboard.client.timeseries import time_windows, shard_query, merge_point_data
+
+from .helpers import point
+
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def test_time_windows():
+    windows = time_windows(START, START + timedelta(days=10), timedelta(days=4))
+    assert windows == [(START, START + timedelta(days=4)),
+                       (START + timedelta(days=4), START + timedelta(days=8)),
+                       (START + timedelta(days=8), START + timedelta(days=10))]
+
+
+def test_time_windows_invalid():
+    with pytest.raises(ValueError):
+        time_windows(START, START + timedelta(days=1), timedelta(0))
+
+
+def test_shard_query():
+    query = TimeseriesQuery(point_ids=list(range(5)), start=START,
+                            end=START + timedelta(days=3), units={'temperature': 'f'})
+    shards = shard_query(query, timedelta(days=2), points_per_shard=2)
+    assert [[s.point_ids for s in group] for group in shards] == \
+        [[[0, 1], [0, 1]], [[2, 3], [2, 3]], [[4], [4]]]
+    assert shards[0][1].start == START + timedelta(days=2)
+    assert shards[0][1].end == query.end
+    assert shards[2][0].units == {'temperature': 'f'}
+
+
+def test_shard_query_selector_by_time():
+    query = TimeseriesQuery(selector=PointSelector(buildings=[1]), start=START,
+                            end=START + timedelta(days=3))
+    shards = shard_query(query, timedelta(days=2))
+    assert len(shards) == 1 and len(shards[0]) == 2
+    assert shards[0][0].selector == query.selector
+    with pytest.raises(ValueError):
+        shard_query(query, points_per_shard=10)
+
+
+def test_shard_query_resampled():
+    query = TimeseriesQuery(point_ids=[1], start=START + timedelta(hours=1, minutes=10),
+                            end=START + timedelta(hours=3, minutes=30),
+                            interval=timedelta(minutes=15))
+    shards = shard_query(query, timedelta(hours=1))
+    ms = timedelta(milliseconds=1)
+    assert [(s.start, s.end) for s in shards[0]] == [
+        (query.start, START + timedelta(hours=2) - ms),
+        (START + timedelta(hours=2), START + timedelta(hours=3) - ms),
+        (START + timedelta(hours=3), query.end)]
+    assert all(s.interval == query.interval for s in shards[0])
+    with pytest.raises(ValueError):
+        shard_query(query, timedelta(minutes=20))
+
+
+def test_merge_point_data():
+    merged = merge_point_data([
+        [point(1, [['t0'], ['t1']], ['time']), point(2, [['t0']], ['time'])],
+        [point(3, [['t2']], ['time']), point(1, [['t1'], ['t2']], ['time'])],
+    ])
+    assert [p.point_id for p in merged] == [1, 2, 3]
+    assert [v[0] for v in merged[0].values] == ['t0', 't1', 't2']
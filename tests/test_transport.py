@@ -0,0 +1,92 @@
+# type: ignore
+
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from onboard.client import APIClient
+from onboard.client.transport import HTTP2Adapter, TransportConfig
+
+
+def test_timeouts_per_endpoint_class(fake_client):
+    transport = TransportConfig(timeouts={'default': 5, 'stream': (3, None)})
+    assert transport.timeout('/buildings') == 5
+    assert transport.timeout('https://api.onboarddata.io/query-v2') == (3, None)
+    assert transport.timeout('/points_update') == 5
+    with pytest.raises(ValueError, match='Unknown endpoint classes'):
+        TransportConfig(timeouts={'metadata': 1})
+
+    client, adapter = fake_client(b'[]', transport=transport)
+    client.get_all_buildings()
+    client.post('/query-v2', json={})
+    client.get('/whoami', timeout=1)
+    timeouts = {r.path_url: kw['timeout']
+                for r, kw in zip(adapter.requests, adapter.sent_kwargs)}
+    assert timeouts == {'/buildings': 5, '/query-v2': (3, None), '/whoami': 1}
+
+
+def test_adapters_are_created_once():
+    client = APIClient('http://localhost', api_key='ob-p-test',
+                       transport=TransportConfig(pool_maxsize=32, keep_alive=False))
+    session = client._ClientBase__session()
+    adapter = session.get_adapter('https://api.onboarddata.io')
+    assert isinstance(adapter, HTTPAdapter)
+    assert adapter._pool_maxsize == 32
+    assert session.headers['Connection'] == 'close'
+    assert client._ClientBase__session() is session
+    assert session.get_adapter('https://api.onboarddata.io') is adapter
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        payload = gzip.compress(b'{"echo": "' + body + b'"}')
+        self.send_response(201)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_http2_adapter(server):
+    pytest.importorskip('h2')
+    client = APIClient(server, api_key='ob-p-test', transport=TransportConfig(http2=True))
+    session = client._ClientBase__session()
+    assert isinstance(session.get_adapter(server), HTTP2Adapter)
+
+    res = client.post('/echo', data=b'hello')
+    assert res.status_code == 201
+    assert res.json() == {'echo': 'hello'}
+    with client.post('/echo', data=b'streamed', stream=True) as res:
+        assert b''.join(res.iter_content(4)) == b'{"echo": "streamed"}'
+
+    with pytest.raises(requests.ConnectionError):
+        client.post('http://127.0.0.1:1/echo', data=b'')
+
+
+def test_http2_adapter_without_keep_alive(server):
+    pytest.importorskip('h2')
+    client = APIClient(server, api_key='ob-p-test',
+                       transport=TransportConfig(http2=True, keep_alive=False))
+    assert client._ClientBase__session().headers['Connection'] != 'close'
+    assert client.post('/echo', data=b'hello').json() == {'echo': 'hello'}
@@ -0,0 +1,104 @@
+# type: ignore
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import orjson
+import pandas as pd
+import pytest
+
+from onboard.client.models import PointDataUpdate
+from onboard.client.updates import encode_point_update_frame, encode_point_updates
+
+from .helpers import client_with, response
+
+
+def test_encode_matches_point_data_update():
+    last = [datetime(2022, 1, 1, 12, 30), datetime(2022, 1, 2)]
+    first = [datetime(2021, 12, 31), None]
+    expected = [PointDataUpdate(i, v, lu, fu).json()
+                for i, v, lu, fu in zip([1, 2], [1.5, 3.0], last, first)]
+
+    bodies = list(encode_point_updates(np.array([1, 2]), np.array([1.5, 3.0]),
+                                       np.array(last, dtype='datetime64[ms]'),
+                                       np.array(first, dtype='datetime64[ms]')))
+    assert len(bodies) == 1
+    assert orjson.loads(bodies[0]) == expected
+
+    # aware datetimes keep their wall clock time and drop the offset
+    aware = [datetime(2022, 1, 1, 12, 30, tzinfo=timezone(timedelta(hours=5)))]
+    expected = [PointDataUpdate(1, 1.5, aware[0]).json()]
+    column = pd.Series(aware)
+    assert orjson.loads(next(encode_point_updates([1], [1.5], column))) == expected
+    assert orjson.loads(next(encode_point_updates([1], [1.5], pd.DatetimeIndex(column)))) \
+        == expected
+
+
+def test_encode_values_and_batches():
+    n = 1203
+    last = np.full(n, np.datetime64('2022-01-01T00:00:00', 'ms'))
+    values = np.arange(n, dtype=np.float64)
+    values[3] = np.nan
+    bodies = list(encode_point_updates(np.arange(n), values, last, batch_size=500))
+    decoded = [u for body in bodies for u in orjson.loads(body)]
+    assert [len(orjson.loads(b)) for b in bodies] == [500, 500, 203]
+    assert [u['id'] for u in decoded] == list(range(n))
+    assert decoded[3]['value'] is None
+    assert decoded[4] == {'id': 4, 'value': 4.0, 'last_updated': 1640995200000,
+                          'first_updated': None}
+
+    strings = list(encode_point_updates([1, 2], np.array(['on', 'say "hi"'], dtype=object),
+                                        last[:2]))
+    assert [u['value'] for u in orjson.loads(strings[0])] == ['on', 'say "hi"']
+    mixed = np.array(['on', np.float64(1.5), np.int64(2), np.bool_(True), None], dtype=object)
+    mixed = list(encode_point_updates(range(5), mixed, np.repeat(last[:1], 5)))
+    assert [u['value'] for u in orjson.loads(mixed[0])] == ['on', 1.5, 2, True, None]
+    flags = list(encode_point_updates([1, 2], np.array([True, False]), last[:2]))
+    assert [u['value'] for u in orjson.loads(flags[0])] == [True, False]
+    ints = list(encode_point_updates([1, 2], np.array([-5, 1000]), last[:2]))
+    assert [u['value'] for u in orjson.loads(ints[0])] == [-5, 1000]
+
+
+def test_encode_in_blocks(monkeypatch):
+    monkeypatch.setattr('onboard.client.updates.BLOCK_ROWS', 4)
+    n = 11
+    last = np.datetime64('2022-01-01T00:00:00', 'ms') + np.arange(n).astype('timedelta64[s]')
+    first = last - np.timedelta64(1, 's')
+    first[[2, 9]] = np.datetime64('NaT')
+    bodies = list(encode_point_updates(np.arange(n) * 1000, np.arange(n), last, first,
+                                       batch_size=3))
+    assert [len(orjson.loads(b)) for b in bodies] == [3, 3, 3, 2]
+    decoded = [u for body in bodies for u in orjson.loads(body)]
+    assert [u['id'] for u in decoded] == [i * 1000 for i in range(n)]
+    assert [u['first_updated'] is None for u in decoded] == [i in (2, 9) for i in range(n)]
+    assert decoded[10]['first_updated'] == decoded[10]['last_updated'] - 1000
+
+
+def test_encode_validates_columns():
+    last = np.array(['2022-01-01', 'NaT'], dtype='datetime64[ms]')
+    with pytest.raises(ValueError, match='integers.*missing for 1 updates'):
+        list(encode_point_updates(np.array([1.0, 2.0]), np.array([1, 2]), last))
+    with pytest.raises(ValueError, match='same length'):
+        list(encode_point_updates(np.array([1]), np.array([1, 2]), last))
+    with pytest.raises(ValueError, match='must hold datetimes'):
+        list(encode_point_updates(np.array([1]), np.array([1]), np.array([1])))
+
+
+def test_update_point_data_frame():
+    sent = []
+
+    def points_update(url, data, headers):
+        sent.append(orjson.loads(data))
+        return response(b'')
+
+    client, _ = client_with({'/points_update': points_update})
+    df = pd.DataFrame({
+        'point_id': [7, 8],
+        'value': [1, 2],
+        'last_updated': pd.to_datetime(['2022-01-01T01:00:00+01:00'] * 2, utc=True),
+    })
+    client.update_point_data_frame(df)
+    ts = datetime(2022, 1, 1, tzinfo=timezone.utc).timestamp() * 1000
+    assert sent == [[{'id': 7, 'value': 1, 'last_updated': ts, 'first_updated': None},
+                     {'id': 8, 'value': 2, 'last_updated': ts, 'first_updated': None}]]
+    assert list(encode_point_update_frame(df.iloc[:0])) == []
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import orjson
+import pytest
+
+from onboard.client.util import bounded_map, iter_json_array, iter_records
+
+
+def test_bounded_map_serial():
+    assert list(bounded_map(lambda x: x * 2, [1, 2, 3])) == [2, 4, 6]
+
+
+def test_bounded_map_preserves_order():
+    def slow_first(x):
+        time.sleep(0.05 if x == 0 else 0)
+        return x
+
+    assert list(bounded_map(slow_first, range(10), max_workers=4)) == list(range(10))
+
+
+def test_bounded_map_limits_concurrency():
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def work(x):
+        with lock:
+            active.append(x)
+            peak.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.remove(x)
+        return x
+
+    list(bounded_map(work, range(20), max_workers=3))
+    assert max(peak) <= 3
+
+
+def test_bounded_map_raises():
+    def fail_on_two(x):
+        if x == 2:
+            raise ValueError('boom')
+        return x
+
+    results = bounded_map(fail_on_two, range(5), max_workers=2)
+    assert next(results) == 0
+    assert next(results) == 1
+    with pytest.raises(ValueError):
+        next(results)
+
+
+def test_iter_records():
+    chunks = [b'{"a":1}\n{"b"', b':2}', b'\n\n{"c":3}\n{"d":', b'4}']
+    records = [bytes(r) for r in iter_records(chunks)]
+    assert records == [b'{"a":1}', b'{"b":2}', b'{"c":3}', b'{"d":4}']
+
+
+def test_iter_records_spanning_many_chunks():
+    record = b'{"values":[' + b','.join(b'%d' % i for i in range(10_000)) + b']}'
+    chunks = [b'{}\n' + record[:7]]
+    chunks += [record[i:i + 7] for i in range(7, len(record), 7)]
+    chunks += [b'\n{}']
+    assert [bytes(r) for r in iter_records(chunks)] == [b'{}', record, b'{}']
+
+
+def test_iter_records_trailing_newline():
+    assert [bytes(r) for r in iter_records([b'x\n', b'y\n'])] == [b'x', b'y']
+    assert list(iter_records([])) == []
+
+
+def test_iter_json_array():
+    array = [{'a': 'x"]},[', 'b': [1, 2, {'c': None}]}, 3, 'back\\slash', 'caf\u00e9',
+             None, [], {}, True, -1.5e3, 12345678901234567890]
+    doc = orjson.dumps(array)
+    for size in (1, 2, 3, 7, len(doc)):
+        chunks = [doc[i:i + size] for i in range(0, len(doc), size)]
+        assert list(iter_json_array(chunks)) == array
+    assert list(iter_json_array([b' [ ', b'] '])) == []
+
+
+@pytest.mark.parametrize('doc', [b'{"a": 1}', b'[1, 2', b'[1] [2]', b'[1]x', b'[1}', b'[1 2]',
+                                 b'[1,]'])
+def test_iter_json_array_malformed(doc):
+    for size in (1, len(doc)):
+        with pytest.raises(ValueError):
+            list(iter_json_array([doc[i:i + size] for i in range(0, len(doc), size)]))
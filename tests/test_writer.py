@@ -0,0 +1,126 @@
+# type: ignore
+
+import threading
+import time
+from datetime import datetime
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from onboard.client import OnboardApiException, OnboardTemporaryException
+from onboard.client.resilience import Resilience
+from onboard.client.models import PointDataUpdate
+from onboard.client.writer import PointDataWriter
+
+from .helpers import client_with, response
+
+
+def updates(n):
+    return [PointDataUpdate(i, float(i), datetime(2022, 1, 1)) for i in range(n)]
+
+
+def test_writer_batches_and_retries():
+    sent = []
+    failures = {'count': 1}
+
+    def points_update(url, json):
+        if failures['count']:
+            failures['count'] -= 1
+            return response(b'unavailable', 503)
+        sent.append([u['id'] for u in json])
+        return response(b'')
+
+    client, _ = client_with({'/points_update': points_update})
+    with PointDataWriter(client, batch_size=10, max_in_flight=3, backoff=0) as writer:
+        writer.write_many(updates(25))
+
+    assert sorted(i for batch in sent for i in batch) == list(range(25))
+    assert sorted(len(batch) for batch in sent) == [5, 10, 10]
+    assert writer.stats.batches == 3
+    assert writer.stats.updates == 25
+    assert writer.stats.retries == 1
+    assert len(writer.stats.latencies) == 3
+
+
+def test_writer_flushes_partial_batches_on_interval():
+    sent = threading.Event()
+    client, _ = client_with({'/points_update': lambda url, json: sent.set() or response(b'')})
+    writer = PointDataWriter(client, batch_size=100, flush_interval=0.05)
+    writer.write(updates(1)[0])
+    assert sent.wait(2)
+    writer.close()
+    assert writer.stats.updates == 1
+
+
+def test_writer_applies_backpressure():
+    release = threading.Event()
+    in_flight = []
+
+    def points_update(url, json):
+        in_flight.append(len(json))
+        release.wait(2)
+        return response(b'')
+
+    client, _ = client_with({'/points_update': points_update})
+    writer = PointDataWriter(client, batch_size=2, max_in_flight=1, max_queued=4)
+    producer = threading.Thread(target=writer.write_many, args=(updates(10),))
+    producer.start()
+    time.sleep(0.1)
+    assert producer.is_alive()
+    assert writer._pending == 4
+    release.set()
+    producer.join(2)
+    writer.close()
+    assert writer.stats.updates == 10
+
+
+def test_writer_raises_failed_batches():
+    client, _ = client_with({'/points_update': lambda url, json: response(b'bad', 400)})
+    writer = PointDataWriter(client, batch_size=5, backoff=0)
+    writer.write_many(updates(5))
+    with pytest.raises(OnboardApiException):
+        writer.close()
+    assert writer.stats.failed_batches == 1
+    assert writer.stats.retries == 0
+
+
+def test_writer_only_retries_batches_which_were_not_applied():
+    refused = requests.ConnectionError(MaxRetryError(None, '/points_update',
+                                                     NewConnectionError(None, 'refused')))
+    for failure, attempts in ((response(b'bad gateway', 502), 1),
+                              (requests.ReadTimeout('read timed out'), 1),
+                              (refused, 2), (response(b'slow down', 429), 2)):
+        calls = []
+
+        def points_update(url, json):
+            calls.append(url)
+            if len(calls) > 1:
+                return response(b'')
+            if isinstance(failure, Exception):
+                raise failure
+            return failure
+
+        client, _ = client_with({'/points_update': points_update})
+        writer = PointDataWriter(client, batch_size=5, backoff=0)
+        writer.write_many(updates(5))
+        if attempts == 1:
+            with pytest.raises(OnboardApiException):
+                writer.close()
+        else:
+            writer.close()
+        assert len(calls) == attempts
+
+    # a client with a Resilience retries batches itself
+    calls.clear()
+
+    def unavailable(url, json):
+        calls.append(url)
+        return response(b'unavailable', 503)
+
+    client, _ = client_with({'/points_update': unavailable}, resilience=Resilience())
+    writer = PointDataWriter(client, batch_size=5, backoff=0)
+    writer.write_many(updates(5))
+    with pytest.raises(OnboardTemporaryException):
+        writer.close()
+    assert len(calls) == 1